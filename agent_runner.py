@@ -1,21 +1,54 @@
+import hashlib
+import json
+import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+from node_metrics import summarize_metrics
+from research_graph import token_usage_totals
 from workflow_builder import stepwise_agent
 from yaspin import yaspin
 from yaspin.spinners import Spinners
 
-def run_agent(topic: str, debug: bool = False) -> None:
+def metrics_report(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the JSON-serializable metrics of a finished run from its final state."""
+    records = state.get("node_metrics", [])
+    # Pipelined nodes overlap, so the run lasts from the first node's start to the last node's end
+    started = min((m["started_at"] for m in records), default=0.0)
+    ended = max((m["started_at"] + m["wall_time_s"] for m in records), default=0.0)
+    return {
+        "topic": state.get("topic", ""),
+        "wall_time_s": round(ended - started, 4),
+        "nodes": records,
+        "totals": summarize_metrics(records),
+        "token_usage": token_usage_totals(state.get("token_usage", [])),
+    }
+
+def write_metrics(path: str, metrics: Any) -> None:
+    """Writes metrics as indented JSON to path."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+
+def run_agent(topic: str, debug: bool = False, pipelined: bool = False, metrics_path: Optional[str] = None,
+              resume: bool = False, thread_id: Optional[str] = None) -> None:
     """
     Runs the research agent for a given topic, providing spinner and status updates.
 
     Args:
-        topic: The research topic.
+        topic: The research topic. May be empty when resuming by thread_id.
         debug: If True, print debug logs to stdout.
+        pipelined: If True, scrape and summarize each document as soon as it is found.
+        metrics_path: If given, per-node timing and counters are written there as JSON.
+        resume: If True, continue the topic's (or thread's) interrupted run instead of starting over.
+        thread_id: Checkpoint thread to run or resume; defaults to one derived from the topic.
     """
     report_path = "research_report.md"
     spinner = yaspin(Spinners.dots, text="Starting agent...")
     try:
         spinner.start()
-        for node_name, status_message, state in stepwise_agent(topic, debug=debug):
+        for node_name, status_message, state in stepwise_agent(topic, debug=debug, pipelined=pipelined,
+                                                               resume=resume, thread_id=thread_id):
             if node_name == "done":
                 spinner.text = "Finalizing and writing report..."
                 report = state.get("final_report", "")
@@ -24,24 +57,153 @@ def run_agent(topic: str, debug: bool = False) -> None:
                 spinner.ok("✅")
                 print(f"\nReport generated: {report_path}\n")
                 print(f"Open the report at: ./{report_path}")
+                if metrics_path:
+                    write_metrics(metrics_path, metrics_report(state))
+                    print(f"Metrics written to: ./{metrics_path}")
                 break
             else:
                 spinner.text = status_message
     except Exception as e:
         spinner.fail("💥")
         print(f"\nError: {e}")
+        print(f"Continue this run with: {resume_command(topic, pipelined, thread_id)}")
     finally:
         spinner.stop()
 
+def resume_command(topic: str, pipelined: bool = False, thread_id: Optional[str] = None) -> str:
+    """Builds the command line that resumes an interrupted run."""
+    target = f"--thread {thread_id}" if thread_id else json.dumps(topic, ensure_ascii=False)
+    return f"python agent_runner.py {target} --resume" + (" --pipelined" if pipelined else "")
+
+def report_filename(topic: str) -> str:
+    """
+    Builds a filesystem-safe report file name for a topic.
+    A short hash of the full topic keeps names unique when slugs collide.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-")[:60] or "topic"
+    digest = hashlib.sha1(topic.encode("utf-8")).hexdigest()[:8]
+    return f"research_report_{slug}_{digest}.md"
+
+def read_topics(source: str) -> List[str]:
+    """
+    Reads one topic per line from a file, or from stdin when source is "-".
+    Blank lines and lines starting with '#' are skipped, and repeated topics are dropped.
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    topics = [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+    return list(dict.fromkeys(topics))
+
+def run_topic(topic: str, output_dir: str, debug: bool = False, pipelined: bool = False,
+              metrics: Optional[Dict[str, Any]] = None, resume: bool = False) -> str:
+    """
+    Runs the research agent for one topic without a spinner and writes its report.
+    If a metrics dict is given, the run's metrics_report is stored in it under the topic.
+    With resume, an interrupted run of the topic is continued instead of started over.
+
+    Returns:
+        The path of the written report.
+    """
+    for node_name, _, state in stepwise_agent(topic, debug=debug, pipelined=pipelined, resume=resume):
+        if node_name == "done":
+            report_path = os.path.join(output_dir, report_filename(topic))
+            with open(report_path, "w", encoding="utf-8") as f:
+                f.write(state.get("final_report", ""))
+            if metrics is not None:
+                metrics[topic] = metrics_report(state)
+            return report_path
+    raise RuntimeError("The workflow finished without producing a final state.")
+
+def run_batch(topics: List[str], parallelism: int = 4, output_dir: str = "reports",
+              debug: bool = False, pipelined: bool = False, metrics_path: Optional[str] = None,
+              resume: bool = False) -> Dict[str, str]:
+    """
+    Runs many topics concurrently in this process, writing one report per topic.
+    All runs share the process-wide scrape, search and LLM worker pools, clients and caches.
+
+    Args:
+        topics: The research topics.
+        parallelism: Maximum number of topics researched at the same time.
+        output_dir: Directory the reports are written to (created if missing).
+        debug: If True, print debug logs to stdout.
+        pipelined: If True, use the per-document pipelined workflow.
+        metrics_path: If given, the metrics of every successful topic are written there as JSON, keyed by topic.
+        resume: If True, topics whose earlier run was interrupted continue from their last checkpoint.
+
+    Returns:
+        A mapping of topic to report path for every topic that succeeded.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    reports = {}
+    metrics = {} if metrics_path else None
+    with ThreadPoolExecutor(max_workers=max(1, parallelism), thread_name_prefix="research-topic") as executor:
+        futures = {executor.submit(run_topic, topic, output_dir, debug, pipelined, metrics, resume): topic for topic in topics}
+        for completed, future in enumerate(as_completed(futures), start=1):
+            topic = futures[future]
+            try:
+                reports[topic] = future.result()
+                print(f"[{completed}/{len(topics)}] ✅ {topic} -> {reports[topic]}")
+            except Exception as e:
+                print(f"[{completed}/{len(topics)}] 💥 {topic}: {e}")
+    if metrics_path:
+        write_metrics(metrics_path, {topic: metrics[topic] for topic in topics if topic in metrics})
+    return reports
+
+def _pop_option(args: List[str], name: str) -> Optional[str]:
+    """Removes "name value" from args and returns the value, or None if the option is absent."""
+    if name not in args:
+        return None
+    index = args.index(name)
+    if index + 1 >= len(args):
+        print(f"Missing value for {name}")
+        sys.exit(1)
+    value = args[index + 1]
+    del args[index:index + 2]
+    return value
+
 if __name__ == "__main__":
-    # Accepts: python agent_runner.py "topic string" [--debug] or python agent_runner.py --debug "topic string"
+    # Accepts: python agent_runner.py "topic string" [--debug] [--pipelined] [--metrics FILE] [--resume] (flags may come before the topic)
+    #      or: python agent_runner.py --thread ID --resume [--debug] [--pipelined] [--metrics FILE]
+    #      or: python agent_runner.py --batch <file|-> [--parallel N] [--output-dir DIR] [--debug] [--pipelined] [--metrics FILE] [--resume]
     args = [arg for arg in sys.argv[1:] if arg.strip()]
+    usage = (
+        "Usage: python agent_runner.py \"<your research topic>\" [--debug] [--pipelined] [--metrics FILE] [--resume]\n"
+        "       python agent_runner.py --thread <thread id> --resume [--debug] [--pipelined] [--metrics FILE]\n"
+        "       python agent_runner.py --batch <topics file, or - for stdin> [--parallel N] [--output-dir DIR] [--debug] [--pipelined] [--metrics FILE] [--resume]"
+    )
+    if "--help" in args or "-h" in args:
+        print(usage)
+        sys.exit(0)
     debug = False
+    pipelined = False
     if "--debug" in args:
         debug = True
         args.remove("--debug")
-    if len(args) < 1:
-        print("Usage: python agent_runner.py \"<your research topic>\" [--debug]")
+    if "--pipelined" in args:
+        pipelined = True
+        args.remove("--pipelined")
+    resume = "--resume" in args
+    if resume:
+        args.remove("--resume")
+    thread_id = _pop_option(args, "--thread")
+    batch_source = _pop_option(args, "--batch")
+    parallelism = int(_pop_option(args, "--parallel") or 4)
+    output_dir = _pop_option(args, "--output-dir") or "reports"
+    metrics_path = _pop_option(args, "--metrics")
+    if batch_source is not None:
+        topics = read_topics(batch_source)
+        if not topics:
+            print("No topics found.")
+            sys.exit(1)
+        reports = run_batch(topics, parallelism=parallelism, output_dir=output_dir, debug=debug, pipelined=pipelined,
+                            metrics_path=metrics_path, resume=resume)
+        print(f"\n{len(reports)} of {len(topics)} reports written to ./{output_dir}")
+        sys.exit(0 if len(reports) == len(topics) else 1)
+    if len(args) < 1 and not (thread_id and resume):
+        print(usage)
         sys.exit(1)
-    topic = args[0]
-    run_agent(topic, debug=debug)
+    topic = args[0] if args else ""
+    run_agent(topic, debug=debug, pipelined=pipelined, metrics_path=metrics_path, resume=resume, thread_id=thread_id)
@@ -0,0 +1,292 @@
+"""
+Measures end-to-end throughput of the full research graph without network access.
+
+The graph from build_workflow() runs against local stand-ins: an HTTP server on
+127.0.0.1 serving a synthetic HTML corpus, a fake search provider that returns
+pages from that corpus, and a fake LLM with configurable latency. Caches are
+disabled unless --cache is given, so every run does the full work. With --async
+the runs go through astepwise_agent, all of them on one event loop. Usage:
+
+    python benchmarks/pipeline_bench.py [--runs N] [--warmup N] [--concurrency N] [--pipelined] [--async]
+        [--llm-latency S] [--search-latency S] [--page-latency S] [--corpus N]
+        [--json PATH] [--baseline PATH] [--tolerance F]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+import research_graph  # noqa: E402
+from node_metrics import summarize_metrics  # noqa: E402
+import http_transport  # noqa: E402
+from workflow_builder import astepwise_agent, stepwise_agent  # noqa: E402
+
+SUBJECTS = ["battery storage", "solar power", "gene therapy", "quantum computing", "ocean acidification",
+            "urban transit", "machine translation", "soil health", "fusion energy", "antibiotic resistance"]
+FILLER = ("researchers report data trends analysis results policy market growth cost efficiency "
+          "study findings survey evidence impact adoption model estimate region decade").split()
+
+def build_page(index: int) -> bytes:
+    """Builds a deterministic synthetic article with navigation, body paragraphs and a footer."""
+    rng = random.Random(index)
+    subject = SUBJECTS[index % len(SUBJECTS)]
+    nav = "".join(f"<li><a href='/doc/{i}'>Section {i}</a></li>" for i in range(20))
+    paragraphs = "".join(
+        "<p>" + " ".join([subject] + rng.choices(FILLER, k=60)) + ".</p>"
+        for _ in range(rng.randint(20, 60))
+    )
+    return (
+        f"<html><head><title>{subject} {index}</title><script>track()</script></head><body>"
+        f"<nav><ul>{nav}</ul></nav><article><h1>{subject} report {index}</h1>{paragraphs}</article>"
+        f"<footer>Copyright example.org</footer></body></html>"
+    ).encode("utf-8")
+
+class CorpusServer:
+    """Serves build_page(n) at /doc/<n> from a background thread on an ephemeral local port."""
+
+    def __init__(self, corpus_size: int, latency: float):
+        pages = {f"/doc/{i}": build_page(i) for i in range(corpus_size)}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like real sites, so pooled connections are reused
+
+            def do_GET(self):
+                body = pages.get(self.path)
+                time.sleep(latency)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128  # The default backlog of 5 stalls concurrent fetches on SYN retries
+            daemon_threads = True
+
+        self.corpus_size = corpus_size
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "CorpusServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+def make_search_tool(server: CorpusServer, latency: float) -> type:
+    """Returns a search tool class (same interface as TavilySearchResults) backed by the local corpus."""
+    class FakeSearchTool:
+        def __init__(self, max_results: int = 3):
+            self.max_results = max_results
+
+        def results(self, query: str) -> List[Dict[str, Any]]:
+            rng = random.Random(query)
+            picks = rng.sample(range(server.corpus_size), min(self.max_results, server.corpus_size))
+            return [{"url": f"{server.base_url}/doc/{i}", "content": query} for i in picks]
+
+        def invoke(self, query: str) -> List[Dict[str, Any]]:
+            time.sleep(latency)
+            return self.results(query)
+
+        async def ainvoke(self, query: str) -> List[Dict[str, Any]]:
+            await asyncio.sleep(latency)
+            return self.results(query)
+
+    return FakeSearchTool
+
+class FakeLLM:
+    """Answers the agent's three prompt kinds after a fixed latency, like GoogleGenerativeAI.invoke/ainvoke."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, messages: Any) -> str:
+        time.sleep(self.latency)
+        return self.answer(messages)
+
+    async def ainvoke(self, messages: Any) -> str:
+        await asyncio.sleep(self.latency)
+        return self.answer(messages)
+
+    def answer(self, messages: Any) -> str:
+        prompt = messages[0].content if isinstance(messages, list) else str(messages)
+        if "generate 3-5 effective search queries" in prompt:
+            topic = prompt.split("'")[1]
+            return "\n".join(f"{n}. {topic} {aspect}" for n, aspect in enumerate(["overview", "statistics", "outlook", "risks"], 1))
+        if "merge the following summaries" in prompt:
+            return "Merged summary. " + " ".join(FILLER[:40])
+        if "provide a concise summary" in prompt:
+            return "Summary. " + " ".join(FILLER[:60])
+        return "# Report\n\n" + " ".join(FILLER * 10)
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Returns the nearest-rank percentile of values (fraction in 0-1)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def peak_rss_mb() -> Optional[float]:
+    """Returns this process's peak resident set size in MiB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_once(topic: str, pipelined: bool) -> Dict[str, Any]:
+    """Runs the graph for one topic and returns its wall time and node_metrics records."""
+    start = time.perf_counter()
+    state = {}
+    for node_name, _, state in stepwise_agent(topic, pipelined=pipelined):
+        pass
+    if not state.get("final_report"):
+        raise RuntimeError(f"Run for '{topic}' produced no report: {state.get('error_message')}")
+    return {"latency_s": time.perf_counter() - start, "node_metrics": state.get("node_metrics", [])}
+
+async def arun_once(topic: str, pipelined: bool) -> Dict[str, Any]:
+    """Async version of run_once, through astepwise_agent."""
+    start = time.perf_counter()
+    state = {}
+    async for node_name, _, state in astepwise_agent(topic, pipelined=pipelined):
+        pass
+    if not state.get("final_report"):
+        raise RuntimeError(f"Run for '{topic}' produced no report: {state.get('error_message')}")
+    return {"latency_s": time.perf_counter() - start, "node_metrics": state.get("node_metrics", [])}
+
+async def arun_all(topics: List[str], concurrency: int, pipelined: bool) -> List[Dict[str, Any]]:
+    """Runs the topics on the current event loop, at most concurrency at once."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(topic: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await arun_once(topic, pipelined)
+
+    try:
+        return list(await asyncio.gather(*(run(topic) for topic in topics)))
+    finally:
+        await http_transport.aclose_session()
+
+def run_benchmark(runs: int, concurrency: int, pipelined: bool, llm_latency: float, search_latency: float,
+                  page_latency: float, corpus_size: int, use_cache: bool, warmup: int = 1,
+                  use_async: bool = False) -> Dict[str, Any]:
+    """
+    Runs the full graph runs times against the local stand-ins and returns the aggregated report.
+    The first warmup runs (one-off imports, pool start-up) are excluded from the results.
+    """
+    with CorpusServer(corpus_size, page_latency) as server, tempfile.TemporaryDirectory() as cache_dir:
+        research_graph.llm = FakeLLM(llm_latency)
+        research_graph.TavilySearchResults = make_search_tool(server, search_latency)
+        research_graph.CACHE_DIR = cache_dir
+        if not use_cache:
+            research_graph.PAGE_CACHE_TTL = research_graph.SEARCH_CACHE_TTL = 0
+            research_graph.LLM_CACHE_ENABLED = False
+
+        warmup_topics = [f"warm-up {i}" for i in range(warmup)]
+        topics = [f"{SUBJECTS[i % len(SUBJECTS)]} trends {i}" for i in range(runs)]
+        if use_async:
+            asyncio.run(arun_all(warmup_topics, 1, pipelined))
+            start = time.perf_counter()
+            results = asyncio.run(arun_all(topics, concurrency, pipelined))
+        else:
+            for topic in warmup_topics:
+                run_once(topic, pipelined)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+                results = list(executor.map(lambda topic: run_once(topic, pipelined), topics))
+        elapsed = time.perf_counter() - start
+
+    latencies = [r["latency_s"] for r in results]
+    records = [m for r in results for m in r["node_metrics"]]
+    stages = {}
+    for node, totals in summarize_metrics(records).items():
+        times = [m["wall_time_s"] for m in records if m["node"] == node]
+        stages[node] = {
+            "runs": totals["runs"],
+            "p50_ms": round(percentile(times, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(times, 0.95) * 1000, 1),
+            "llm_calls": totals["llm_calls"],
+            "http_requests": totals["http_requests"],
+        }
+    return {
+        "config": {"runs": runs, "warmup": warmup, "concurrency": concurrency, "pipelined": pipelined, "async": use_async, "llm_latency": llm_latency,
+                   "search_latency": search_latency, "page_latency": page_latency, "corpus": corpus_size,
+                   "cache": use_cache},
+        "runs_per_sec": round(runs / elapsed, 3),
+        "run_p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "run_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Returns a description of every headline metric that regressed by more than tolerance (a fraction)."""
+    regressions = []
+    if report["runs_per_sec"] < baseline["runs_per_sec"] * (1 - tolerance):
+        regressions.append(f"runs/sec {report['runs_per_sec']} < baseline {baseline['runs_per_sec']}")
+    for key in ("run_p50_ms", "run_p95_ms"):
+        if report[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key} {report[key]} > baseline {baseline[key]}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the full research graph against local stand-ins.")
+    parser.add_argument("--runs", type=int, default=10, help="topics researched (default: 10)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before measuring (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=1, help="topics researched at once (default: 1)")
+    parser.add_argument("--pipelined", action="store_true", help="benchmark the pipelined graph")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="run through astepwise_agent, all runs on one event loop")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call (default: 0.05)")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="seconds per fake search (default: 0.02)")
+    parser.add_argument("--page-latency", type=float, default=0.01, help="seconds per local page fetch (default: 0.01)")
+    parser.add_argument("--corpus", type=int, default=200, help="number of synthetic pages served (default: 200)")
+    parser.add_argument("--cache", action="store_true", help="keep the page, search and LLM caches enabled")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run; exit with status 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs. baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)  # Keep per-node log lines out of the results table
+    report = run_benchmark(args.runs, args.concurrency, args.pipelined, args.llm_latency, args.search_latency,
+                           args.page_latency, args.corpus, args.cache, args.warmup, args.use_async)
+    print(f"runs/sec: {report['runs_per_sec']}   run p50: {report['run_p50_ms']} ms   "
+          f"run p95: {report['run_p95_ms']} ms   peak RSS: {report['peak_rss_mb']} MiB")
+    print(f"{'stage':<22}{'runs':>6}{'p50 (ms)':>12}{'p95 (ms)':>12}{'llm calls':>12}{'http':>8}")
+    for node, stats in report["stages"].items():
+        print(f"{node:<22}{stats['runs']:>6}{stats['p50_ms']:>12}{stats['p95_ms']:>12}"
+              f"{stats['llm_calls']:>12}{stats['http_requests']:>8}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
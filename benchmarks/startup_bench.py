@@ -0,0 +1,65 @@
+"""
+Measures cold import time of the agent's entry-point modules.
+
+Each sample runs in a fresh interpreter so that nothing is already cached in
+sys.modules. Usage:
+
+    python benchmarks/startup_bench.py [--runs N] [--json PATH]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+MODULES = ["research_graph", "workflow_builder", "agent_runner"]
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+_PROBE = (
+    "import time, sys\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+def measure_import(module: str, runs: int) -> List[float]:
+    """Imports module in runs fresh interpreters and returns the import times in seconds."""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", _PROBE.format(module=module)],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        )
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return samples
+
+def run_benchmark(runs: int) -> Dict[str, Dict[str, float]]:
+    """Returns min/median/max import time in milliseconds for every entry-point module."""
+    report = {}
+    for module in MODULES:
+        samples = measure_import(module, runs)
+        report[module] = {
+            "min_ms": round(min(samples) * 1000, 1),
+            "median_ms": round(statistics.median(samples) * 1000, 1),
+            "max_ms": round(max(samples) * 1000, 1),
+        }
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure cold import time of the research agent modules.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module (default: 5)")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.runs)
+    print(f"{'module':<20}{'min (ms)':>12}{'median (ms)':>14}{'max (ms)':>12}")
+    for module, stats in report.items():
+        print(f"{module:<20}{stats['min_ms']:>12}{stats['median_ms']:>14}{stats['max_ms']:>12}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
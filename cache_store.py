@@ -0,0 +1,216 @@
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+@dataclass
+class CacheEntry:
+    """A value read back from a cache, along with its freshness."""
+    value: Any
+    stored_at: float
+    fresh: bool
+
+class SQLiteCache:
+    """
+    Persistent key/value cache stored in a single SQLite file.
+
+    Values must be JSON-serializable. Entries older than `ttl` seconds are
+    reported as stale (they can still be read for revalidation), and the least
+    recently used entries are evicted once the stored values exceed `max_bytes`.
+    Cache failures are logged and treated as misses so they never break a run.
+    """
+
+    def __init__(self, path: str, ttl: float, max_bytes: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        # Running size of all values, kept by triggers in the same transaction as each write, so checking
+        # the size bound never scans the table (and stays right when several processes share the file)
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO totals (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert_size AFTER INSERT ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_update_size AFTER UPDATE OF size ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete_size AFTER DELETE ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END"
+            )
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[CacheEntry]:
+        """
+        Returns the entry stored under key, or None on a miss.
+        Stale entries are only returned when allow_stale is True.
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, stored_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                fresh = now - row[1] < self.ttl
+                if not fresh and not allow_stale:
+                    return None
+                self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            return CacheEntry(value=json.loads(row[0]), stored_at=row[1], fresh=fresh)
+        except (sqlite3.Error, ValueError) as e:
+            logging.warning(f"[cache] read from {self.path} failed: {e}")
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores value under key and evicts least recently used entries if over the size bound."""
+        now = time.time()
+        try:
+            payload = json.dumps(value)
+            with self._lock:
+                # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the size trigger
+                self._conn.execute(
+                    "INSERT INTO entries (key, value, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                    "stored_at = excluded.stored_at, accessed_at = excluded.accessed_at",
+                    (key, payload, len(payload.encode("utf-8")), now, now)
+                )
+                self._evict()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.warning(f"[cache] write to {self.path} failed: {e}")
+
+    def touch(self, key: str) -> None:
+        """Marks an entry as freshly stored, e.g. after a successful revalidation."""
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key)
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"[cache] update of {self.path} failed: {e}")
+
+    def total_bytes(self) -> int:
+        """Returns the combined size of all stored values."""
+        with self._lock:
+            return self._total()
+
+    def close(self) -> None:
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _total(self) -> int:
+        # Caller holds self._lock
+        return self._conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+
+    def _evict(self) -> None:
+        # Caller holds self._lock
+        total = self._total()
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC, rowid ASC")
+        victims = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+class TieredCache:
+    """
+    Cache with a bounded in-memory LRU tier in front of a SQLiteCache.
+
+    Reads are served from memory when possible and fall back to disk, promoting
+    disk hits into memory. Writes go to both tiers. Hit and miss counters are
+    kept for the lifetime of the process. A memory tier of 0 entries disables it.
+    """
+
+    def __init__(self, disk: SQLiteCache, memory_entries: int = 0):
+        self.disk = disk
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[CacheEntry]:
+        """
+        Returns the entry stored under key, or None on a miss.
+        Stale entries are only returned when allow_stale is True and never count as hits.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is not None:
+            entry = CacheEntry(copy.deepcopy(entry.value), entry.stored_at, time.time() - entry.stored_at < self.disk.ttl)
+        else:
+            entry = self.disk.get(key, allow_stale=allow_stale)
+            if entry is not None and entry.fresh:
+                self._remember(key, entry)
+
+        if entry is not None and not entry.fresh and not allow_stale:
+            entry = None
+        with self._lock:
+            if entry is not None and entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores value in both tiers."""
+        self.disk.set(key, value)
+        self._remember(key, CacheEntry(copy.deepcopy(value), time.time(), True))
+
+    def touch(self, key: str) -> None:
+        """Marks an entry as freshly stored in both tiers."""
+        self.disk.touch(key)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                entry.stored_at = time.time()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit and miss counters."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        """Drops the memory tier and closes the disk tier."""
+        with self._lock:
+            self._memory.clear()
+        self.disk.close()
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        if self.memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
@@ -0,0 +1,339 @@
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+# A list channel is stored in full at least once every this many versions, bounding delta chains on load
+DELTA_SNAPSHOT_INTERVAL = 32
+# A claim whose run has not checkpointed for this many seconds is treated as abandoned. Claims held
+# by a process on this host are given up as soon as that process exits, without waiting this long.
+CLAIM_TTL = 3600
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, "
+    "parent_checkpoint_id TEXT, checkpoint_type TEXT NOT NULL, checkpoint BLOB NOT NULL, "
+    "metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))",
+    # kind is "full" (the whole value), "delta" (items appended to base_version's value) or "empty"
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL, "
+    "kind TEXT NOT NULL, base_version TEXT, value_type TEXT NOT NULL, value BLOB NOT NULL, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, channel, version))",
+    "CREATE TABLE IF NOT EXISTS writes ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, "
+    "task_id TEXT NOT NULL, idx INTEGER NOT NULL, task_path TEXT NOT NULL, channel TEXT NOT NULL, "
+    "value_type TEXT NOT NULL, value BLOB NOT NULL, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))",
+    # The run currently using each thread; see SQLiteCheckpointer.claim
+    "CREATE TABLE IF NOT EXISTS claims ("
+    "thread_id TEXT PRIMARY KEY, token TEXT NOT NULL, host TEXT NOT NULL, pid INTEGER NOT NULL, "
+    "renewed_at REAL NOT NULL)",
+)
+
+class ThreadBusyError(RuntimeError):
+    """Raised when a thread is claimed by a run that is still going, in this process or another."""
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """
+    LangGraph checkpoint saver stored in a single SQLite file, so interrupted runs can be resumed.
+
+    Each checkpoint stores only the channel versions it changed, one row per channel.
+    List channels that only grew since their previous version (such as the append-only
+    message log) are stored as the appended items plus a reference to that version,
+    with a full copy every DELTA_SNAPSHOT_INTERVAL versions. Every put or put_writes call
+    is written in one transaction, and the database runs in WAL mode with synchronous=NORMAL
+    so commits do not wait for an fsync.
+
+    Processes sharing the file keep their runs apart with claims: a run claims its thread
+    before reading or deleting it, so the same thread is never run twice at once.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        # (thread_id, checkpoint_ns, channel) -> (version, value, delta chain length) of the last list stored
+        self._last_lists: Dict[Tuple[str, str, str], Tuple[str, List[Any], int]] = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Returns the checkpoint named by config, or the thread's latest one when config has no checkpoint_id."""
+        configurable = {"checkpoint_ns": "", **config["configurable"]}
+        return next(self.list({**config, "configurable": configurable}, limit=1), None)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """Yields matching checkpoints, newest first."""
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, " \
+                "checkpoint, metadata_type, metadata FROM checkpoints"
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            conditions.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        for thread_id, checkpoint_ns, checkpoint_id, parent_id, cp_type, cp_data, md_type, md_data in rows:
+            metadata = self.serde.loads_typed((md_type, md_data))
+            if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            checkpoint = self.serde.loads_typed((cp_type, cp_data))
+            with self._lock:
+                channel_values = self._load_values(thread_id, checkpoint_ns, checkpoint["channel_versions"])
+                pending_writes = self._load_writes(thread_id, checkpoint_ns, checkpoint_id)
+            yield CheckpointTuple(
+                config=_config(thread_id, checkpoint_ns, checkpoint_id),
+                checkpoint={**checkpoint, "channel_values": channel_values},
+                metadata=metadata,
+                parent_config=_config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+                pending_writes=pending_writes,
+            )
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        """Stores a checkpoint and the channel values that changed in it, in one transaction."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        cp_type, cp_data = self.serde.dumps_typed(stored)
+        md_type, md_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            try:
+                blob_rows = []
+                for channel, version in new_versions.items():
+                    if channel in values:
+                        row = self._encode_value((thread_id, checkpoint_ns, channel), str(version), values[channel])
+                    else:
+                        row = ("empty", None, "empty", b"")
+                    blob_rows.append((thread_id, checkpoint_ns, channel, str(version), *row))
+                with self._transaction():
+                    self._conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", blob_rows)
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                         cp_type, cp_data, md_type, md_data)
+                    )
+                    # Each checkpoint shows the thread's run is still going
+                    self._conn.execute("UPDATE claims SET renewed_at = ? WHERE thread_id = ?", (time.time(), thread_id))
+            except Exception:
+                # Later deltas must not reference a version that never reached the database
+                self._forget_lists(thread_id)
+                raise
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        """Stores the writes of one task against a checkpoint, in one transaction."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), task_path, channel,
+             *self.serde.dumps_typed(value))
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        # Regular writes are kept from the first attempt; special writes (errors, interrupts) are replaced
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock, self._transaction():
+            self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Deletes every checkpoint, value and write of a thread."""
+        with self._lock:
+            with self._transaction():
+                for table in ("checkpoints", "blobs", "writes"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._forget_lists(thread_id)
+
+    def claim(self, thread_id: str) -> str:
+        """
+        Claims a thread for one run and returns the claim's token, to pass to release.
+        Raises ThreadBusyError while another run, in any process using this file, holds the thread.
+        """
+        token = uuid.uuid4().hex
+        with self._lock:
+            with self._transaction("IMMEDIATE"):
+                row = self._conn.execute("SELECT host, pid, renewed_at FROM claims WHERE thread_id = ?",
+                                         (thread_id,)).fetchone()
+                if row is not None and not _abandoned(*row):
+                    raise ThreadBusyError(f"Thread '{thread_id}' is in use by process {row[1]} on {row[0]}; "
+                                          "wait for that run to finish or stop it first.")
+                self._conn.execute("INSERT OR REPLACE INTO claims VALUES (?, ?, ?, ?, ?)",
+                                   (thread_id, token, socket.gethostname(), os.getpid(), time.time()))
+        return token
+
+    def release(self, thread_id: str, token: str) -> None:
+        """Gives up a claim taken by claim. Does nothing if the claim was taken over as abandoned since."""
+        with self._lock:
+            self._conn.execute("DELETE FROM claims WHERE thread_id = ? AND token = ?", (thread_id, token))
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """Returns a version that sorts after current, in the same format as LangGraph's in-memory saver."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # The async methods run the sync ones in a worker thread, so a commit never blocks the event loop
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        import asyncio
+
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        import asyncio
+
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        import asyncio
+
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        import asyncio
+
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        import asyncio
+
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aclaim(self, thread_id: str) -> str:
+        import asyncio
+
+        return await asyncio.to_thread(self.claim, thread_id)
+
+    def close(self) -> None:
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, mode: str = "") -> sqlite3.Connection:
+        # Caller holds self._lock. In autocommit mode the connection context manager does not
+        # open a transaction itself, so begin one explicitly; it commits or rolls back on exit.
+        # An IMMEDIATE transaction takes the write lock up front, so what it reads cannot change before it writes.
+        self._conn.execute(f"BEGIN {mode}")
+        return self._conn
+
+    def _forget_lists(self, thread_id: str) -> None:
+        # Caller holds self._lock
+        for key in [key for key in self._last_lists if key[0] == thread_id]:
+            del self._last_lists[key]
+
+    def _encode_value(self, key: Tuple[str, str, str], version: str, value: Any) -> Tuple[str, Optional[str], str, bytes]:
+        # Caller holds self._lock. Returns (kind, base_version, value_type, value) for a blobs row.
+        last = self._last_lists.get(key)
+        if not isinstance(value, list):
+            self._last_lists.pop(key, None)
+            return ("full", None, *self.serde.dumps_typed(value))
+        if last is not None:
+            base_version, base_value, depth = last
+            if depth < DELTA_SNAPSHOT_INTERVAL and value[:len(base_value)] == base_value:
+                self._last_lists[key] = (version, list(value), depth + 1)
+                return ("delta", base_version, *self.serde.dumps_typed(value[len(base_value):]))
+        self._last_lists[key] = (version, list(value), 0)
+        return ("full", None, *self.serde.dumps_typed(value))
+
+    def _load_values(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        # Caller holds self._lock
+        values = {}
+        for channel, version in versions.items():
+            tails = []
+            version = str(version)
+            while version is not None:
+                row = self._conn.execute(
+                    "SELECT kind, base_version, value_type, value FROM blobs "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                    (thread_id, checkpoint_ns, channel, version)
+                ).fetchone()
+                if row is None or row[0] == "empty":
+                    break
+                kind, version, value_type, data = row
+                value = self.serde.loads_typed((value_type, data))
+                if kind == "full":
+                    values[channel] = value + [item for tail in reversed(tails) for item in tail] if tails else value
+                    break
+                tails.append(value)
+        return values
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Tuple[str, str, Any]]:
+        # Caller holds self._lock
+        rows = self._conn.execute(
+            "SELECT task_id, idx, task_path, channel, value_type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        rows.sort(key=lambda row: writes_sort_key(row[2], row[0], row[1]))
+        return [(task_id, channel, self.serde.loads_typed((value_type, data)))
+                for task_id, _, _, channel, value_type, data in rows]
+
+def _abandoned(host: str, pid: int, renewed_at: float) -> bool:
+    """Whether a claim's run is gone: its process on this host has exited, or it has not checkpointed for CLAIM_TTL seconds."""
+    if time.time() - renewed_at > CLAIM_TTL:
+        return True
+    if host != socket.gethostname() or os.name == "nt":
+        # A process on another host cannot be checked, and on Windows os.kill would terminate it
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
@@ -0,0 +1,134 @@
+import codecs
+import logging
+import re
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional; the BeautifulSoup backend is always available
+    lxml = None
+
+# An extractor turns raw HTML bytes into at most max_chars characters of main-content text
+Extractor = Callable[[bytes, int], str]
+
+# Elements whose text never belongs in the extracted content
+SKIPPED_TAGS = ("script", "style")
+
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+
+def _join_fragments(fragments: Iterator[str], max_chars: int) -> str:
+    """
+    Joins text fragments with newlines, skipping blank ones, like get_text(separator="\n", strip=True).
+    Stops consuming fragments once max_chars characters have been collected.
+    """
+    parts = []
+    collected = 0
+    for fragment in fragments:
+        fragment = fragment.strip()
+        if not fragment:
+            continue
+        parts.append(fragment)
+        collected += len(fragment) + 1
+        if collected >= max_chars:
+            break
+    return "\n".join(parts)[:max_chars]
+
+def extract_text_bs4(html: bytes, max_chars: int) -> str:
+    """
+    Extracts the main text with BeautifulSoup's html.parser.
+    Prefers <article>, then <main>, then <body>, and drops script and style elements.
+    """
+    from bs4 import BeautifulSoup  # Imported lazily; only needed when this backend is used
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Attempt to find the main content, fall back to body
+    main_content = soup.find("article") or soup.find("main") or soup.body
+    if not main_content:
+        return ""
+    # Remove script and style elements
+    for script_or_style in main_content(list(SKIPPED_TAGS)):
+        script_or_style.decompose()
+    return _join_fragments(main_content.strings, max_chars)
+
+def _sniff_encoding(html: bytes) -> str:
+    """Picks the document encoding from a BOM or <meta> charset, falling back to UTF-8 or Windows-1252."""
+    if html.startswith(codecs.BOM_UTF8):
+        return "utf-8"
+    match = _META_CHARSET_RE.search(html[:4096])
+    if match:
+        declared = match.group(1).decode("ascii", "ignore").lower()
+        try:
+            return codecs.lookup(declared).name
+        except LookupError:
+            pass
+    try:
+        # Tolerate a multi-byte character cut off by the download cap
+        codecs.getincrementaldecoder("utf-8")().decode(html, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "windows-1252"
+
+def _iter_lxml_strings(element: Any) -> Iterator[str]:
+    """Yields the text fragments under element in document order, skipping comments, script and style."""
+    stack = [(False, element)]
+    while stack:
+        is_text, item = stack.pop()
+        if is_text:
+            yield item
+            continue
+        # Push in reverse: the element's text comes first, then its children, then its tail
+        if item is not element and item.tail:
+            stack.append((True, item.tail))
+        if not isinstance(item.tag, str) or item.tag in SKIPPED_TAGS:
+            continue
+        stack.extend((False, child) for child in reversed(item))
+        if item.text:
+            stack.append((True, item.text))
+
+def extract_text_lxml(html: bytes, max_chars: int) -> str:
+    """
+    Extracts the main text with lxml's C HTML parser.
+    Applies the same element preference and filtering as extract_text_bs4.
+    """
+    parser = lxml.html.HTMLParser(encoding=_sniff_encoding(html))
+    root = lxml.html.document_fromstring(html, parser=parser)
+    main_content = root.find(".//article")
+    if main_content is None:
+        main_content = root.find(".//main")
+    if main_content is None:
+        main_content = root.find("body")
+    if main_content is None:
+        return ""
+    return _join_fragments(_iter_lxml_strings(main_content), max_chars)
+
+EXTRACTORS: Dict[str, Extractor] = {"bs4": extract_text_bs4}
+if lxml is not None:
+    EXTRACTORS["lxml"] = extract_text_lxml
+
+DEFAULT_EXTRACTOR = "lxml" if "lxml" in EXTRACTORS else "bs4"
+FALLBACK_EXTRACTOR = "bs4"
+
+def get_extractor(name: Optional[str] = None) -> Extractor:
+    """
+    Returns the extractor registered under name, or the default backend when name is empty.
+    Raises ValueError for unknown or unavailable backends.
+    """
+    name = name or DEFAULT_EXTRACTOR
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown HTML extractor '{name}'. Available: {sorted(EXTRACTORS)}")
+    return EXTRACTORS[name]
+
+def extract_text(html: bytes, max_chars: int, backend: Optional[str] = None) -> str:
+    """
+    Extracts up to max_chars characters of main-content text from raw HTML.
+    If the selected backend fails on a document, the BeautifulSoup backend is tried instead.
+    """
+    extractor = get_extractor(backend)
+    try:
+        return extractor(html, max_chars)
+    except Exception as e:
+        if extractor is EXTRACTORS[FALLBACK_EXTRACTOR]:
+            raise
+        logging.debug(f"[html_extractors] {backend or DEFAULT_EXTRACTOR} failed ({e}); falling back to {FALLBACK_EXTRACTOR}")
+        return EXTRACTORS[FALLBACK_EXTRACTOR](html, max_chars)
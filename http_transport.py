@@ -0,0 +1,263 @@
+import http.cookiejar
+import os
+import socket
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+# Hosts that keep a connection pool, and kept-alive connections per host
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "64"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+# Retries of failed connections and of RETRY_STATUSES responses, with exponential backoff (seconds)
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))
+# Longest Retry-After (seconds) waited before a retry; longer requests are capped to this
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "10"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Seconds a resolved host address is reused for new connections; 0 disables the DNS cache
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", "300"))
+
+class DNSCache:
+    """
+    Thread-safe cache of host name to IP addresses, so new connections to a host skip the resolver.
+    A host's addresses are forgotten after `ttl` seconds, or as soon as none of them accepts a connection.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> List[str]:
+        """Returns the addresses of host in resolver order, resolving it (and raising socket.gaierror) on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(host)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        infos = socket.getaddrinfo(host.strip("[]"), port, allowed_gai_family(), socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._entries[host] = (now + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host: str) -> None:
+        with self._lock:
+            self._entries.pop(host, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+dns_cache = DNSCache(DNS_CACHE_TTL)
+
+class _CachedDNSMixin:
+    def _new_conn(self) -> socket.socket:
+        # urllib3 connects to _dns_host; point it at each cached address just for the connect, so
+        # the Host header, SNI and certificate checks still use the real host name
+        hostname = self._dns_host
+        if dns_cache.ttl <= 0:
+            return super()._new_conn()
+        try:
+            addresses = dns_cache.resolve(hostname, self.port)
+        except OSError:
+            return super()._new_conn()  # Let urllib3 report the resolution failure
+        try:
+            for index, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except Exception:
+                    # Like urllib3 itself, fall back to the host's next address (e.g. IPv4 after IPv6)
+                    if index == len(addresses) - 1:
+                        dns_cache.forget(hostname)
+                        raise
+        finally:
+            self._dns_host = hostname
+
+class CachedDNSHTTPConnection(_CachedDNSMixin, HTTPConnection):
+    pass
+
+class CachedDNSHTTPSConnection(_CachedDNSMixin, HTTPSConnection):
+    pass
+
+class CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CachedDNSHTTPConnection
+
+class CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDNSHTTPSConnection
+
+class CappedRetry(Retry):
+    """Retry policy that honours Retry-After only up to HTTP_RETRY_AFTER_MAX seconds."""
+
+    def get_retry_after(self, response: Any) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, HTTP_RETRY_AFTER_MAX)
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools resolve host names through dns_cache."""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CachedDNSHTTPConnectionPool,
+            "https": CachedDNSHTTPSConnectionPool,
+        }
+
+def retry_policy() -> Retry:
+    """
+    Returns the retry policy for outbound requests: connection failures and RETRY_STATUSES
+    responses are retried HTTP_RETRIES times with exponential backoff. A read that times out
+    or fails once the request was sent is not retried, so a dead or slow host costs one
+    timeout per URL rather than one per attempt. POST is included because the only POSTs
+    sent are idempotent search queries. After the last attempt the error response is
+    returned as-is, so callers' raise_for_status() still reports it.
+    """
+    return CappedRetry(
+        total=HTTP_RETRIES, connect=HTTP_RETRIES, read=0, status=HTTP_RETRIES,
+        backoff_factor=HTTP_RETRY_BACKOFF, status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"},
+        respect_retry_after_header=True, raise_on_status=False,
+    )
+
+def create_session() -> requests.Session:
+    """
+    Builds a session with per-host keep-alive connection pools (HTTP_POOL_HOSTS hosts of
+    HTTP_POOL_MAXSIZE connections), cached DNS, the retry_policy and every response
+    compression urllib3 can decode. Cookies are never stored, so runs sharing the session
+    stay independent.
+    """
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    adapter = PooledHTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                                max_retries=retry_policy())
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Returns the session shared by all outbound HTTP in the process, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    """Sends a GET through the shared session (same arguments as requests.get)."""
+    return get_session().get(url, **kwargs)
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    """Sends a POST through the shared session (same arguments as requests.post)."""
+    return get_session().post(url, **kwargs)
+
+def close_session() -> None:
+    """Closes the shared session's pooled connections and empties the DNS cache."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+    dns_cache.clear()
+
+# Async sessions, one per event loop (aiohttp sessions cannot be shared between loops)
+_async_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+def create_async_session() -> Any:
+    """
+    Async counterpart of create_session, for the running event loop: an aiohttp session
+    with the same per-host connection limit, DNS cache TTL and cookie policy. aiohttp
+    advertises and decodes the compressions it supports by itself.
+    """
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=HTTP_POOL_HOSTS * HTTP_POOL_MAXSIZE, limit_per_host=HTTP_POOL_MAXSIZE,
+                                     use_dns_cache=DNS_CACHE_TTL > 0, ttl_dns_cache=DNS_CACHE_TTL or None)
+    return aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+
+def get_async_session() -> Any:
+    """Returns the async session shared by all coroutines on the running event loop, creating it on first use."""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = create_async_session()
+        _async_sessions[loop] = session
+    return session
+
+def _retry_wait(attempt: int, response: Any = None) -> float:
+    # Same waits as retry_policy(): a capped Retry-After when the response has one, else exponential backoff
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(retry_policy().parse_retry_after(retry_after), HTTP_RETRY_AFTER_MAX)
+        except Exception:
+            pass
+    return min(Retry.DEFAULT_BACKOFF_MAX, HTTP_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+async def arequest(method: str, url: str, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+    """
+    Sends a request through the running loop's async session (same arguments as
+    aiohttp.ClientSession.request, with timeout in seconds for connecting and for each read).
+    Connection failures and RETRY_STATUSES responses are retried like retry_policy() does
+    (read timeouts are not), and after the last attempt the error response is returned as-is. The response body is
+    streamed: the caller reads it and then releases the response.
+    """
+    import asyncio
+    import aiohttp
+
+    if timeout is not None:
+        kwargs["timeout"] = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+    session = get_async_session()
+    attempt = 0
+    while True:
+        try:
+            response = await session.request(method, url, **kwargs)
+        except (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError):
+            if attempt >= HTTP_RETRIES:
+                raise
+            attempt += 1
+            await asyncio.sleep(_retry_wait(attempt))
+            continue
+        if response.status not in RETRY_STATUSES or attempt >= HTTP_RETRIES:
+            return response
+        attempt += 1
+        wait = _retry_wait(attempt, response)
+        # Read the (small) error body first: releasing an unread response closes its connection instead of pooling it
+        try:
+            await response.read()
+        except aiohttp.ClientError:
+            pass
+        response.release()
+        await asyncio.sleep(wait)
+
+async def aget(url: str, **kwargs: Any) -> Any:
+    """Sends a GET through the running loop's async session (see arequest)."""
+    return await arequest("GET", url, **kwargs)
+
+async def apost(url: str, **kwargs: Any) -> Any:
+    """Sends a POST through the running loop's async session (see arequest)."""
+    return await arequest("POST", url, **kwargs)
+
+async def aclose_session() -> None:
+    """Closes the running loop's async session and its pooled connections."""
+    import asyncio
+
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
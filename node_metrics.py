@@ -0,0 +1,90 @@
+import contextvars
+import inspect
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+# Counters kept for every node run, in the order they are reported
+COUNTERS = ("llm_calls", "llm_retries", "search_calls", "http_requests", "bytes_fetched", "cache_hits", "cache_misses", "errors")
+
+class NodeRecorder:
+    """Thread-safe counters for one run of one node."""
+
+    def __init__(self, node: str):
+        self.node = node
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[counter] += amount
+
+_current: contextvars.ContextVar[Optional[NodeRecorder]] = contextvars.ContextVar("node_metrics_recorder", default=None)
+
+def record(counter: str, amount: int = 1) -> None:
+    """
+    Adds amount to counter for the node currently running in this context.
+    Does nothing outside an instrumented node (e.g. when a node function is called directly).
+    """
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.add(counter, amount)
+
+def _finish(recorder: NodeRecorder, update: Dict[str, Any], started_at: float, wall_time: float) -> Dict[str, Any]:
+    if update.get("error_message"):
+        recorder.add("errors")
+    metrics = {"node": recorder.node, "started_at": started_at, "wall_time_s": round(wall_time, 4), **recorder.counts}
+    return {**update, "node_metrics": [metrics]}
+
+def instrument_node(name: str, func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """
+    Wraps a graph node so each run is timed and its counters are attributed to name.
+    The run's metrics are appended to the node's update under 'node_metrics'.
+    Coroutine functions get a coroutine wrapper, so async nodes stay async.
+    """
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(state: Any) -> Dict[str, Any]:
+            recorder = NodeRecorder(name)
+            token = _current.set(recorder)
+            started_at = time.time()
+            start = time.perf_counter()
+            try:
+                update = await func(state) or {}
+            except Exception:
+                recorder.add("errors")
+                raise
+            finally:
+                wall_time = time.perf_counter() - start
+                _current.reset(token)
+            return _finish(recorder, update, started_at, wall_time)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(state: Any) -> Dict[str, Any]:
+        recorder = NodeRecorder(name)
+        token = _current.set(recorder)
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            update = func(state) or {}
+        except Exception:
+            recorder.add("errors")
+            raise
+        finally:
+            wall_time = time.perf_counter() - start
+            _current.reset(token)
+        return _finish(recorder, update, started_at, wall_time)
+    return wrapper
+
+def summarize_metrics(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Sums node_metrics records per node, with the number of runs and total wall time."""
+    totals: Dict[str, Dict[str, Any]] = {}
+    for metrics in records:
+        entry = totals.setdefault(metrics["node"], {"runs": 0, "wall_time_s": 0.0, **dict.fromkeys(COUNTERS, 0)})
+        entry["runs"] += 1
+        entry["wall_time_s"] = round(entry["wall_time_s"] + metrics["wall_time_s"], 4)
+        for counter in COUNTERS:
+            entry[counter] += metrics.get(counter, 0)
+    return totals
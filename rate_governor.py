@@ -0,0 +1,319 @@
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Provider quota shared by every LLM call in the process; 0 leaves that dimension unlimited
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Ceiling on LLM calls in flight; the governor halves its limit on throttling and creeps back up on success
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MIN_CONCURRENCY = 1
+# Retries of rate-limited, overloaded or failed-connection LLM calls, with full-jitter exponential backoff (seconds)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "1"))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "60"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_THROTTLE_MESSAGE = re.compile(r"\b429\b|resource[ _]exhausted|rate[ _-]?limit", re.IGNORECASE)
+# Gemini puts its suggested wait in the error text, e.g. "retry_delay { seconds: 17 }" or "retryDelay': '17s'"
+_RETRY_DELAY = re.compile(r"retry_?delay\W+(?:seconds\W+)?(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+def _error_chain(exc: Optional[BaseException]):
+    # Client libraries wrap the transport error; look through the causes as well
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    for value in (getattr(exc, "code", None), getattr(exc, "status_code", None),
+                  getattr(getattr(exc, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Returns True for errors worth retrying after a pause: rate limits (429), server errors (5xx),
+    and connection failures or timeouts. Anything else (bad request, auth, safety blocks) is final.
+    """
+    for error in _error_chain(exc):
+        flag = getattr(error, "is_retryable", None)
+        if isinstance(flag, bool):
+            return flag
+        status = _status_code(error)
+        if status is not None:
+            return status in RETRY_STATUSES
+        if isinstance(error, (ConnectionError, TimeoutError)) or _THROTTLE_MESSAGE.search(str(error)):
+            return True
+    return False
+
+def retry_delay_hint(exc: BaseException) -> Optional[float]:
+    """Returns the wait (seconds) the provider asked for in the error, if any."""
+    for error in _error_chain(exc):
+        match = _RETRY_DELAY.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+class TokenBucket:
+    """
+    Thread-safe token bucket holding up to one minute of quota and refilling continuously.
+    acquire() waits for capacity before a call; consume() charges usage only known afterwards,
+    and may leave the bucket in debt so later callers wait it off.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take(self, amount: float) -> float:
+        # Takes amount and returns 0 when it is available, else returns the seconds until it will be
+        with self._lock:
+            self._refill()
+            if self.level >= amount:
+                self.level -= amount
+                return 0.0
+            return (amount - self.level) / self.rate
+
+    def acquire(self, amount: float = 1) -> None:
+        """Waits until amount (capped at the bucket's capacity) is available, then takes it."""
+        amount = min(amount, self.capacity)
+        while True:
+            wait = self._take(amount)
+            if not wait:
+                return
+            self._sleep(wait)
+
+    async def aacquire(self, amount: float = 1) -> None:
+        """Like acquire, but waits without blocking the event loop."""
+        # asyncio is imported on first use, as it adds noticeably to the startup of sync-only runs
+        import asyncio
+
+        amount = min(amount, self.capacity)
+        while True:
+            wait = self._take(amount)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def consume(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self.level -= amount
+
+class RateGovernor:
+    """
+    Client-side governor for calls to a rate-limited provider.
+
+    - Requests and tokens per minute are metered by token buckets, so bursts are smoothed
+      to the configured quota instead of being rejected by the provider.
+    - The number of calls in flight follows AIMD: the limit halves when a call is throttled
+      (at most once per congestion event) and grows by about one per limit's worth of successes.
+    - Retryable failures are retried up to max_retries times after a full-jitter exponential
+      backoff, or after the delay the provider asked for when that is longer.
+
+    call() and acall() share the quota and the limit, so threads and coroutines can use one governor.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 8, min_concurrency: int = 1, max_retries: int = 5,
+                 backoff: float = 1.0, max_backoff: float = 60.0,
+                 on_retry: Optional[Callable[[BaseException, int, float], None]] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.requests = TokenBucket(requests_per_minute, clock, sleep) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute, clock, sleep) if tokens_per_minute > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_retry = on_retry
+        self._sleep = sleep
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        # Bumped on every decrease; calls started before it do not decrease the limit again
+        self._generation = 0
+        self._stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0}
+        self._cond = threading.Condition()
+        # Coroutines waiting in _aenter, woken on their own loop whenever a slot may have opened
+        self._async_waiters: List[Tuple["asyncio.AbstractEventLoop", "asyncio.Future"]] = []
+
+    @property
+    def limit(self) -> int:
+        with self._cond:
+            return int(self._limit)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the call counters and the current concurrency limit and calls in flight."""
+        with self._cond:
+            return {**self._stats, "limit": int(self._limit), "in_flight": self._in_flight}
+
+    def _enter(self) -> int:
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+            return self._generation
+
+    async def _aenter(self) -> int:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._in_flight < int(self._limit):
+                    self._in_flight += 1
+                    return self._generation
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def _leave(self, generation: int, throttled: Optional[bool]) -> None:
+        # throttled=None releases the slot without adjusting the limit (the call was abandoned)
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self._stats["throttled"] += 1
+                if generation == self._generation:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._generation += 1
+            elif throttled is not None and self._limit < self.max_concurrency:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # The waiter's loop is closed
+
+    def backoff_delay(self, attempt: int, exc: BaseException) -> float:
+        """Returns how long to wait before retry number attempt (1-based) after exc."""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        hint = retry_delay_hint(exc)
+        if hint is not None:
+            delay = max(delay, hint + random.uniform(0, self.backoff))
+        return min(delay, self.max_backoff)
+
+    def _failed(self, generation: int, attempt: int, exc: BaseException) -> Optional[float]:
+        # Records a failed attempt; returns the wait before the next one, or None when exc is final
+        retryable = is_retryable(exc)
+        self._leave(generation, throttled=retryable)
+        if not retryable or attempt >= self.max_retries:
+            with self._cond:
+                self._stats["failures"] += 1
+            return None
+        delay = self.backoff_delay(attempt + 1, exc)
+        with self._cond:
+            self._stats["retries"] += 1
+        if self.on_retry:
+            self.on_retry(exc, attempt + 1, delay)
+        return delay
+
+    def _succeeded(self, generation: int) -> None:
+        self._leave(generation, throttled=False)
+        with self._cond:
+            self._stats["calls"] += 1
+
+    def call(self, func: Callable[[], Any], tokens: float = 0) -> Any:
+        """
+        Runs func under the quota and concurrency limit, charging one request and tokens
+        (the estimated prompt size) to the buckets before each attempt. Non-retryable errors,
+        and the last error once the retries are used up, are raised to the caller.
+        """
+        attempt = 0
+        while True:
+            if self.requests:
+                self.requests.acquire(1)
+            if self.tokens and tokens:
+                self.tokens.acquire(tokens)
+            generation = self._enter()
+            try:
+                result = func()
+            except Exception as exc:
+                delay = self._failed(generation, attempt, exc)
+                if delay is None:
+                    raise
+                attempt += 1
+                self._sleep(delay)
+                continue
+            except BaseException:
+                self._leave(generation, throttled=None)
+                raise
+            self._succeeded(generation)
+            return result
+
+    async def acall(self, func: Callable[[], Awaitable[Any]], tokens: float = 0) -> Any:
+        """Async counterpart of call: func returns the awaitable to run, and waits do not block the event loop."""
+        import asyncio
+
+        attempt = 0
+        while True:
+            if self.requests:
+                await self.requests.aacquire(1)
+            if self.tokens and tokens:
+                await self.tokens.aacquire(tokens)
+            generation = await self._aenter()
+            try:
+                result = await func()
+            except Exception as exc:
+                delay = self._failed(generation, attempt, exc)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled: free the slot without counting the call either way
+                self._leave(generation, throttled=None)
+                raise
+            self._succeeded(generation)
+            return result
+
+    def charge_tokens(self, tokens: float) -> None:
+        """Charges tokens only known after a call (e.g. the response) to the tokens-per-minute quota."""
+        if self.tokens and tokens:
+            self.tokens.consume(tokens)
+
+def _wake(waiter: "asyncio.Future") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+_governor: Optional[RateGovernor] = None
+_governor_lock = threading.Lock()
+
+def get_governor(on_retry: Optional[Callable[[BaseException, int, float], None]] = None) -> RateGovernor:
+    """Returns the governor shared by every LLM call in the process, creating it from the settings on first use."""
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = RateGovernor(
+                    requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                    max_concurrency=LLM_MAX_CONCURRENCY, min_concurrency=LLM_MIN_CONCURRENCY,
+                    max_retries=LLM_MAX_RETRIES, backoff=LLM_RETRY_BACKOFF, max_backoff=LLM_RETRY_MAX,
+                    on_retry=on_retry,
+                )
+    return _governor
+
+def reset_governor() -> None:
+    """Drops the shared governor so the next call rebuilds it from the current settings."""
+    global _governor
+    with _governor_lock:
+        _governor = None
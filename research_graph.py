@@ -1,25 +1,442 @@
+import contextvars
+import hashlib
+import multiprocessing
 import os
+import threading
+import time
+import weakref
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from dotenv import load_dotenv
-from typing import TypedDict, List, Dict, Any
+import operator
+from typing import TypedDict, List, Dict, Any, Awaitable, Callable, Optional, Tuple, Annotated
 from operator import itemgetter
 
-from langchain_google_genai import GoogleGenerativeAI
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_core.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph
-from langchain_core.messages import HumanMessage
-from bs4 import BeautifulSoup
-import requests
+import node_metrics
+import rate_governor
+from cache_store import SQLiteCache, TieredCache
+from html_extractors import extract_text
+from text_analysis import bm25_scores, canonicalize_url, estimate_tokens, find_near_duplicates, select_passages
 
-# 1. Load environment variables
+# LangChain, LangGraph, the Gemini client, requests (via http_transport) and asyncio are imported on first use
+# so that importing this module (for ResearchState, --help or test collection) stays fast.
+
+# 1. Load environment variables (cheap, and the settings below are read from them)
 load_dotenv()
 
-# 2. Initialize LLM
-llm = GoogleGenerativeAI(model="gemini-2.5-flash-preview-04-17", temperature=0)
+# 2. LLM settings; the client itself is constructed by get_llm() on the first call_llm
+LLM_MODEL = "gemini-2.5-flash-preview-04-17"
+LLM_TEMPERATURE = 0
+llm = None
+_clients_lock = threading.Lock()
+
+# Search tool class, resolved by _get_search_tool_class() on first use
+TavilySearchResults = None
+
+def get_llm() -> Any:
+    """Returns the shared LLM client, constructing it on first use."""
+    global llm
+    if llm is None:
+        with _clients_lock:
+            if llm is None:
+                from langchain_google_genai import GoogleGenerativeAI
+                # One attempt per invoke: retries and backoff are left to the rate governor in call_llm
+                llm = GoogleGenerativeAI(model=LLM_MODEL, temperature=LLM_TEMPERATURE, max_retries=1)
+    return llm
+
+def _pooled_tavily_tool_class() -> Any:
+    """
+    Returns a TavilySearchResults subclass whose API requests go through the shared HTTP transport
+    (the pooled session for invoke, the running loop's async session for ainvoke).
+    """
+    import http_transport
+    from pydantic import Field
+    from langchain_community.tools.tavily_search import TavilySearchResults as tool_class
+    from langchain_community.utilities.tavily_search import TAVILY_API_URL, TavilySearchAPIWrapper
+
+    class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+        def _search_params(self, query: str, max_results: Optional[int], search_depth: Optional[str],
+                           include_domains: Optional[List[str]], exclude_domains: Optional[List[str]],
+                           include_answer: Optional[bool], include_raw_content: Optional[bool],
+                           include_images: Optional[bool]) -> Dict[str, Any]:
+            return {
+                "api_key": self.tavily_api_key.get_secret_value(),
+                "query": query,
+                "max_results": max_results,
+                "search_depth": search_depth,
+                "include_domains": include_domains or [],
+                "exclude_domains": exclude_domains or [],
+                "include_answer": include_answer,
+                "include_raw_content": include_raw_content,
+                "include_images": include_images,
+            }
+
+        def raw_results(self, query: str, max_results: Optional[int] = 5, search_depth: Optional[str] = "advanced",
+                        include_domains: Optional[List[str]] = None, exclude_domains: Optional[List[str]] = None,
+                        include_answer: Optional[bool] = False, include_raw_content: Optional[bool] = False,
+                        include_images: Optional[bool] = False) -> Dict[str, Any]:
+            params = self._search_params(query, max_results, search_depth, include_domains, exclude_domains,
+                                         include_answer, include_raw_content, include_images)
+            response = http_transport.post(f"{TAVILY_API_URL}/search", json=params, timeout=SEARCH_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+
+        async def raw_results_async(self, query: str, max_results: Optional[int] = 5,
+                                    search_depth: Optional[str] = "advanced",
+                                    include_domains: Optional[List[str]] = None,
+                                    exclude_domains: Optional[List[str]] = None,
+                                    include_answer: Optional[bool] = False, include_raw_content: Optional[bool] = False,
+                                    include_images: Optional[bool] = False) -> Dict[str, Any]:
+            params = self._search_params(query, max_results, search_depth, include_domains, exclude_domains,
+                                         include_answer, include_raw_content, include_images)
+            response = await http_transport.apost(f"{TAVILY_API_URL}/search", json=params, timeout=SEARCH_TIMEOUT)
+            try:
+                response.raise_for_status()
+                return await response.json()
+            finally:
+                response.release()
+
+    class PooledTavilySearchResults(tool_class):
+        api_wrapper: TavilySearchAPIWrapper = Field(default_factory=PooledTavilySearchAPIWrapper)
+
+    return PooledTavilySearchResults
+
+def _get_search_tool_class() -> Any:
+    """Returns the search tool class, importing langchain_community on first use."""
+    global TavilySearchResults
+    if TavilySearchResults is None:
+        TavilySearchResults = _pooled_tavily_tool_class()
+    return TavilySearchResults
+
+_search_tools: Dict[Tuple[Any, int], Any] = {}
+
+def _get_search_tool(max_results: int) -> Any:
+    """Returns the search tool shared by all runs in the process, one instance per result count."""
+    tool_class = _get_search_tool_class()
+    key = (tool_class, max_results)
+    with _clients_lock:
+        if key not in _search_tools:
+            _search_tools[key] = tool_class(max_results=max_results)
+        return _search_tools[key]
+
+def _build_prompt(template: str, **values: Any) -> List[Any]:
+    """Formats a prompt template into the single-message list passed to call_llm."""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.messages import HumanMessage
+
+    prompt = ChatPromptTemplate.from_template(template).format(**values)
+    return [HumanMessage(content=prompt)]
+
+# Responses are memoized on (model, temperature, prompt hash); set LLM_CACHE_ENABLED=0 to bypass
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+def _llm_cache_key(messages: Any) -> str:
+    """Builds the response-cache key from the model name, temperature and a hash of the full prompt."""
+    # Read from the client when it exists, normalized so keys match before and after construction
+    model = str(getattr(llm, "model", LLM_MODEL)).removeprefix("models/")
+    temperature = float(getattr(llm, "temperature", LLM_TEMPERATURE))
+    if isinstance(messages, str):
+        parts = [messages]
+    else:
+        parts = [f"{getattr(m, 'type', type(m).__name__)}:{getattr(m, 'content', m)}" for m in messages]
+    digest = hashlib.sha256("\x1e".join(parts).encode("utf-8")).hexdigest()
+    return f"{model}:{temperature}:{digest}"
+
+def _record_llm_retry(error: BaseException, attempt: int, delay: float) -> None:
+    node_metrics.record("llm_retries")
+
+def _prompt_tokens(messages: Any) -> int:
+    if isinstance(messages, str):
+        return estimate_tokens(messages)
+    return sum(estimate_tokens(str(getattr(m, "content", m))) for m in messages)
+
+def _lookup_llm_cache(messages: Any, use_cache: bool) -> Tuple[Optional[TieredCache], Optional[str], Any]:
+    """Returns (cache or None, cache key, cached entry or None) for a call_llm prompt, recording the hit or miss."""
+    cache = None
+    if use_cache and LLM_CACHE_ENABLED:
+        cache = _get_cache("llm", LLM_CACHE_TTL, LLM_CACHE_MAX_MB, LLM_CACHE_MEMORY_ENTRIES)
+    if not cache:
+        return None, None, None
+    key = _llm_cache_key(messages)
+    cached = cache.get(key)
+    node_metrics.record("cache_hits" if cached else "cache_misses")
+    return cache, key, cached
+
+def _finish_llm_call(governor: rate_governor.RateGovernor, cache: Optional[TieredCache], key: Optional[str],
+                     response: Any) -> None:
+    # The response counts against the tokens-per-minute quota too, but its size is only known now
+    governor.charge_tokens(estimate_tokens(str(getattr(response, "content", response))))
+    if cache and isinstance(response, str):
+        cache.set(key, response)
+
+class _CachedResponse(str):
+    """A response answered from the LLM response cache, so no provider tokens were spent on it."""
+
+def call_llm(messages, use_cache: bool = True):
+    """
+    Single chokepoint for every model call.
+    Identical prompts are answered from the LLM response cache unless use_cache is False
+    or the cache is disabled; only plain-text responses are stored. Cached answers are
+    returned as _CachedResponse, so their usage is not charged to RUN_TOKEN_BUDGET.
+    Calls that reach the model go through the shared rate governor, which keeps them within
+    the configured quota and concurrency and retries rate-limited or failed attempts.
+    """
+    cache, key, cached = _lookup_llm_cache(messages, use_cache)
+    if cached:
+        return _CachedResponse(cached.value)
 
-def call_llm(messages):
     # GoogleGenerativeAI uses .invoke (not .invoke_llm)
-    return llm.invoke(messages)
+    node_metrics.record("llm_calls")
+    governor = rate_governor.get_governor(on_retry=_record_llm_retry)
+    response = governor.call(lambda: get_llm().invoke(messages), tokens=_prompt_tokens(messages))
+    _finish_llm_call(governor, cache, key, response)
+    return response
+
+async def acall_llm(messages, use_cache: bool = True):
+    """
+    Async counterpart of call_llm, with the same response cache and rate governor.
+    The model is called through ainvoke; cache reads and writes run in a worker thread so a
+    busy SQLite file never blocks the event loop.
+    """
+    import asyncio
+
+    cache, key, cached = await asyncio.to_thread(_lookup_llm_cache, messages, use_cache)
+    if cached:
+        return _CachedResponse(cached.value)
+
+    node_metrics.record("llm_calls")
+    governor = rate_governor.get_governor(on_retry=_record_llm_retry)
+    response = await governor.acall(lambda: get_llm().ainvoke(messages), tokens=_prompt_tokens(messages))
+    await asyncio.to_thread(_finish_llm_call, governor, cache, key, response)
+    return response
+
+# Upper bound on concurrent page fetches across a scraping run
+SCRAPE_MAX_WORKERS = int(os.getenv("SCRAPE_MAX_WORKERS", "8"))
+# Downloads are streamed and cut off at SCRAPE_MAX_BYTES; extraction stops after SCRAPE_MAX_CHARS characters,
+# of which the run's state keeps only the passages most relevant to the topic (SUMMARY_INPUT_TOKENS worth)
+SCRAPE_MAX_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", str(2 * 1024 * 1024)))
+SCRAPE_MAX_CHARS = int(os.getenv("SCRAPE_MAX_CHARS", "40000"))
+# HTML-to-text backend ("lxml" or "bs4"); empty selects the fastest one installed
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "")
+# Worker processes for HTML extraction: "0" extracts in the fetching thread, "auto" uses one per CPU core
+SCRAPE_PARSE_PROCESSES = os.getenv("SCRAPE_PARSE_PROCESSES", "0")
+# Responses declaring any other content type are rejected before the body is downloaded
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# Upper bound on concurrent search queries and the time to wait for each one (seconds)
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "5"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "20"))
+# Upper bound on summarization LLM calls in flight at once
+SUMMARIZE_MAX_WORKERS = int(os.getenv("SUMMARIZE_MAX_WORKERS", "4"))
+# Estimated-token budget for the page text in each summarization prompt, filled with the passages most relevant to the topic
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", "1250"))
+# Only the RANK_TOP_K most relevant scraped pages are summarized (0 keeps all of them)
+RANK_TOP_K = int(os.getenv("RANK_TOP_K", "8"))
+# Pages scoring below this fraction of the best page's relevance score are skipped (0 disables the cut-off)
+RANK_MIN_SCORE = float(os.getenv("RANK_MIN_SCORE", "0"))
+# Minimum SimHash similarity (0-1) for two scraped pages to count as near-duplicates; 0 disables the check
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# Upper bound on documents moving through scrape -> summarize at once in pipelined mode
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "8"))
+# Summaries beyond REPORT_TOKEN_BUDGET (estimated tokens) are merged in groups of REPORT_GROUP_SIZE before the final report
+REPORT_TOKEN_BUDGET = int(os.getenv("REPORT_TOKEN_BUDGET", "24000"))
+REPORT_GROUP_SIZE = int(os.getenv("REPORT_GROUP_SIZE", "6"))
+REPORT_MAX_REDUCE_LEVELS = 4
+# Estimated-token budget for all LLM calls of one run; summarize and compile shrink or skip inputs to respect it (0 = unlimited)
+RUN_TOKEN_BUDGET = int(os.getenv("RUN_TOKEN_BUDGET", "0"))
+# Planning estimates used to fit a run into RUN_TOKEN_BUDGET before the calls are made
+PROMPT_OVERHEAD_TOKENS = 100
+SUMMARY_OUTPUT_TOKENS = 400
+REPORT_OUTPUT_TOKENS = 2000
+MIN_SUMMARY_INPUT_TOKENS = 250
+SUMMARY_SEPARATOR = "\n\n---\n\n"
+
+# On-disk caches live under CACHE_DIR; a TTL of 0 disables the corresponding cache
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", ".research_cache")
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "86400"))
+PAGE_CACHE_MAX_MB = float(os.getenv("PAGE_CACHE_MAX_MB", "256"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "21600"))
+SEARCH_CACHE_MAX_MB = float(os.getenv("SEARCH_CACHE_MAX_MB", "64"))
+SEARCH_CACHE_MEMORY_ENTRIES = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "604800"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "128"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+
+# Number of results requested from the search tool per query
+SEARCH_MAX_RESULTS = 3
+
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+
+def _get_cache(name: str, ttl: float, max_mb: float, memory_entries: int = 0) -> Optional[TieredCache]:
+    """
+    Returns the named cache, opening its SQLite file under CACHE_DIR on first use.
+    memory_entries sizes the in-memory LRU tier kept in front of the file.
+    Returns None when the cache is disabled (ttl <= 0).
+    """
+    if ttl <= 0:
+        return None
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+            disk = SQLiteCache(path, ttl=ttl, max_bytes=int(max_mb * 1024 * 1024))
+            cache = TieredCache(disk, memory_entries=memory_entries)
+            _caches[name] = cache
+        return cache
+
+# Worker pools shared by every run in the process, keyed by pool name ("scrape", "search", "llm")
+_executors: Dict[str, Tuple[ThreadPoolExecutor, int]] = {}
+_executors_lock = threading.Lock()
+
+def _get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """
+    Returns the process-wide thread pool with the given name, creating it on first use.
+    The pool bounds concurrency across all runs sharing the process; it is rebuilt if max_workers changes.
+    """
+    max_workers = max(1, max_workers)
+    with _executors_lock:
+        executor, size = _executors.get(name, (None, 0))
+        if executor is None or size != max_workers:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"research-{name}")
+            _executors[name] = (executor, max_workers)
+        return executor
+
+def _retire_executor(name: str, executor: ThreadPoolExecutor) -> None:
+    """
+    Stops handing out executor as the named pool, so the next caller gets a fresh one.
+    Used when a worker is stuck on a call that cannot be interrupted; work already queued still runs.
+    """
+    with _executors_lock:
+        if _executors.get(name, (None, 0))[0] is executor:
+            del _executors[name]
+    executor.shutdown(wait=False)
+
+def _is_retired(name: str, executor: ThreadPoolExecutor) -> bool:
+    with _executors_lock:
+        return _executors.get(name, (None, 0))[0] is not executor
+
+def shutdown_executors() -> None:
+    """Stops the shared worker pools (they are recreated on next use)."""
+    with _executors_lock:
+        for executor, _ in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+
+def _submit_in_context(executor: ThreadPoolExecutor, func: Callable[..., Any], *args: Any) -> Any:
+    """Submits func to executor so it runs with the caller's context variables (e.g. the node metrics recorder)."""
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+def _map_concurrently(func: Callable[[Any], Any], items: List[Any], max_workers: int, pool: str) -> List[Any]:
+    """
+    Applies func to every item on the named shared thread pool (at most max_workers at once).
+    Returns the results in the same order as the input items.
+    func must not itself wait on work submitted to the same pool.
+    """
+    if not items:
+        return []
+    if len(items) == 1:
+        return [func(items[0])]
+    executor = _get_executor(pool, max_workers)
+    futures = [_submit_in_context(executor, func, item) for item in items]
+    return [future.result() for future in futures]
+
+# Async counterparts of the shared pools: one semaphore per pool name and event loop
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[asyncio.Semaphore, int]]]" = \
+    weakref.WeakKeyDictionary()
+
+def _get_semaphore(name: str, max_workers: int) -> "asyncio.Semaphore":
+    """
+    Returns the semaphore with the given name for the running event loop, creating it on first use.
+    Like _get_executor it bounds concurrency across all runs sharing the loop; it is replaced if max_workers changes.
+    """
+    import asyncio
+
+    max_workers = max(1, max_workers)
+    semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore, size = semaphores.get(name, (None, 0))
+    if semaphore is None or size != max_workers:
+        semaphore = asyncio.Semaphore(max_workers)
+        semaphores[name] = (semaphore, max_workers)
+    return semaphore
+
+async def _amap_concurrently(func: Callable[[Any], Awaitable[Any]], items: List[Any], max_workers: int,
+                             pool: str) -> List[Any]:
+    """
+    Async counterpart of _map_concurrently: awaits func on every item, at most max_workers at once
+    across the runs on this event loop sharing the named pool. Returns the results in input order.
+    """
+    import asyncio
+
+    semaphore = _get_semaphore(pool, max_workers)
+
+    async def run(item: Any) -> Any:
+        async with semaphore:
+            return await func(item)
+
+    return list(await asyncio.gather(*(run(item) for item in items)))
+
+def _response_text(llm_response: Any) -> str:
+    return llm_response.content if hasattr(llm_response, "content") else str(llm_response)
+
+def _usage_record(node: str, document: Optional[str], prompt: List[Any], llm_response: Any) -> Dict[str, Any]:
+    """
+    Builds the token_usage entry for one LLM call from its prompt messages and response.
+    Answers from the response cache are marked "cached" and are left out of the totals and the budget.
+    """
+    input_tokens = sum(estimate_tokens(getattr(message, "content", str(message))) for message in prompt)
+    record = {"node": node, "document": document, "input_tokens": input_tokens,
+              "output_tokens": estimate_tokens(_response_text(llm_response))}
+    if isinstance(llm_response, _CachedResponse):
+        record["cached"] = True
+    return record
+
+def token_usage_totals(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Sums the token_usage records of provider calls per node, plus an overall "total" entry."""
+    totals: Dict[str, Dict[str, int]] = {}
+    for record in records:
+        if record.get("cached"):
+            continue
+        for key in (record["node"], "total"):
+            entry = totals.setdefault(key, {"input_tokens": 0, "output_tokens": 0, "calls": 0})
+            entry["input_tokens"] += record["input_tokens"]
+            entry["output_tokens"] += record["output_tokens"]
+            entry["calls"] += 1
+    return totals
+
+def _remaining_tokens(state: Dict[str, Any]) -> Optional[int]:
+    """Returns how many tokens of RUN_TOKEN_BUDGET are left, or None when the run is unbudgeted."""
+    if RUN_TOKEN_BUDGET <= 0:
+        return None
+    return RUN_TOKEN_BUDGET - sum(r["input_tokens"] + r["output_tokens"] for r in state.get("token_usage", [])
+                                  if not r.get("cached"))
+
+def _plan_summaries(doc_count: int, remaining: Optional[int]) -> Tuple[int, int]:
+    """
+    Decides how many documents to summarize and the input-token cap for each one.
+    Keeps room for the report step; shrinks inputs first and drops the lowest-ranked documents
+    once inputs would fall below MIN_SUMMARY_INPUT_TOKENS. Returns (documents to keep, tokens per document).
+    """
+    if remaining is None:
+        return doc_count, SUMMARY_INPUT_TOKENS
+    # Each summary costs its prompt and output, and its output is read again by the report prompt
+    available = remaining - REPORT_OUTPUT_TOKENS - PROMPT_OVERHEAD_TOKENS
+    for keep in range(doc_count, 0, -1):
+        per_doc = min(SUMMARY_INPUT_TOKENS, available // keep - PROMPT_OVERHEAD_TOKENS - 2 * SUMMARY_OUTPUT_TOKENS)
+        if per_doc >= MIN_SUMMARY_INPUT_TOKENS:
+            return keep, per_doc
+    return 0, 0
+
+def _fit_summaries(summaries: List[str], max_tokens: int) -> List[str]:
+    """Drops trailing (lowest-ranked) summaries, then truncates the first one, until they fit max_tokens."""
+    fitted = list(summaries)
+    while len(fitted) > 1 and estimate_tokens(SUMMARY_SEPARATOR.join(fitted)) > max_tokens:
+        fitted.pop()
+    if fitted and estimate_tokens(fitted[0]) > max_tokens:
+        fitted[0] = fitted[0][:max(0, max_tokens) * 4]
+    return fitted
 
 # 3. Define ResearchState TypedDict
 class ResearchState(TypedDict):
@@ -30,222 +447,892 @@ class ResearchState(TypedDict):
     summaries: List[str]
     final_report: str
     error_message: str
-    messages: List[Any]
+    # Append-only log: nodes return just their new entries and the reducer appends them
+    messages: Annotated[List[Any], operator.add]
+    # Per-document results of the pipelined mode, appended concurrently by document_processor branches
+    processed_docs: Annotated[List[Dict[str, Any]], operator.add]
+    # One record per LLM call: node, document URL (or None) and estimated input/output tokens
+    token_usage: Annotated[List[Dict[str, Any]], operator.add]
+    # One record per node run: wall time and counters (see node_metrics.instrument_node)
+    node_metrics: Annotated[List[Dict[str, Any]], operator.add]
 
 # --- Node function stubs (to be implemented in next steps) ---
 
+def _queries_error(error_message: str) -> Dict[str, Any]:
+    return {
+        "search_queries": [],
+        "messages": [{"role": "system", "content": error_message}],
+        "error_message": error_message
+    }
+
+def _queries_prompt(topic: str) -> List[Any]:
+    return _build_prompt(
+        "Given the research topic: '{topic}', generate 3-5 effective search queries that would help find relevant information online. "
+        "Return the queries as a numbered list.",
+        topic=topic.strip()
+    )
+
+def _queries_update(prompt: List[Any], llm_response: Any) -> Dict[str, Any]:
+    """Parses the LLM's numbered list of queries into the generate_queries_node update."""
+    # Parse queries from LLM response (expects numbered list)
+    import re
+    raw = _response_text(llm_response)
+    usage = _usage_record("query_generator", None, prompt, llm_response)
+    queries = [q.strip("- ").strip() for q in re.findall(r"(?:\d+\.|\-)\s*(.+)", raw) if q.strip()]
+    if not queries:
+        # fallback: split by lines if no numbers found
+        queries = [line.strip("- ").strip() for line in raw.splitlines() if line.strip()]
+
+    # Only keep 3-5 queries
+    queries = queries[:5]
+
+    return {
+        "search_queries": queries,
+        "messages": [{"role": "system", "content": f"Generated queries: {queries}"}],
+        "token_usage": [usage],
+        "error_message": ""
+    }
+
 def generate_queries_node(state: ResearchState) -> Dict[str, Any]:
     """
     Generates 3-5 effective search queries for the given research topic using the LLM.
-    Returns a dict with 'search_queries' and updated 'messages'.
+    Returns a dict with 'search_queries' and new 'messages' entries.
     Handles empty/non-string topics and LLM/parsing errors.
     """
     topic = state.get("topic", "")
-    messages = state.get("messages", []).copy()
-    queries = []
-    error_message = ""
 
     # Edge case: topic must be a non-empty string
     if not isinstance(topic, str) or not topic.strip():
-        error_message = "Invalid topic: must be a non-empty string."
-        messages.append({"role": "system", "content": error_message})
-        return {
-            "search_queries": [],
-            "messages": messages,
-            "error_message": error_message
-        }
+        return _queries_error("Invalid topic: must be a non-empty string.")
 
     try:
-        prompt = ChatPromptTemplate.from_template(
-            "Given the research topic: '{topic}', generate 3-5 effective search queries that would help find relevant information online. "
-            "Return the queries as a numbered list."
-        ).format(topic=topic.strip())
+        prompt = _queries_prompt(topic)
+        return _queries_update(prompt, call_llm(prompt))
+    except Exception as e:
+        return _queries_error(f"Error generating queries: {str(e)}")
 
-        llm_response = call_llm([HumanMessage(content=prompt)])
+async def agenerate_queries_node(state: ResearchState) -> Dict[str, Any]:
+    """Async version of generate_queries_node."""
+    topic = state.get("topic", "")
 
-        # Parse queries from LLM response (expects numbered list)
-        import re
-        raw = llm_response.content if hasattr(llm_response, "content") else str(llm_response)
-        queries = [q.strip("- ").strip() for q in re.findall(r"(?:\d+\.|\-)\s*(.+)", raw) if q.strip()]
-        if not queries:
-            # fallback: split by lines if no numbers found
-            queries = [line.strip("- ").strip() for line in raw.splitlines() if line.strip()]
+    if not isinstance(topic, str) or not topic.strip():
+        return _queries_error("Invalid topic: must be a non-empty string.")
 
-        # Only keep 3-5 queries
-        queries = queries[:5]
+    try:
+        prompt = _queries_prompt(topic)
+        return _queries_update(prompt, await acall_llm(prompt))
+    except Exception as e:
+        return _queries_error(f"Error generating queries: {str(e)}")
 
-        messages.append({"role": "system", "content": f"Generated queries: {queries}"})
+def _normalize_query(query: str) -> str:
+    """Normalizes a search query for cache lookups (case and whitespace insensitive)."""
+    return " ".join(query.casefold().split())
 
-        return {
-            "search_queries": queries,
-            "messages": messages,
-            "error_message": ""
-        }
-    except Exception as e:
-        error_message = f"Error generating queries: {str(e)}"
-        messages.append({"role": "system", "content": error_message})
-        return {
-            "search_queries": [],
-            "messages": messages,
-            "error_message": error_message
-        }
+def _search_cache_lookup(query: str) -> Tuple[Optional[TieredCache], str, Any]:
+    """Returns (cache or None, cache key, cached entry or None) for a search query, recording the hit or miss."""
+    cache = _get_cache("search", SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_MB, SEARCH_CACHE_MEMORY_ENTRIES)
+    key = f"{SEARCH_MAX_RESULTS}:{_normalize_query(query)}"
+    cached = cache.get(key) if cache else None
+    if cached:
+        node_metrics.record("cache_hits")
+    elif cache:
+        node_metrics.record("cache_misses")
+    return cache, key, cached
+
+def _search_with_cache(search_tool: Any, query: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Runs a single search query, consulting the search-result cache first.
+    Returns a tuple of (results, whether they were served from the cache).
+    """
+    cache, key, cached = _search_cache_lookup(query)
+    if cached:
+        return cached.value, True
+
+    node_metrics.record("search_calls")
+    results = search_tool.invoke(query)
+    if cache and isinstance(results, list):
+        cache.set(key, results)
+    return results, False
+
+async def _asearch_with_cache(search_tool: Any, query: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """Async version of _search_with_cache; cache reads and writes run in a worker thread."""
+    import asyncio
+
+    cache, key, cached = await asyncio.to_thread(_search_cache_lookup, query)
+    if cached:
+        return cached.value, True
+
+    node_metrics.record("search_calls")
+    results = await search_tool.ainvoke(query)
+    if cache and isinstance(results, list):
+        await asyncio.to_thread(cache.set, key, results)
+    return results, False
+
+def _search_error(error_message: str) -> Dict[str, Any]:
+    return {
+        "retrieved_docs": [],
+        "messages": [{"role": "system", "content": error_message}],
+        "error_message": error_message
+    }
+
+def _search_update(queries: List[str], outcomes: List[Any]) -> Dict[str, Any]:
+    """
+    Merges per-query outcomes, each (results, from_cache) or the exception the query failed with,
+    into the web_search_node update. Merging in query order keeps deduplication deterministic.
+    """
+    messages = []
+    all_docs = []
+    cache_hits = 0
+    for query, outcome in zip(queries, outcomes):
+        if isinstance(outcome, TimeoutError):
+            node_metrics.record("errors")
+            messages.append({"role": "system", "content": f"Search failed for query '{query}': timed out after {SEARCH_TIMEOUT}s"})
+        elif isinstance(outcome, Exception):
+            node_metrics.record("errors")
+            messages.append({"role": "system", "content": f"Search failed for query '{query}': {outcome}"})
+        elif not isinstance(outcome[0], list):
+            # TavilySearchResults returns the error text instead of raising when the API call fails
+            node_metrics.record("errors")
+            messages.append({"role": "system", "content": f"Search failed for query '{query}': {outcome[0]}"})
+        else:
+            results, from_cache = outcome
+            all_docs.extend(results)
+            cache_hits += from_cache
+
+    if cache_hits:
+        messages.append({"role": "system", "content": f"Served {cache_hits} of {len(queries)} queries from the search cache."})
+
+    # Deduplicate docs based on the canonical form of 'url'
+    unique_docs = {canonicalize_url(doc['url']): doc for doc in all_docs}.values()
+    all_docs = list(unique_docs)
+
+    messages.append({"role": "system", "content": f"Retrieved {len(all_docs)} unique documents."})
+
+    return {
+        "retrieved_docs": all_docs,
+        "messages": messages,
+        "error_message": ""
+    }
+
+def _run_searches(search_tool: Any, queries: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Runs each query (by key) on the shared search pool and returns each one's outcome: (results, from_cache),
+    the exception it failed with, or FuturesTimeoutError once it has run for SEARCH_TIMEOUT seconds.
+    A query's timeout starts when it starts running, so time spent queued behind other runs' searches
+    does not count. The search call cannot be interrupted, so a pool with a timed-out search is retired
+    rather than left one worker short; queries still queued on a retired pool move to the new one.
+    """
+    started: Dict[str, float] = {}
+    progress = threading.Event()
+
+    def search(key: str) -> Tuple[List[Dict[str, Any]], bool]:
+        started[key] = time.monotonic()
+        progress.set()
+        try:
+            return _search_with_cache(search_tool, queries[key])
+        finally:
+            progress.set()
+
+    def submit(key: str) -> Tuple[ThreadPoolExecutor, Any]:
+        executor = _get_executor("search", SEARCH_MAX_WORKERS)
+        return executor, _submit_in_context(executor, search, key)
+
+    pending = {key: submit(key) for key in queries}
+    outcomes = {}
+    while pending:
+        progress.clear()
+        now = time.monotonic()
+        deadlines = []
+        for key, (executor, future) in list(pending.items()):
+            if future.done():
+                del pending[key]
+                try:
+                    outcomes[key] = future.result()
+                except Exception as e:
+                    outcomes[key] = e
+            elif key in started:
+                if now - started[key] >= SEARCH_TIMEOUT:
+                    del pending[key]
+                    outcomes[key] = FuturesTimeoutError()
+                    _retire_executor("search", executor)
+                else:
+                    deadlines.append(started[key] + SEARCH_TIMEOUT)
+            elif _is_retired("search", executor) and future.cancel():
+                pending[key] = submit(key)
+        if pending:
+            # Woken by every start and finish; queued queries are rechecked in case their pool was retired
+            progress.wait(min(deadlines) - now if deadlines else SEARCH_TIMEOUT)
+    return outcomes
 
 def web_search_node(state: ResearchState) -> Dict[str, Any]:
     """
     Performs web searches for each query, collects and deduplicates results.
-    Returns a dict with 'retrieved_docs' and updated 'messages'.
+    Returns a dict with 'retrieved_docs' and new 'messages' entries.
     Handles API errors and empty search results.
     """
     queries = state.get("search_queries", [])
-    messages = state.get("messages", []).copy()
-    all_docs = []
-    error_message = ""
 
     if not queries:
-        error_message = "No search queries provided."
-        messages.append({"role": "system", "content": error_message})
-        return {
-            "retrieved_docs": [],
-            "messages": messages,
-            "error_message": error_message
-        }
+        return _search_error("No search queries provided.")
 
     try:
-        search_tool = TavilySearchResults(max_results=3)
+        search_tool = _get_search_tool(SEARCH_MAX_RESULTS)
+
+        # Queries that normalize to the same cache key share a single search
+        unique = {}
         for query in queries:
-            try:
-                results = search_tool.invoke(query)
-                all_docs.extend(results)
-            except Exception as e:
-                messages.append({"role": "system", "content": f"Search failed for query '{query}': {e}"})
-                # Continue to next query
-                continue
+            unique.setdefault(_normalize_query(query), query)
+        outcomes = _run_searches(search_tool, unique)
+        return _search_update(queries, [outcomes[_normalize_query(query)] for query in queries])
+    except Exception as e:
+        return _search_error(f"An unexpected error occurred during web search: {str(e)}")
 
-        # Deduplicate docs based on 'url'
-        unique_docs = {doc['url']: doc for doc in all_docs}.values()
-        all_docs = list(unique_docs)
+async def aweb_search_node(state: ResearchState) -> Dict[str, Any]:
+    """Async version of web_search_node, with searches sent through the search tool's ainvoke."""
+    import asyncio
 
-        messages.append({"role": "system", "content": f"Retrieved {len(all_docs)} unique documents."})
+    queries = state.get("search_queries", [])
 
-        return {
-            "retrieved_docs": all_docs,
-            "messages": messages,
-            "error_message": ""
-        }
+    if not queries:
+        return _search_error("No search queries provided.")
+
+    try:
+        search_tool = _get_search_tool(SEARCH_MAX_RESULTS)
+        semaphore = _get_semaphore("search", SEARCH_MAX_WORKERS)
+
+        async def search(query: str) -> Tuple[List[Dict[str, Any]], bool]:
+            # As in web_search_node, the timeout starts once the query has a slot, and a timed-out search is cancelled
+            async with semaphore:
+                return await asyncio.wait_for(_asearch_with_cache(search_tool, query), SEARCH_TIMEOUT)
+
+        # Queries that normalize to the same cache key share a single search
+        in_flight = {}
+        for query in queries:
+            key = _normalize_query(query)
+            if key not in in_flight:
+                in_flight[key] = search(query)
+        # A failed query's exception takes the place of its results
+        done = dict(zip(in_flight, await asyncio.gather(*in_flight.values(), return_exceptions=True)))
+        return _search_update(queries, [done[_normalize_query(query)] for query in queries])
     except Exception as e:
-        error_message = f"An unexpected error occurred during web search: {str(e)}"
-        messages.append({"role": "system", "content": error_message})
-        return {
-            "retrieved_docs": [],
-            "messages": messages,
-            "error_message": error_message
-        }
+        return _search_error(f"An unexpected error occurred during web search: {str(e)}")
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+def _get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Returns the shared process pool used for HTML extraction, creating it on first use.
+    Returns None when SCRAPE_PARSE_PROCESSES disables process-based parsing.
+    """
+    global _parse_pool
+    setting = str(SCRAPE_PARSE_PROCESSES).strip().lower()
+    workers = (os.cpu_count() or 1) if setting == "auto" else int(setting or 0)
+    if workers <= 0:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # Workers only need html_extractors; avoid forking a process full of threads where possible
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        return _parse_pool
+
+def shutdown_parse_pool() -> None:
+    """Stops the HTML extraction process pool, if one was started."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown()
+            _parse_pool = None
+
+def _discard_parse_pool(pool: ProcessPoolExecutor) -> None:
+    """Drops a broken parse pool so the next _get_parse_pool() call starts a fresh one."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _parse_page(body: bytes) -> str:
+    """
+    Extracts a page's text, in the parse process pool when it is enabled. A worker that dies
+    (e.g. killed for memory, or a parser crash) breaks the whole pool; it is then replaced and
+    the page retried once, so a single bad page cannot disable parsing for the rest of the process.
+    """
+    for attempt in range(2):
+        pool = _get_parse_pool()
+        if pool is None:
+            return extract_text(body, SCRAPE_MAX_CHARS, HTML_EXTRACTOR)
+        try:
+            return pool.submit(extract_text, body, SCRAPE_MAX_CHARS, HTML_EXTRACTOR).result()
+        except BrokenProcessPool:
+            _discard_parse_pool(pool)
+            if attempt:
+                raise
+
+async def _aparse_page(body: bytes) -> str:
+    """Async version of _parse_page; without a parse pool, extraction runs in a worker thread."""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = _get_parse_pool()
+        try:
+            return await loop.run_in_executor(pool, extract_text, body, SCRAPE_MAX_CHARS, HTML_EXTRACTOR)
+        except BrokenProcessPool:
+            _discard_parse_pool(pool)
+            if attempt:
+                raise
+
+def _read_capped(response: Any, max_bytes: int) -> bytes:
+    """Reads a streamed response body, stopping once max_bytes have been received."""
+    chunks = []
+    received = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        received += len(chunk)
+        if received >= max_bytes:
+            break
+    return b"".join(chunks)[:max_bytes]
+
+async def _aread_capped(response: Any, max_bytes: int) -> bytes:
+    """Async version of _read_capped for an aiohttp response."""
+    chunks = []
+    received = 0
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        chunks.append(chunk)
+        received += len(chunk)
+        if received >= max_bytes:
+            break
+    return b"".join(chunks)[:max_bytes]
+
+def _cached_page(url: str) -> Tuple[Optional[TieredCache], Any]:
+    """Returns (page cache or None, cached entry for url or None), including stale entries."""
+    cache = _get_cache("pages", PAGE_CACHE_TTL, PAGE_CACHE_MAX_MB)
+    return cache, cache.get(url, allow_stale=True) if cache else None
+
+def _revalidation_headers(cached: Any) -> Dict[str, str]:
+    # Revalidate a stale copy with a conditional GET instead of downloading it again
+    headers = {}
+    if cached:
+        if cached.value.get("etag"):
+            headers["If-None-Match"] = cached.value["etag"]
+        if cached.value.get("last_modified"):
+            headers["If-Modified-Since"] = cached.value["last_modified"]
+    return headers
+
+def _unsupported_content_type(content_type: str) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip().lower() not in HTML_CONTENT_TYPES
+
+def _store_page(cache: Optional[TieredCache], url: str, content: str, headers: Any) -> None:
+    if cache:
+        cache.set(url, {
+            "content": content,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified")
+        })
+
+def _scrape_url(url: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Fetches a single URL and extracts its main text content.
+    Returns a tuple of (scraped item or None on failure, status message).
+    """
+    cache, cached = _cached_page(url)
+    if cached and cached.fresh:
+        node_metrics.record("cache_hits")
+        return {"url": url, "content": cached.value["content"]}, f"Successfully scraped {url} (cached)"
+
+    import requests
+    import http_transport
+
+    try:
+        node_metrics.record("http_requests")
+        response = http_transport.get(url, timeout=10, headers=_revalidation_headers(cached), stream=True)
+        try:
+            if cached and response.status_code == 304:
+                node_metrics.record("cache_hits")
+                cache.touch(url)
+                return {"url": url, "content": cached.value["content"]}, f"Successfully scraped {url} (not modified)"
+            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+
+            content_type = response.headers.get("Content-Type", "")
+            if _unsupported_content_type(content_type):
+                return None, f"Skipped {url}: unsupported content type '{content_type}'"
+            body = _read_capped(response, SCRAPE_MAX_BYTES)
+            node_metrics.record("bytes_fetched", len(body))
+            if cache:
+                node_metrics.record("cache_misses")
+        finally:
+            response.close()
+
+        # Parsing in a worker process lets this thread's slot overlap with other downloads
+        content = _parse_page(body)
+
+        _store_page(cache, url, content, response.headers)
+        return {"url": url, "content": content}, f"Successfully scraped {url}"
+
+    except requests.RequestException as e:
+        node_metrics.record("errors")
+        return None, f"Failed to scrape {url}: {e}"
+    except Exception as e:
+        node_metrics.record("errors")
+        return None, f"An unexpected error occurred while scraping {url}: {e}"
+
+async def _ascrape_url(url: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Async version of _scrape_url, fetching through the running loop's pooled aiohttp session.
+    HTML extraction runs in the parse process pool, or in a worker thread when it is disabled,
+    so it never blocks the event loop; so do the page cache's SQLite reads and writes.
+    """
+    import asyncio
+
+    cache, cached = await asyncio.to_thread(_cached_page, url)
+    if cached and cached.fresh:
+        node_metrics.record("cache_hits")
+        return {"url": url, "content": cached.value["content"]}, f"Successfully scraped {url} (cached)"
+
+    import aiohttp
+    import http_transport
+
+    try:
+        node_metrics.record("http_requests")
+        response = await http_transport.aget(url, timeout=10, headers=_revalidation_headers(cached))
+        try:
+            if cached and response.status == 304:
+                node_metrics.record("cache_hits")
+                await asyncio.to_thread(cache.touch, url)
+                return {"url": url, "content": cached.value["content"]}, f"Successfully scraped {url} (not modified)"
+            response.raise_for_status()
+
+            content_type = response.headers.get("Content-Type", "")
+            if _unsupported_content_type(content_type):
+                return None, f"Skipped {url}: unsupported content type '{content_type}'"
+            body = await _aread_capped(response, SCRAPE_MAX_BYTES)
+            node_metrics.record("bytes_fetched", len(body))
+            if cache:
+                node_metrics.record("cache_misses")
+        finally:
+            response.release()
+
+        content = await _aparse_page(body)
+
+        await asyncio.to_thread(_store_page, cache, url, content, response.headers)
+        return {"url": url, "content": content}, f"Successfully scraped {url}"
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        node_metrics.record("errors")
+        return None, f"Failed to scrape {url}: {e}"
+    except Exception as e:
+        node_metrics.record("errors")
+        return None, f"An unexpected error occurred while scraping {url}: {e}"
+
+def _scrape_error(error_message: str) -> Dict[str, Any]:
+    return {
+        "scraped_data": [],
+        "messages": [{"role": "system", "content": error_message}],
+        "error_message": error_message
+    }
+
+def _relevant_page(topic: str, item: Dict[str, Any], status: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Trims a scraped page to the passages most relevant to the topic that fit in SUMMARY_INPUT_TOKENS,
+    since no summary prompt uses more, so state and checkpoints only carry that much text per page.
+    Returns the trimmed page and its status message.
+    """
+    content, kept, total = select_passages(item["content"], topic, SUMMARY_INPUT_TOKENS)
+    if kept < total:
+        status += f" (kept {kept} of {total} passages)"
+    return {**item, "content": content}, status
+
+def _scrape_update(topic: str, results: List[Tuple[Optional[Dict[str, Any]], str]]) -> Dict[str, Any]:
+    messages = []
+    scraped_data = []
+    for item, status in results:
+        if item is not None:
+            item, status = _relevant_page(topic, item, status)
+            scraped_data.append(item)
+        messages.append({"role": "system", "content": status})
+
+    return {
+        "scraped_data": scraped_data,
+        "messages": messages,
+        "error_message": ""
+    }
 
 def scrape_content_node(state: ResearchState) -> Dict[str, Any]:
     """
     Scrapes the content from the URLs of the retrieved documents.
-    Returns a dict with 'scraped_data' and updated 'messages'.
+    Returns a dict with 'scraped_data' and new 'messages' entries.
     Handles HTTP errors and cases where no documents are found.
     """
     docs = state.get("retrieved_docs", [])
-    messages = state.get("messages", []).copy()
-    scraped_data = []
-    error_message = ""
 
     if not docs:
-        error_message = "No documents to scrape."
-        messages.append({"role": "system", "content": error_message})
-        return {
-            "scraped_data": [],
-            "messages": messages,
-            "error_message": error_message
-        }
+        return _scrape_error("No documents to scrape.")
 
-    for doc in docs:
-        url = doc.get("url")
-        if not url:
-            continue
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-            soup = BeautifulSoup(response.content, "html.parser")
-            
-            # Attempt to find the main content, fall back to body
-            main_content = soup.find("article") or soup.find("main") or soup.body
-            if main_content:
-                # Remove script and style elements
-                for script_or_style in main_content(["script", "style"]):
-                    script_or_style.decompose()
-                text = main_content.get_text(separator="\n", strip=True)
-            else:
-                text = ""
-
-            scraped_data.append({"url": url, "content": text[:5000]}) # Limit content size
-            messages.append({"role": "system", "content": f"Successfully scraped {url}"})
-
-        except requests.RequestException as e:
-            messages.append({"role": "system", "content": f"Failed to scrape {url}: {e}"})
-        except Exception as e:
-            messages.append({"role": "system", "content": f"An unexpected error occurred while scraping {url}: {e}"})
+    urls = [doc.get("url") for doc in docs if doc.get("url")]
+    return _scrape_update(state.get("topic", ""), _map_concurrently(_scrape_url, urls, SCRAPE_MAX_WORKERS, "scrape"))
+
+async def ascrape_content_node(state: ResearchState) -> Dict[str, Any]:
+    """Async version of scrape_content_node."""
+    docs = state.get("retrieved_docs", [])
+
+    if not docs:
+        return _scrape_error("No documents to scrape.")
 
+    urls = [doc.get("url") for doc in docs if doc.get("url")]
+    return _scrape_update(state.get("topic", ""), await _amap_concurrently(_ascrape_url, urls, SCRAPE_MAX_WORKERS, "scrape"))
+
+def deduplicate_content_node(state: ResearchState) -> Dict[str, Any]:
+    """
+    Drops scraped pages whose text is a near-duplicate of an earlier page (mirrors, syndicated copies).
+    Returns a dict with the remaining 'scraped_data' and new 'messages' entries.
+    """
+    scraped_data = state.get("scraped_data", [])
+    messages = []
+    if NEAR_DUPLICATE_THRESHOLD <= 0 or len(scraped_data) < 2:
+        return {"scraped_data": scraped_data, "messages": messages}
+
+    duplicates = set(find_near_duplicates([item.get("content", "") for item in scraped_data], NEAR_DUPLICATE_THRESHOLD))
+    if duplicates:
+        dropped = ", ".join(scraped_data[i]["url"] for i in sorted(duplicates))
+        messages.append({"role": "system", "content": f"Dropped {len(duplicates)} near-duplicate documents: {dropped}"})
     return {
-        "scraped_data": scraped_data,
+        "scraped_data": [item for i, item in enumerate(scraped_data) if i not in duplicates],
+        "messages": messages
+    }
+
+def _rank_by_relevance(state: ResearchState, texts: List[str], top_k: int,
+                       min_score: float) -> Tuple[List[Tuple[float, int]], List[Tuple[float, int]]]:
+    """
+    Scores texts by BM25 relevance to the run's topic and search queries.
+    Returns the (score, index) pairs kept, most relevant first, and those skipped for being
+    beyond top_k (0 = no limit) or below min_score times the best score (0 = no cut-off).
+    """
+    query = " ".join([state.get("topic", "")] + state.get("search_queries", []))
+    scores = bm25_scores(query, texts)
+    ranked = sorted(zip(scores, range(len(texts))), key=lambda pair: (-pair[0], pair[1]))
+
+    best_score = ranked[0][0] if ranked else 0.0
+    kept, skipped = [], []
+    for score, index in ranked:
+        below_cutoff = min_score > 0 and score < min_score * best_score
+        beyond_top_k = top_k > 0 and len(kept) >= top_k
+        (skipped if below_cutoff or beyond_top_k else kept).append((score, index))
+    return kept, skipped
+
+def rank_content_node(state: ResearchState) -> Dict[str, Any]:
+    """
+    Ranks scraped pages by BM25 relevance to the topic and search queries and keeps only the best ones.
+    Returns a dict with the kept 'scraped_data' (most relevant first) and new 'messages' entries.
+    """
+    scraped_data = state.get("scraped_data", [])
+    messages = []
+    if not scraped_data or (RANK_TOP_K <= 0 and RANK_MIN_SCORE <= 0):
+        return {"scraped_data": scraped_data, "messages": messages}
+
+    kept, skipped = _rank_by_relevance(state, [item.get("content", "") for item in scraped_data], RANK_TOP_K, RANK_MIN_SCORE)
+
+    def describe(pairs: List[Tuple[float, int]]) -> str:
+        return ", ".join(f"{scraped_data[index]['url']} ({score:.2f})" for score, index in pairs)
+
+    if skipped:
+        messages.append({"role": "system", "content": (
+            f"Ranked {len(scraped_data)} documents by relevance; summarizing {len(kept)}: {describe(kept)}. "
+            f"Skipped {len(skipped)}: {describe(skipped)}."
+        )})
+    else:
+        messages.append({"role": "system", "content": f"Ranked {len(scraped_data)} documents by relevance: {describe(kept)}."})
+    return {
+        "scraped_data": [scraped_data[index] for _, index in kept],
+        "messages": messages
+    }
+
+async def adeduplicate_content_node(state: ResearchState) -> Dict[str, Any]:
+    """Async version of deduplicate_content_node; the CPU-bound comparison runs in a worker thread."""
+    import asyncio
+
+    return await asyncio.to_thread(deduplicate_content_node, state)
+
+async def arank_content_node(state: ResearchState) -> Dict[str, Any]:
+    """Async version of rank_content_node; the CPU-bound scoring runs in a worker thread."""
+    import asyncio
+
+    return await asyncio.to_thread(rank_content_node, state)
+
+def _summary_prompt(topic: str, content: str, max_input_tokens: Optional[int]) -> Tuple[List[Any], str]:
+    """Returns the summarization prompt for a page and a note on how many of its passages it includes."""
+    # Send the passages most relevant to the topic rather than the first N characters of the page
+    content, kept, total = select_passages(content, topic, max_input_tokens or SUMMARY_INPUT_TOKENS)
+    selection = f" (using {kept} of {total} passages)" if kept < total else ""
+
+    prompt = _build_prompt(
+        "Given the research topic: '{topic}' and the following content from a webpage, "
+        "please provide a concise summary that is relevant to the topic. "
+        "Focus on extracting key facts, figures, and main arguments.\n\n"
+        "Content:\n{content}",
+        topic=topic, content=content
+    )
+    return prompt, selection
+
+def _summary_result(url: str, prompt: List[Any], selection: str, llm_response: Any,
+                    node: str) -> Tuple[Optional[str], str, bool, Optional[Dict[str, Any]]]:
+    summary = _response_text(llm_response)
+    usage = _usage_record(node, url, prompt, llm_response)
+
+    if summary.strip():
+        return summary, f"Successfully summarized content from {url}{selection}.", False, usage
+    node_metrics.record("errors")
+    return None, f"LLM returned an empty summary for {url}.", True, usage
+
+def _summarize_document(topic: str, item: Dict[str, Any], max_input_tokens: Optional[int] = None,
+                        node: str = "content_summarizer") -> Tuple[Optional[str], str, bool, Optional[Dict[str, Any]]]:
+    """
+    Summarizes a single scraped document with respect to the research topic.
+    At most max_input_tokens (default SUMMARY_INPUT_TOKENS) estimated tokens of page text are sent.
+    Returns a tuple of (summary or None, status message, whether the attempt failed, token_usage record or None).
+    Documents with empty content are skipped without calling the LLM.
+    """
+    url = item.get("url")
+    content = item.get("content")
+
+    if not content or not content.strip():
+        return None, f"Skipping summarization for {url} due to empty content.", False, None
+
+    try:
+        prompt, selection = _summary_prompt(topic, content, max_input_tokens)
+        return _summary_result(url, prompt, selection, call_llm(prompt), node)
+    except Exception as e:
+        node_metrics.record("errors")
+        return None, f"Error summarizing content from {url}: {str(e)}", True, None
+
+async def _asummarize_document(topic: str, item: Dict[str, Any], max_input_tokens: Optional[int] = None,
+                               node: str = "content_summarizer") -> Tuple[Optional[str], str, bool, Optional[Dict[str, Any]]]:
+    """Async version of _summarize_document."""
+    url = item.get("url")
+    content = item.get("content")
+
+    if not content or not content.strip():
+        return None, f"Skipping summarization for {url} due to empty content.", False, None
+
+    try:
+        prompt, selection = _summary_prompt(topic, content, max_input_tokens)
+        return _summary_result(url, prompt, selection, await acall_llm(prompt), node)
+    except Exception as e:
+        node_metrics.record("errors")
+        return None, f"Error summarizing content from {url}: {str(e)}", True, None
+
+def _summaries_error(error_message: str) -> Dict[str, Any]:
+    return {
+        "summaries": [],
+        "messages": [{"role": "system", "content": error_message}],
+        "error_message": error_message
+    }
+
+def _plan_summarization(state: ResearchState) -> Tuple[List[Dict[str, Any]], int, List[Any]]:
+    """Returns the documents to summarize, the input-token cap for each and any budget message."""
+    scraped_data = state.get("scraped_data", [])
+    messages = []
+    # Documents arrive most relevant first, so a tight token budget drops the tail
+    keep, per_doc_tokens = _plan_summaries(len(scraped_data), _remaining_tokens(state))
+    if keep < len(scraped_data) or per_doc_tokens < SUMMARY_INPUT_TOKENS:
+        messages.append({"role": "system", "content": (
+            f"Token budget: summarizing {keep} of {len(scraped_data)} documents "
+            f"with up to {per_doc_tokens} input tokens each."
+        )})
+    return scraped_data[:keep], per_doc_tokens, messages
+
+def _summaries_update(results: List[Tuple[Optional[str], str, bool, Optional[Dict[str, Any]]]],
+                      messages: List[Any]) -> Dict[str, Any]:
+    summaries = []
+    token_usage = []
+    error_message = ""
+    has_errors = False
+    for summary, status, failed, usage in results:
+        if summary is not None:
+            summaries.append(summary)
+        if usage is not None:
+            token_usage.append(usage)
+        messages.append({"role": "system", "content": status})
+        has_errors = has_errors or failed
+
+    if not summaries and has_errors:
+        error_message = "Could not generate any summaries due to errors."
+        messages.append({"role": "system", "content": error_message})
+    elif not summaries:
+        error_message = "Could not generate any summaries from the provided content."
+        messages.append({"role": "system", "content": error_message})
+
+    return {
+        "summaries": summaries,
         "messages": messages,
-        "error_message": ""
+        "token_usage": token_usage,
+        "error_message": error_message if not summaries else ""
     }
 
 def summarize_content_node(state: ResearchState) -> Dict[str, Any]:
     """
     Summarizes the scraped content for each document based on the research topic.
-    Returns a dict with 'summaries' and updated 'messages'.
+    Returns a dict with 'summaries' and new 'messages' entries.
     Handles LLM errors and cases where no content is available for summarization.
     """
+    if not state.get("scraped_data", []):
+        return _summaries_error("No scraped content available to summarize.")
+
+    documents, per_doc_tokens, messages = _plan_summarization(state)
+    summarize = partial(_summarize_document, state.get("topic", ""), max_input_tokens=per_doc_tokens)
+    return _summaries_update(_map_concurrently(summarize, documents, SUMMARIZE_MAX_WORKERS, "llm"), messages)
+
+async def asummarize_content_node(state: ResearchState) -> Dict[str, Any]:
+    """Async version of summarize_content_node."""
+    if not state.get("scraped_data", []):
+        return _summaries_error("No scraped content available to summarize.")
+
+    documents, per_doc_tokens, messages = _plan_summarization(state)
+    summarize = partial(_asummarize_document, state.get("topic", ""), max_input_tokens=per_doc_tokens)
+    return _summaries_update(await _amap_concurrently(summarize, documents, SUMMARIZE_MAX_WORKERS, "llm"), messages)
+
+def _documents_to_process(state: ResearchState) -> List[Dict[str, Any]]:
+    """
+    Returns the retrieved documents worth scraping and summarizing in pipelined mode, most relevant first.
+    Pages are not scraped yet, so documents are deduplicated by canonical URL and ranked by their
+    search snippets; only the RANK_TOP_K best are kept, as rank_content_node does in sequential mode.
+    """
+    docs = list({canonicalize_url(doc["url"]): doc for doc in state.get("retrieved_docs", []) if doc.get("url")}.values())
+    if RANK_TOP_K <= 0 or len(docs) <= RANK_TOP_K:
+        return docs
+    kept, _ = _rank_by_relevance(state, [doc.get("content") or "" for doc in docs], RANK_TOP_K, 0)
+    return [docs[index] for _, index in kept]
+
+def dispatch_documents(state: ResearchState) -> Any:
+    """
+    Routes each retrieved document worth processing (see _documents_to_process) to its own
+    document_processor branch (pipelined mode).
+    Falls through to document_collector when there is nothing to process.
+    """
+    from langgraph.types import Send
+
     topic = state.get("topic", "")
-    scraped_data = state.get("scraped_data", [])
-    messages = state.get("messages", []).copy()
+    docs = _documents_to_process(state)
+    # The least relevant documents are dropped first when the token budget is tight
+    keep, per_doc_tokens = _plan_summaries(len(docs), _remaining_tokens(state))
+    sends = [
+        Send("document_processor", {"topic": topic, "doc": doc, "index": index, "max_input_tokens": per_doc_tokens})
+        for index, doc in enumerate(docs[:keep])
+    ]
+    return sends or "document_collector"
+
+def process_document_node(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Scrapes and summarizes a single document as soon as it is available (pipelined mode).
+    Returns a dict with a one-element 'processed_docs' list holding the document's results and messages.
+    """
+    url = task["doc"].get("url")
+    result = {"index": task["index"], "url": url, "scraped": None, "summary": None, "failed": False, "messages": []}
+
+    item, status = _scrape_url(url)
+    if item is not None:
+        item, status = _relevant_page(task["topic"], item, status)
+    result["messages"].append({"role": "system", "content": status})
+    if item is not None:
+        result["scraped"] = item
+        summary, status, failed, usage = _summarize_document(
+            task["topic"], item, task.get("max_input_tokens"), node="document_processor"
+        )
+        result["summary"] = summary
+        result["failed"] = failed
+        result["messages"].append({"role": "system", "content": status})
+        if usage is not None:
+            return {"processed_docs": [result], "token_usage": [usage]}
+
+    return {"processed_docs": [result]}
+
+async def aprocess_document_node(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Async version of process_document_node."""
+    url = task["doc"].get("url")
+    result = {"index": task["index"], "url": url, "scraped": None, "summary": None, "failed": False, "messages": []}
+
+    item, status = await _ascrape_url(url)
+    if item is not None:
+        item, status = _relevant_page(task["topic"], item, status)
+    result["messages"].append({"role": "system", "content": status})
+    if item is not None:
+        result["scraped"] = item
+        summary, status, failed, usage = await _asummarize_document(
+            task["topic"], item, task.get("max_input_tokens"), node="document_processor"
+        )
+        result["summary"] = summary
+        result["failed"] = failed
+        result["messages"].append({"role": "system", "content": status})
+        if usage is not None:
+            return {"processed_docs": [result], "token_usage": [usage]}
+
+    return {"processed_docs": [result]}
+
+def _drop_similar_or_irrelevant(state: ResearchState, scraped_data: List[Dict[str, Any]], messages: List[Any]) -> set:
+    """
+    Returns the positions in scraped_data of near-duplicates of an earlier page and of pages
+    scoring below RANK_MIN_SCORE times the best page, logging each decision to messages.
+    """
+    texts = [item.get("content", "") for item in scraped_data]
+    dropped = set()
+    if NEAR_DUPLICATE_THRESHOLD > 0 and len(scraped_data) > 1:
+        dropped.update(find_near_duplicates(texts, NEAR_DUPLICATE_THRESHOLD))
+        if dropped:
+            urls = ", ".join(scraped_data[i]["url"] for i in sorted(dropped))
+            messages.append({"role": "system", "content": f"Dropped {len(dropped)} near-duplicate documents: {urls}"})
+    remaining = [i for i in range(len(scraped_data)) if i not in dropped]
+    if RANK_MIN_SCORE > 0 and remaining:
+        _, skipped = _rank_by_relevance(state, [texts[i] for i in remaining], 0, RANK_MIN_SCORE)
+        if skipped:
+            irrelevant = [remaining[index] for _, index in skipped]
+            dropped.update(irrelevant)
+            urls = ", ".join(f"{scraped_data[i]['url']} ({score:.2f})" for (score, _), i in zip(skipped, irrelevant))
+            messages.append({"role": "system", "content": f"Skipped {len(irrelevant)} documents below the relevance cut-off: {urls}"})
+    return dropped
+
+def collect_documents_node(state: ResearchState) -> Dict[str, Any]:
+    """
+    Gathers the per-document results of the pipelined mode in dispatch order (most relevant first).
+    Near-duplicate pages and pages below the RANK_MIN_SCORE cut-off are dropped with their
+    summaries, as deduplicate_content_node and rank_content_node do in sequential mode.
+    Returns a dict with 'scraped_data', 'summaries' and new 'messages' entries, mirroring
+    the outcome of running the sequential scrape to summarize stages.
+    """
+    processed = sorted(state.get("processed_docs", []), key=itemgetter("index"))
+    messages = []
+    scraped_data = []
     summaries = []
-    error_message = ""
     has_errors = False
+    error_message = ""
 
-    if not scraped_data:
-        error_message = "No scraped content available to summarize."
+    retrieved = len({canonicalize_url(doc["url"]) for doc in state.get("retrieved_docs", []) if doc.get("url")})
+    if processed and retrieved > len(processed):
+        messages.append({"role": "system", "content": (
+            f"Processed the {len(processed)} most relevant of {retrieved} retrieved documents, ranked by their search snippets."
+        )})
+
+    if not processed:
+        error_message = "No documents to scrape."
         messages.append({"role": "system", "content": error_message})
         return {
+            "scraped_data": [],
             "summaries": [],
             "messages": messages,
             "error_message": error_message
         }
 
-    for item in scraped_data:
-        url = item.get("url")
-        content = item.get("content")
-
-        if not content or not content.strip():
-            messages.append({"role": "system", "content": f"Skipping summarization for {url} due to empty content."})
-            continue
-
-        try:
-            prompt = ChatPromptTemplate.from_template(
-                "Given the research topic: '{topic}' and the following content from a webpage, "
-                "please provide a concise summary that is relevant to the topic. "
-                "Focus on extracting key facts, figures, and main arguments.\n\n"
-                "Content:\n{content}"
-            ).format(topic=topic, content=content)
-
-            llm_response = call_llm([HumanMessage(content=prompt)])
-            summary = llm_response.content if hasattr(llm_response, "content") else str(llm_response)
-            
-            if summary.strip():
-                summaries.append(summary)
-                messages.append({"role": "system", "content": f"Successfully summarized content from {url}."})
-            else:
-                messages.append({"role": "system", "content": f"LLM returned an empty summary for {url}."})
-                has_errors = True
-
-        except Exception as e:
-            messages.append({"role": "system", "content": f"Error summarizing content from {url}: {str(e)}"})
-            has_errors = True
+    for result in processed:
+        messages.extend(result["messages"])
+        has_errors = has_errors or result["failed"]
+    scraped = [result for result in processed if result["scraped"] is not None]
+    dropped = _drop_similar_or_irrelevant(state, [result["scraped"] for result in scraped], messages)
+    for position, result in enumerate(scraped):
+        if position in dropped:
             continue
+        scraped_data.append(result["scraped"])
+        if result["summary"] is not None:
+            summaries.append(result["summary"])
 
     if not summaries and has_errors:
         error_message = "Could not generate any summaries due to errors."
@@ -255,61 +1342,229 @@ def summarize_content_node(state: ResearchState) -> Dict[str, Any]:
         messages.append({"role": "system", "content": error_message})
 
     return {
+        "scraped_data": scraped_data,
         "summaries": summaries,
         "messages": messages,
-        "error_message": error_message if not summaries else ""
+        "error_message": error_message
     }
 
-def compile_report_node(state: ResearchState) -> Dict[str, Any]:
+def _group_summaries(summaries: List[str], group_size: int, token_budget: int) -> List[List[str]]:
     """
-    Compiles the summaries into a final, structured research report.
-    Returns a dict with 'final_report' and updated 'messages'.
-    Handles cases where no summaries are available.
+    Splits summaries into consecutive groups of at most group_size items.
+    A group is also closed early when adding the next summary would exceed token_budget.
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    for summary in summaries:
+        tokens = estimate_tokens(summary)
+        if current and (len(current) >= group_size or current_tokens + tokens > token_budget):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(summary)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def _merge_prompt(topic: str, group: List[str]) -> List[Any]:
+    return _build_prompt(
+        "Given the research topic: '{topic}', merge the following summaries from different sources "
+        "into a single consolidated summary. Preserve key facts, figures, sources' distinct arguments "
+        "and any disagreements between them, and remove repetition.\n\n"
+        "Summaries:\n{summaries}",
+        topic=topic, summaries=SUMMARY_SEPARATOR.join(group)
+    )
+
+def _merge_result(group: List[str], prompt: List[Any], llm_response: Any) -> Tuple[List[str], Optional[str], Optional[Dict[str, Any]]]:
+    merged = _response_text(llm_response)
+    usage = _usage_record("report_compiler", None, prompt, llm_response)
+    if not merged.strip():
+        return group, "LLM returned an empty merged summary.", usage
+    return [merged], None, usage
+
+def _merge_summaries(topic: str, group: List[str]) -> Tuple[List[str], Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Merges a group of summaries into one consolidated summary with the LLM.
+    Returns a tuple of (resulting summaries, error message or None, token_usage record or None);
+    on failure the group is kept as is.
+    """
+    if len(group) == 1 and estimate_tokens(group[0]) <= REPORT_TOKEN_BUDGET:
+        return group, None, None
+    try:
+        prompt = _merge_prompt(topic, group)
+        return _merge_result(group, prompt, call_llm(prompt))
+    except Exception as e:
+        node_metrics.record("errors")
+        return group, f"Error merging summaries: {str(e)}", None
+
+async def _amerge_summaries(topic: str, group: List[str]) -> Tuple[List[str], Optional[str], Optional[Dict[str, Any]]]:
+    """Async version of _merge_summaries."""
+    if len(group) == 1 and estimate_tokens(group[0]) <= REPORT_TOKEN_BUDGET:
+        return group, None, None
+    try:
+        prompt = _merge_prompt(topic, group)
+        return _merge_result(group, prompt, await acall_llm(prompt))
+    except Exception as e:
+        node_metrics.record("errors")
+        return group, f"Error merging summaries: {str(e)}", None
+
+def _needs_reduce(summaries: List[str], level: int) -> bool:
+    return estimate_tokens(SUMMARY_SEPARATOR.join(summaries)) > REPORT_TOKEN_BUDGET and level < REPORT_MAX_REDUCE_LEVELS
+
+def _reduce_groups(summaries: List[str]) -> List[List[str]]:
+    return _group_summaries(summaries, max(2, REPORT_GROUP_SIZE), REPORT_TOKEN_BUDGET)
+
+def _collect_merges(level: int, summaries: List[str], results: List[Tuple[List[str], Optional[str], Optional[Dict[str, Any]]]],
+                    messages: List[Any], token_usage: Optional[List[Dict[str, Any]]]) -> List[str]:
+    """Gathers one reduce level's merge results, recording their errors, messages and token usage."""
+    merged = []
+    for group_result, error, usage in results:
+        merged.extend(group_result)
+        if usage is not None and token_usage is not None:
+            token_usage.append(usage)
+        if error:
+            messages.append({"role": "system", "content": error})
+    messages.append({"role": "system", "content": f"Reduce level {level}: merged {len(summaries)} summaries into {len(merged)}."})
+    return merged
+
+def _reduce_summaries(topic: str, summaries: List[str], messages: List[Any],
+                      token_usage: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """
+    Hierarchically merges summaries in parallel groups until they fit REPORT_TOKEN_BUDGET.
+    Stops after REPORT_MAX_REDUCE_LEVELS rounds or once a round no longer shrinks the input.
+    The merge calls' token_usage records are appended to token_usage when given.
+    """
+    level = 0
+    while _needs_reduce(summaries, level):
+        level += 1
+        results = _map_concurrently(partial(_merge_summaries, topic), _reduce_groups(summaries), SUMMARIZE_MAX_WORKERS, "llm")
+        merged = _collect_merges(level, summaries, results, messages, token_usage)
+        if merged == summaries:
+            break
+        summaries = merged
+    return summaries
+
+async def _areduce_summaries(topic: str, summaries: List[str], messages: List[Any],
+                             token_usage: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """Async version of _reduce_summaries."""
+    level = 0
+    while _needs_reduce(summaries, level):
+        level += 1
+        results = await _amap_concurrently(partial(_amerge_summaries, topic), _reduce_groups(summaries),
+                                           SUMMARIZE_MAX_WORKERS, "llm")
+        merged = _collect_merges(level, summaries, results, messages, token_usage)
+        if merged == summaries:
+            break
+        summaries = merged
+    return summaries
+
+def _report_error(error_message: str, messages: List[Any], token_usage: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    messages.append({"role": "system", "content": error_message})
+    update = {
+        "final_report": "",
+        "messages": messages,
+        "error_message": error_message
+    }
+    if token_usage is not None:
+        update["token_usage"] = token_usage
+    return update
+
+def _report_inputs(state: ResearchState) -> Tuple[Optional[Dict[str, Any]], List[str], List[Any]]:
+    """
+    Checks the summaries against the run's token budget before the report is compiled.
+    Returns (update to return instead when the report cannot be compiled, summaries to use, messages).
     """
-    topic = state.get("topic", "")
     summaries = state.get("summaries", [])
-    messages = state.get("messages", []).copy()
-    error_message = ""
+    messages = []
 
     if not summaries:
-        error_message = "No summaries available to compile a report."
-        messages.append({"role": "system", "content": error_message})
-        return {
-            "final_report": "",
-            "messages": messages,
-            "error_message": error_message
-        }
+        return _report_error("No summaries available to compile a report.", messages), summaries, messages
 
-    try:
-        # Join summaries into a single string for the prompt
-        summaries_str = "\n\n---\n\n".join(summaries)
+    remaining = _remaining_tokens(state)
+    if remaining is not None:
+        allowance = remaining - REPORT_OUTPUT_TOKENS - PROMPT_OVERHEAD_TOKENS
+        if allowance < MIN_SUMMARY_INPUT_TOKENS:
+            return _report_error("Token budget exhausted before compiling the report.", messages), summaries, messages
+        # Merging reads every summary once more, so only half the allowance is usable when a reduce is needed
+        if estimate_tokens(SUMMARY_SEPARATOR.join(summaries)) > REPORT_TOKEN_BUDGET:
+            allowance //= 2
+        fitted = _fit_summaries(summaries, allowance)
+        if fitted != summaries:
+            messages.append({"role": "system", "content": (
+                f"Token budget: compiling the report from {len(fitted)} of {len(summaries)} summaries."
+            )})
+            summaries = fitted
+    return None, summaries, messages
 
-        prompt = ChatPromptTemplate.from_template(
-            "Given the research topic: '{topic}' and the following summaries from various sources, "
-            "synthesize them into a comprehensive, well-structured, and formal research report. "
-            "The report should have a clear introduction, body, and conclusion. "
-            "Use markdown for formatting (e.g., headers, lists, bold text).\n\n"
-            "Summaries:\n{summaries}"
-        ).format(topic=topic, summaries=summaries_str)
+def _report_prompt(topic: str, summaries: List[str]) -> List[Any]:
+    # Join summaries into a single string for the prompt
+    summaries_str = SUMMARY_SEPARATOR.join(summaries)
 
-        llm_response = call_llm([HumanMessage(content=prompt)])
-        final_report = llm_response.content if hasattr(llm_response, "content") else str(llm_response)
-        import logging
-        logging.warning(f"[compile_report_node] llm_response type: {type(llm_response)}, value: {llm_response}")
-        logging.warning(f"[compile_report_node] final_report type: {type(final_report)}, value: {final_report}")
+    return _build_prompt(
+        "Given the research topic: '{topic}' and the following summaries from various sources, "
+        "synthesize them into a comprehensive, well-structured, and formal research report. "
+        "The report should have a clear introduction, body, and conclusion. "
+        "Use markdown for formatting (e.g., headers, lists, bold text).\n\n"
+        "Summaries:\n{summaries}",
+        topic=topic, summaries=summaries_str
+    )
 
-        messages.append({"role": "system", "content": "Successfully compiled the final report."})
+def _report_update(state: ResearchState, prompt: List[Any], llm_response: Any, messages: List[Any],
+                   token_usage: List[Dict[str, Any]]) -> Dict[str, Any]:
+    final_report = _response_text(llm_response)
+    token_usage.append(_usage_record("report_compiler", None, prompt, llm_response))
+    import logging
+    logging.warning(f"[compile_report_node] llm_response type: {type(llm_response)}, value: {llm_response}")
+    logging.warning(f"[compile_report_node] final_report type: {type(final_report)}, value: {final_report}")
 
-        return {
-            "final_report": final_report,
-            "messages": messages,
-            "error_message": ""
-        }
+    messages.append({"role": "system", "content": "Successfully compiled the final report."})
+    total = token_usage_totals(state.get("token_usage", []) + token_usage)["total"]
+    budget = f" of a {RUN_TOKEN_BUDGET}-token budget" if RUN_TOKEN_BUDGET > 0 else ""
+    messages.append({"role": "system", "content": (
+        f"Estimated token usage: {total['input_tokens']} input and {total['output_tokens']} output tokens "
+        f"over {total['calls']} LLM calls{budget}."
+    )})
+
+    return {
+        "final_report": final_report,
+        "messages": messages,
+        "token_usage": token_usage,
+        "error_message": ""
+    }
+
+def compile_report_node(state: ResearchState) -> Dict[str, Any]:
+    """
+    Compiles the summaries into a final, structured research report.
+    Returns a dict with 'final_report' and new 'messages' entries.
+    Handles cases where no summaries are available.
+    """
+    topic = state.get("topic", "")
+    unavailable, summaries, messages = _report_inputs(state)
+    if unavailable:
+        return unavailable
+
+    token_usage = []
+    try:
+        # Merge large summary sets hierarchically so the final prompt stays within budget
+        summaries = _reduce_summaries(topic, summaries, messages, token_usage)
+        prompt = _report_prompt(topic, summaries)
+        return _report_update(state, prompt, call_llm(prompt), messages, token_usage)
     except Exception as e:
-        error_message = f"Error compiling the final report: {str(e)}"
-        messages.append({"role": "system", "content": error_message})
-        return {
-            "final_report": "",
-            "messages": messages,
-            "error_message": error_message
-        }
+        return _report_error(f"Error compiling the final report: {str(e)}", messages, token_usage)
+
+async def acompile_report_node(state: ResearchState) -> Dict[str, Any]:
+    """Async version of compile_report_node."""
+    topic = state.get("topic", "")
+    unavailable, summaries, messages = _report_inputs(state)
+    if unavailable:
+        return unavailable
+
+    token_usage = []
+    try:
+        summaries = await _areduce_summaries(topic, summaries, messages, token_usage)
+        prompt = _report_prompt(topic, summaries)
+        return _report_update(state, prompt, await acall_llm(prompt), messages, token_usage)
+    except Exception as e:
+        return _report_error(f"Error compiling the final report: {str(e)}", messages, token_usage)
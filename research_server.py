@@ -0,0 +1,453 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import signal
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent_runner import metrics_report
+from workflow_builder import astepwise_agent, build_workflow, research_thread_id
+
+# Jobs run at once; each is a coroutine on the service's event loop, so this mostly bounds memory and upstream load
+RESEARCH_SERVER_WORKERS = int(os.getenv("RESEARCH_SERVER_WORKERS", "8"))
+# Jobs waiting for a worker; further submissions are rejected until the queue drains
+RESEARCH_SERVER_QUEUE_SIZE = int(os.getenv("RESEARCH_SERVER_QUEUE_SIZE", "100"))
+# Seconds a finished job (and its report and events) stays available to clients
+RESEARCH_SERVER_JOB_TTL = float(os.getenv("RESEARCH_SERVER_JOB_TTL", "3600"))
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.getenv("RESEARCH_SERVER_PORT", "8765"))
+
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while RESEARCH_SERVER_QUEUE_SIZE jobs are already waiting."""
+
+class Job:
+    """
+    One research request: its settings, its status (queued, running, done, failed or cancelled)
+    and the progress events of its run. Events are appended by the service's event loop and
+    read by any number of client threads.
+    """
+
+    def __init__(self, topic: str, priority: int = 0, pipelined: bool = False, resume: bool = False,
+                 thread_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.topic = topic
+        self.priority = priority
+        self.pipelined = pipelined
+        self.resume = resume
+        self.thread_id = thread_id or research_thread_id(topic, pipelined)
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.report: Optional[str] = None
+        self.metrics: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        # Set while the job runs, so cancel() can interrupt it on the service's loop
+        self._task: Optional[asyncio.Task] = None
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def add_event(self, event: str, status: Optional[str] = None, **fields: Any) -> None:
+        """Records a progress event, optionally moving the job to a new status, and wakes waiting readers."""
+        with self._cond:
+            if status is not None:
+                self.status = status
+            self.events.append({"event": event, "job": self.id, "time": round(time.time(), 3), **fields})
+            self._cond.notify_all()
+
+    def wait_events(self, start: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Returns the events from index start on, waiting up to timeout seconds for one when there
+        are none yet, and whether the job had finished (so no more events will follow).
+        """
+        with self._cond:
+            if len(self.events) <= start and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[start:], self.finished
+
+    def summary(self, detail: bool = False) -> Dict[str, Any]:
+        """Returns the job as JSON-serializable data; detail adds the report and run metrics."""
+        with self._cond:
+            data = {
+                "id": self.id, "topic": self.topic, "priority": self.priority, "pipelined": self.pipelined,
+                "resume": self.resume, "thread_id": self.thread_id, "status": self.status,
+                "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+                "events": len(self.events), "error": self.error,
+            }
+            if detail:
+                data["report"] = self.report
+                data["metrics"] = self.metrics
+            return data
+
+class ResearchService:
+    """
+    Runs research jobs in a long-lived process, so imports, the LLM client, compiled workflows,
+    caches, executors and HTTP connection pools are set up once and stay warm between jobs.
+
+    Jobs wait in a bounded priority queue (higher priority first, then first come, first served)
+    and up to `workers` of them run concurrently through astepwise_agent on one event loop,
+    owned by a background thread. Submitting, inspecting and cancelling jobs is thread-safe.
+    """
+
+    def __init__(self, workers: int = RESEARCH_SERVER_WORKERS, queue_size: int = RESEARCH_SERVER_QUEUE_SIZE,
+                 job_ttl: float = RESEARCH_SERVER_JOB_TTL):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.job_ttl = job_ttl
+        self._jobs: Dict[str, Job] = {}
+        # Unfinished job per checkpoint thread; two runs of one thread would overwrite each other's checkpoints
+        self._active: Dict[str, Job] = {}
+        self._queued = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runners: List[asyncio.Task] = []
+
+    def warm_up(self) -> None:
+        """Imports the heavy dependencies and compiles both workflows ahead of the first job."""
+        import langchain_google_genai  # noqa: F401
+        import research_graph
+
+        research_graph._get_search_tool_class()
+        for pipelined in (False, True):
+            build_workflow(pipelined=pipelined, use_async=True)
+
+    def start(self, warm_up: bool = True) -> None:
+        """Starts the event loop thread and its workers."""
+        if warm_up:
+            self.warm_up()
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(started,), name="research-service", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def _run_loop(self, started: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.PriorityQueue()
+        self._runners = [self._loop.create_task(self._worker()) for _ in range(self.workers)]
+        started.set()
+        self._loop.run_forever()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Cancels queued and running jobs and stops the workers. Interrupted runs keep their
+        checkpoints, so submitting them again with resume continues where they stopped.
+        """
+        if self._loop is None:
+            return
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if not job.finished]
+        for job in jobs:
+            self.cancel(job.id)
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._loop.close()
+        self._loop = None
+
+    async def _shutdown(self) -> None:
+        with self._lock:
+            running = [job._task for job in self._jobs.values() if job._task is not None]
+        await asyncio.gather(*running, return_exceptions=True)
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        # Imported lazily so that importing the server stays light
+        import http_transport
+
+        await http_transport.aclose_session()
+
+    def submit(self, topic: str, priority: int = 0, pipelined: bool = False, resume: bool = False,
+               thread_id: Optional[str] = None) -> Job:
+        """
+        Queues a research job and returns it. A job for a checkpoint thread that already has
+        an unfinished job is not queued again: the existing job is returned instead.
+        Raises:
+            ValueError: If neither a topic nor (when resuming) a thread id is given.
+            QueueFull: If queue_size jobs are already waiting.
+            RuntimeError: If the service is not running.
+        """
+        if not topic and not (resume and thread_id):
+            raise ValueError("A topic is required, or a thread id when resuming.")
+        if self._loop is None:
+            raise RuntimeError("The research service is not running.")
+        job = Job(topic, priority=priority, pipelined=pipelined, resume=resume, thread_id=thread_id)
+        with self._lock:
+            self._prune()
+            existing = self._active.get(job.thread_id)
+            if existing is not None:
+                return existing
+            if self._queued >= self.queue_size:
+                raise QueueFull(f"{self._queued} jobs are already waiting.")
+            self._queued += 1
+            self._jobs[job.id] = job
+            self._active[job.thread_id] = job
+            job.add_event("queued", priority=priority, thread_id=job.thread_id)
+        # Negated so higher priorities sort first; the sequence number keeps equal priorities in order
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (-priority, next(self._seq), job))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        """Returns the known jobs, oldest first."""
+        with self._lock:
+            self._prune()
+            return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancels a job: a queued job is dropped, a running one is interrupted at its next await
+        (its checkpoints are kept, so it can be resumed). Returns the job, or None if unknown.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        with self._lock:
+            if job.status == "queued":
+                # The worker that later pops it sees it is no longer queued and skips it
+                self._queued -= 1
+                del self._active[job.thread_id]
+                job.finished_at = time.time()
+                job.add_event("cancelled", status="cancelled")
+                return job
+            task = job._task
+        if task is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(task.cancel)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            return {"workers": self.workers, "queue_size": self.queue_size, "queued": self._queued,
+                    "running": running, "jobs": len(self._jobs)}
+
+    def _prune(self) -> None:
+        # Called with the lock held: forgets jobs that finished more than job_ttl seconds ago
+        cutoff = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at is not None and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _finish(self, job: Job, status: str, **fields: Any) -> None:
+        # Records the job's last event and frees its checkpoint thread for new jobs
+        job.finished_at = time.time()
+        with self._lock:
+            if self._active.get(job.thread_id) is job:
+                del self._active[job.thread_id]
+        job.add_event(status, status=status, **fields)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            with self._lock:
+                if job.status != "queued":
+                    continue  # Cancelled while it waited
+                self._queued -= 1
+                job.status = "running"
+                job._task = asyncio.create_task(self._run(job))
+            # wait() rather than await: a cancelled job must not cancel its worker
+            await asyncio.wait([job._task])
+            if not job.finished:
+                self._finish(job, "cancelled", resumable=True)  # Cancelled before it started
+            job._task = None
+
+    async def _run(self, job: Job) -> None:
+        job.started_at = time.time()
+        job.add_event("started")
+        try:
+            async for node_name, status_message, state in astepwise_agent(
+                    job.topic, pipelined=job.pipelined, resume=job.resume, thread_id=job.thread_id):
+                if node_name == "done":
+                    job.report = state.get("final_report", "")
+                    job.metrics = metrics_report(state)
+                    self._finish(job, "done", report=job.report, error_message=state.get("error_message"))
+                    return
+                records = [m for m in state.get("node_metrics", []) if m.get("node") == node_name]
+                job.add_event("node", node=node_name, message=status_message, metrics=records[-1] if records else None)
+        except asyncio.CancelledError:
+            self._finish(job, "cancelled", resumable=True)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            self._finish(job, "failed", error=job.error)
+
+_JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)(/events)?$")
+
+class ResearchRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API over the server's ResearchService:
+        POST   /jobs               {"topic", "priority", "pipelined", "resume", "thread_id"} -> 202 and the job
+        GET    /jobs               every known job
+        GET    /jobs/<id>          the job, with its report and metrics once done
+        GET    /jobs/<id>/events   the job's progress events as NDJSON, streamed until it finishes
+        DELETE /jobs/<id>          cancels the job
+        GET    /health             queue and worker counts
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Seconds an events stream waits for the next event before checking the connection again
+    event_poll = 15.0
+
+    @property
+    def service(self) -> ResearchService:
+        return self.server.service
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/health":
+            return self._send_json(200, {"status": "ok", **self.service.stats()})
+        if path == "/jobs":
+            return self._send_json(200, {"jobs": [job.summary() for job in self.service.jobs()]})
+        match = _JOB_PATH.match(path)
+        job = self.service.get(match.group(1)) if match else None
+        if job is None:
+            return self._send_error(404, "Not found.")
+        if match.group(2):
+            return self._stream_events(job)
+        self._send_json(200, job.summary(detail=True))
+
+    def do_POST(self) -> None:
+        if self.path.split("?", 1)[0].rstrip("/") != "/jobs":
+            return self._send_error(404, "Not found.")
+        try:
+            request = self._read_json()
+            if not isinstance(request, dict):
+                raise ValueError("Expected a JSON object.")
+            job = self.service.submit(str(request.get("topic") or "").strip(), priority=int(request.get("priority", 0)),
+                                      pipelined=bool(request.get("pipelined", False)),
+                                      resume=bool(request.get("resume", False)), thread_id=request.get("thread_id"))
+        except (ValueError, TypeError) as e:
+            return self._send_error(400, str(e))
+        except QueueFull as e:
+            return self._send_error(503, f"Job queue is full: {e}")
+        self._send_json(202, job.summary())
+
+    def do_DELETE(self) -> None:
+        match = _JOB_PATH.match(self.path.split("?", 1)[0].rstrip("/"))
+        job = self.service.cancel(match.group(1)) if match and not match.group(2) else None
+        if job is None:
+            return self._send_error(404, "Not found.")
+        self._send_json(200, job.summary())
+
+    def _stream_events(self, job: Job) -> None:
+        # No Content-Length: the stream ends when the job finishes and the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        sent = 0
+        try:
+            while True:
+                events, finished = job.wait_events(sent, self.event_poll)
+                for event in events:
+                    self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+                self.wfile.flush()
+                sent += len(events)
+                if finished and not events:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away; the job carries on
+
+    def address_string(self) -> str:
+        # Unix-socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class ResearchHTTPServer(ThreadingHTTPServer):
+    """HTTP server on a TCP port; every connection is handled on its own thread."""
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: ResearchService, verbose: bool = False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, ResearchRequestHandler)
+
+class ResearchUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """The same HTTP API on a Unix domain socket, reachable only by local users allowed to open the file."""
+    daemon_threads = True
+
+    def __init__(self, path: str, service: ResearchService, verbose: bool = False):
+        self.service = service
+        self.verbose = verbose
+        if os.path.exists(path):
+            os.unlink(path)  # Left behind by a server that did not shut down cleanly
+        super().__init__(path, ResearchRequestHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+def create_server(service: ResearchService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  unix_socket: Optional[str] = None, verbose: bool = False) -> socketserver.BaseServer:
+    """Returns an HTTP server for service on unix_socket when given, else on host:port (port 0 picks a free one)."""
+    if unix_socket:
+        return ResearchUnixHTTPServer(unix_socket, service, verbose=verbose)
+    return ResearchHTTPServer((host, port), service, verbose=verbose)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the research agent as a local job server.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"interface to listen on (default {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default {DEFAULT_PORT})")
+    parser.add_argument("--socket", help="listen on this Unix socket path instead of a TCP port")
+    parser.add_argument("--workers", type=int, default=RESEARCH_SERVER_WORKERS, help="jobs run at once")
+    parser.add_argument("--queue-size", type=int, default=RESEARCH_SERVER_QUEUE_SIZE, help="jobs allowed to wait")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    service = ResearchService(workers=args.workers, queue_size=args.queue_size)
+    print("Warming up...")
+    service.start()
+    server = create_server(service, host=args.host, port=args.port, unix_socket=args.socket, verbose=args.verbose)
+    where = args.socket or "http://%s:%d" % server.server_address[:2]
+    print(f"Research server listening on {where} ({service.workers} workers, queue of {service.queue_size})")
+    # Stop on SIGTERM (e.g. from a service manager) the same way as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down; interrupted jobs can be resumed.")
+    finally:
+        server.server_close()
+        service.stop()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
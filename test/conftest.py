@@ -0,0 +1,95 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import rate_governor
+import research_graph
+import workflow_builder
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Points the on-disk caches and checkpoints at a per-test directory and gives each test a fresh LLM rate governor, so tests never share cached pages, runs or throttling state."""
+    monkeypatch.setattr(research_graph, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(research_graph, "_caches", {})
+    monkeypatch.setattr(workflow_builder, "CHECKPOINT_DB", "")
+    monkeypatch.setattr(workflow_builder, "_checkpointers", {})
+    monkeypatch.setattr(workflow_builder, "_workflows", {})
+    monkeypatch.setattr(rate_governor, "_governor", None)
+    yield
+    for cache in research_graph._caches.values():
+        cache.close()
+    for checkpointer in workflow_builder._checkpointers.values():
+        checkpointer.close()
+
+class PageResponse:
+    """Stands in for both a requests response (sync scraping) and an aiohttp response (async scraping) of a page naming its URL."""
+
+    def __init__(self, url):
+        self.status_code = self.status = 200
+        self.headers = {"Content-Type": "text/html"}
+        self.body = f"<html><body><p>Content of {url}</p></body></html>".encode("utf-8")
+        self.content = self
+
+    def iter_content(self, chunk_size=1):
+        yield self.body
+
+    async def iter_chunked(self, chunk_size):
+        yield self.body
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+    def release(self):
+        pass
+
+def fake_llm_response(messages):
+    """Answers the query, summary and report prompts the way the LLM would, naming the page or topic they are about."""
+    prompt = messages[0].content
+    response = MagicMock()
+    if "generate 3-5 effective search queries" in prompt:
+        response.content = "1. first query\n2. second query"
+    elif "provide a concise summary" in prompt:
+        response.content = f"Summary of {prompt.rsplit('Content of ', 1)[1]}"
+    else:
+        response.content = f"Final report on {prompt.split(chr(39))[1]}."
+    return response
+
+async def afake_llm_response(messages):
+    await asyncio.sleep(0.01)
+    return fake_llm_response(messages)
+
+def _search_results(query):
+    return [{"url": f"http://example.com/{query.split()[0]}/{i}"} for i in range(2)]
+
+@pytest.fixture
+def fakes(monkeypatch):
+    """Fake search, page fetches and LLM for both the sync and the async nodes, with every cache off."""
+    monkeypatch.setattr(research_graph, "PAGE_CACHE_TTL", 0)
+    monkeypatch.setattr(research_graph, "SEARCH_CACHE_TTL", 0)
+    monkeypatch.setattr(research_graph, "LLM_CACHE_ENABLED", False)
+    with patch('research_graph.TavilySearchResults') as mock_tavily, \
+         patch('http_transport.get', side_effect=lambda url, **kwargs: PageResponse(url)) as mock_get, \
+         patch('http_transport.aget', side_effect=lambda url, **kwargs: PageResponse(url)) as mock_aget, \
+         patch('research_graph.call_llm', side_effect=fake_llm_response) as mock_call_llm, \
+         patch('research_graph.acall_llm', side_effect=afake_llm_response) as mock_acall_llm:
+        mock_tavily.return_value.invoke.side_effect = _search_results
+        mock_tavily.return_value.ainvoke = AsyncMock(side_effect=_search_results)
+        yield {"tavily": mock_tavily.return_value, "get": mock_get, "aget": mock_aget,
+               "call_llm": mock_call_llm, "acall_llm": mock_acall_llm}
+
+def claim_in_subprocess(path, thread_id):
+    """Starts a process that claims thread_id in the checkpoint file at path and holds it until its stdin is closed."""
+    script = ("import sys; from checkpoint_store import SQLiteCheckpointer; "
+              f"SQLiteCheckpointer({path!r}).claim({thread_id!r}); print('claimed', flush=True); sys.stdin.read()")
+    holder = subprocess.Popen([sys.executable, "-c", script], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert holder.stdout.readline().strip() == "claimed"
+    return holder
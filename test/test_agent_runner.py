@@ -3,7 +3,7 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from unittest.mock import patch, MagicMock, mock_open
-from agent_runner import run_agent
+from agent_runner import metrics_report, run_agent, run_batch, read_topics, report_filename, resume_command
 
 @patch('agent_runner.stepwise_agent')
 @patch('builtins.open', new_callable=mock_open)
@@ -44,7 +44,7 @@ def test_run_agent_with_debug_flag_true(mock_yaspin, mock_open_func, mock_stepwi
     mock_yaspin.return_value = mock_spinner
 
     # Simulate debug output from stepwise_agent
-    def fake_stepwise_agent(topic, debug=False):
+    def fake_stepwise_agent(topic, debug=False, **kwargs):
         if debug:
             print("[DEBUG] Simulated debug output")
         yield ("query_generator", "Generating search queries...", {"search_queries": ["a", "b"]})
@@ -75,3 +75,165 @@ def test_run_agent_with_debug_flag_false(mock_yaspin, mock_open_func, mock_stepw
     run_agent("Test Topic", debug=False)
     captured = capsys.readouterr()
     assert "[DEBUG]" not in captured.out
+
+def test_read_topics_skips_blanks_comments_and_duplicates(tmp_path):
+    """
+    Tests that topic files are read one topic per line, ignoring blanks, comments and repeats.
+    """
+    topics_file = tmp_path / "topics.txt"
+    topics_file.write_text("# batch\nTopic A\n\n  Topic B  \nTopic A\n", encoding="utf-8")
+    assert read_topics(str(topics_file)) == ["Topic A", "Topic B"]
+
+def test_read_topics_from_stdin(monkeypatch):
+    """
+    Tests that "-" reads topics from stdin.
+    """
+    import io
+    monkeypatch.setattr(sys, "stdin", io.StringIO("Topic A\nTopic B\n"))
+    assert read_topics("-") == ["Topic A", "Topic B"]
+
+def test_run_batch_writes_one_report_per_topic(tmp_path):
+    """
+    Tests that batch mode writes a separate report file for every topic.
+    """
+    def fake_stepwise_agent(topic, debug=False, **kwargs):
+        yield ("done", "Report generated.", {"final_report": f"Report on {topic}"})
+
+    with patch('agent_runner.stepwise_agent', side_effect=fake_stepwise_agent):
+        reports = run_batch(["Topic A", "Topic B", "Topic C"], parallelism=2, output_dir=str(tmp_path))
+
+    assert set(reports) == {"Topic A", "Topic B", "Topic C"}
+    for topic, path in reports.items():
+        assert os.path.basename(path) == report_filename(topic)
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == f"Report on {topic}"
+
+def test_run_batch_respects_parallelism(tmp_path):
+    """
+    Tests that no more than `parallelism` topics are researched at the same time.
+    """
+    import threading
+    import time
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+
+    def fake_stepwise_agent(topic, debug=False, **kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        yield ("done", "Report generated.", {"final_report": topic})
+
+    with patch('agent_runner.stepwise_agent', side_effect=fake_stepwise_agent):
+        reports = run_batch([f"Topic {i}" for i in range(6)], parallelism=2, output_dir=str(tmp_path))
+
+    assert len(reports) == 6
+    assert active["peak"] == 2
+
+def test_run_batch_isolates_failures(tmp_path, capsys):
+    """
+    Tests that a failing topic is reported without stopping the others.
+    """
+    def fake_stepwise_agent(topic, debug=False, **kwargs):
+        if topic == "Bad Topic":
+            raise RuntimeError("search quota exceeded")
+        yield ("done", "Report generated.", {"final_report": topic})
+
+    with patch('agent_runner.stepwise_agent', side_effect=fake_stepwise_agent):
+        reports = run_batch(["Good Topic", "Bad Topic"], parallelism=2, output_dir=str(tmp_path))
+
+    assert list(reports) == ["Good Topic"]
+    assert "Bad Topic: search quota exceeded" in capsys.readouterr().out
+
+def test_report_filename_is_unique_per_topic():
+    """
+    Tests that topics with the same slug still get distinct report names.
+    """
+    assert report_filename("AI safety?") != report_filename("AI safety!")
+    assert report_filename("AI safety?").startswith("research_report_ai-safety_")
+
+def _fake_run_with_metrics(topic, debug=False, **kwargs):
+    state = {
+        "topic": topic,
+        "final_report": f"Report on {topic}",
+        "node_metrics": [{"node": "web_searcher", "started_at": 0.0, "wall_time_s": 0.5, "llm_calls": 0,
+                          "search_calls": 3, "http_requests": 0, "bytes_fetched": 0, "cache_hits": 1,
+                          "cache_misses": 3, "errors": 0}],
+        "token_usage": [{"node": "report_compiler", "document": None, "input_tokens": 100, "output_tokens": 50}],
+    }
+    yield ("web_searcher", "Performing web search...", state)
+    yield ("done", "Report generated.", state)
+
+@patch('yaspin.yaspin', autospec=True)
+def test_run_agent_writes_metrics_file(mock_yaspin, tmp_path, monkeypatch):
+    """
+    Tests that run_agent writes per-node metrics as JSON when a metrics path is given.
+    """
+    import json
+    monkeypatch.chdir(tmp_path)
+    with patch('agent_runner.stepwise_agent', side_effect=_fake_run_with_metrics):
+        run_agent("Test Topic", metrics_path="metrics.json")
+
+    metrics = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert metrics["topic"] == "Test Topic"
+    assert metrics["totals"]["web_searcher"]["search_calls"] == 3
+    assert metrics["token_usage"]["total"]["input_tokens"] == 100
+
+def test_run_batch_writes_metrics_keyed_by_topic(tmp_path):
+    """
+    Tests that batch mode collects every topic's metrics into one JSON file.
+    """
+    import json
+    with patch('agent_runner.stepwise_agent', side_effect=_fake_run_with_metrics):
+        run_batch(["Topic A", "Topic B"], output_dir=str(tmp_path), metrics_path=str(tmp_path / "metrics.json"))
+
+    metrics = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert list(metrics) == ["Topic A", "Topic B"]
+    assert metrics["Topic B"]["wall_time_s"] == 0.5
+
+def test_run_wall_time_counts_overlapping_nodes_once():
+    """
+    Tests that a run's wall time spans its nodes, not their sum, when pipelined nodes run at the same time.
+    """
+    records = [{"node": "query_generator", "started_at": 100.0, "wall_time_s": 1.0},
+               {"node": "document_scraper", "started_at": 101.0, "wall_time_s": 2.0},
+               {"node": "document_scraper", "started_at": 101.5, "wall_time_s": 2.0},
+               {"node": "report_compiler", "started_at": 103.5, "wall_time_s": 0.5}]
+
+    assert metrics_report({"node_metrics": records})["wall_time_s"] == 4.0
+    assert metrics_report({})["wall_time_s"] == 0.0
+
+@patch('yaspin.yaspin', autospec=True)
+def test_run_agent_failure_prints_resume_command(mock_yaspin, capsys):
+    """
+    Tests that a failed run tells the user how to resume it, and that resume options reach the workflow.
+    """
+    def failing_stepwise_agent(topic, debug=False, **kwargs):
+        assert kwargs["resume"] is True and kwargs["thread_id"] is None
+        raise RuntimeError("connection lost")
+        yield
+
+    with patch('agent_runner.stepwise_agent', side_effect=failing_stepwise_agent):
+        run_agent("Test Topic", pipelined=True, resume=True)
+
+    out = capsys.readouterr().out
+    assert "Error: connection lost" in out
+    assert 'python agent_runner.py "Test Topic" --resume --pipelined' in out
+    assert resume_command("", thread_id="sequential-abc") == "python agent_runner.py --thread sequential-abc --resume"
+
+def test_run_batch_passes_resume(tmp_path):
+    """
+    Tests that batch mode resumes every topic when asked to.
+    """
+    seen = []
+
+    def fake_stepwise_agent(topic, debug=False, **kwargs):
+        seen.append((topic, kwargs.get("resume")))
+        yield ("done", "Report generated.", {"final_report": topic})
+
+    with patch('agent_runner.stepwise_agent', side_effect=fake_stepwise_agent):
+        run_batch(["Topic A", "Topic B"], parallelism=1, output_dir=str(tmp_path), resume=True)
+
+    assert sorted(seen) == [("Topic A", True), ("Topic B", True)]
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from langchain_core.messages import HumanMessage
+import research_graph
+from cache_store import SQLiteCache
+from conftest import PageResponse, afake_llm_response
+from workflow_builder import astepwise_agent, get_checkpointer, research_thread_id, stepwise_agent
+
+async def _collect(agen):
+    return [step async for step in agen]
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_astepwise_agent_matches_stepwise_agent(fakes, pipelined):
+    """The async workflow yields the same steps and report as the sync one, through the async search and HTTP clients."""
+    sync_steps = list(stepwise_agent("Test Topic", pipelined=pipelined))
+    async_steps = asyncio.run(_collect(astepwise_agent("Test Topic", pipelined=pipelined)))
+
+    assert sorted(step[0] for step in async_steps) == sorted(step[0] for step in sync_steps)
+    sync_final, async_final = sync_steps[-1][2], async_steps[-1][2]
+    assert async_final["final_report"] == sync_final["final_report"] == "Final report on Test Topic."
+    assert async_final["summaries"] == sync_final["summaries"]
+    assert len(async_final["summaries"]) == 4
+    assert fakes["tavily"].ainvoke.call_count == 2
+    assert fakes["aget"].call_count == 4
+    # Every async node run is instrumented like its sync counterpart
+    assert {m["node"] for m in async_final["node_metrics"]} == {m["node"] for m in sync_final["node_metrics"]}
+
+def test_concurrent_runs_share_one_event_loop(fakes):
+    """Many runs progress concurrently on a single loop; their LLM calls overlap."""
+    in_flight = []
+    peak = []
+
+    async def tracked_llm(messages):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        try:
+            return await afake_llm_response(messages)
+        finally:
+            in_flight.pop()
+
+    fakes["acall_llm"].side_effect = tracked_llm
+
+    async def run_all():
+        return await asyncio.gather(*(_collect(astepwise_agent(f"Topic {i}", pipelined=True)) for i in range(10)))
+
+    runs = asyncio.run(run_all())
+
+    assert [steps[-1][2]["final_report"] for steps in runs] == [f"Final report on Topic {i}." for i in range(10)]
+    assert max(peak) > 1
+
+def test_astepwise_agent_resumes_interrupted_run(fakes):
+    """An async run interrupted at the report step resumes there."""
+    with patch('workflow_builder.acompile_report_node', side_effect=RuntimeError("crashed")):
+        with pytest.raises(RuntimeError):
+            asyncio.run(_collect(astepwise_agent("Test Topic")))
+    calls_before = fakes["acall_llm"].call_count
+
+    steps = asyncio.run(_collect(astepwise_agent("Test Topic", resume=True)))
+
+    assert [step[0] for step in steps] == ["report_compiler", "done"]
+    assert fakes["acall_llm"].call_count == calls_before + 1
+    assert get_checkpointer().get_tuple({"configurable": {"thread_id": research_thread_id("Test Topic")}}) is None
+
+def test_async_cache_calls_run_off_the_event_loop(monkeypatch):
+    """The async LLM, search and scrape paths read and write their SQLite caches in worker threads."""
+    threads = []
+    for name in ("get", "set", "touch"):
+        original = getattr(SQLiteCache, name)
+        def recording(self, *args, _original=original, **kwargs):
+            threads.append(threading.get_ident())
+            return _original(self, *args, **kwargs)
+        monkeypatch.setattr(SQLiteCache, name, recording)
+    search_tool = MagicMock()
+    search_tool.ainvoke = AsyncMock(return_value=[{"url": "http://example.com/a"}])
+
+    async def run():
+        with patch('research_graph.llm') as mock_llm, \
+             patch('http_transport.aget', side_effect=lambda url, **kwargs: PageResponse(url)):
+            mock_llm.ainvoke = AsyncMock(return_value="answer")
+            await research_graph.acall_llm([HumanMessage(content="Prompt")])
+            await research_graph._asearch_with_cache(search_tool, "query")
+            await research_graph._ascrape_url("http://example.com/a")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+
+    assert len(threads) >= 6
+    assert loop_thread not in threads
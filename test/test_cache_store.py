@@ -0,0 +1,120 @@
+import sqlite3
+import time
+import pytest
+from cache_store import SQLiteCache, TieredCache
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache" / "test.sqlite3")
+
+def test_set_and_get(cache_path):
+    """Stored values are returned as fresh entries."""
+    cache = SQLiteCache(cache_path, ttl=60, max_bytes=1024 * 1024)
+    cache.set("key", {"content": "value"})
+
+    entry = cache.get("key")
+    assert entry.value == {"content": "value"}
+    assert entry.fresh
+    assert cache.get("missing") is None
+
+def test_entries_persist_across_instances(cache_path):
+    """Entries survive reopening the cache file."""
+    SQLiteCache(cache_path, ttl=60, max_bytes=1024 * 1024).set("key", "value")
+
+    reopened = SQLiteCache(cache_path, ttl=60, max_bytes=1024 * 1024)
+    assert reopened.get("key").value == "value"
+
+def test_expired_entries(cache_path):
+    """Expired entries are misses unless stale reads are allowed, and touch() refreshes them."""
+    cache = SQLiteCache(cache_path, ttl=0.01, max_bytes=1024 * 1024)
+    cache.set("key", "value")
+    time.sleep(0.02)
+
+    assert cache.get("key") is None
+    stale = cache.get("key", allow_stale=True)
+    assert stale.value == "value" and not stale.fresh
+
+    cache.touch("key")
+    assert cache.get("key").fresh
+
+def test_lru_eviction_respects_size_bound(cache_path):
+    """The least recently used entries are evicted once the size bound is exceeded."""
+    cache = SQLiteCache(cache_path, ttl=60, max_bytes=250)
+    cache.set("a", "x" * 100)
+    time.sleep(0.001)
+    cache.set("b", "x" * 100)
+    time.sleep(0.001)
+    cache.get("a")  # "b" is now the least recently used entry
+    cache.set("c", "x" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.total_bytes() <= 250
+
+def test_size_total_is_kept_without_scanning(cache_path):
+    """Writes keep a running size total in step with inserts, replacements and evictions, without summing the table."""
+    cache = SQLiteCache(cache_path, ttl=60, max_bytes=250)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    for key, size in [("a", 50), ("b", 100), ("a", 20), ("c", 100), ("d", 60)]:
+        cache.set(key, "x" * size)
+
+    assert not any("SUM(" in statement for statement in statements)
+    cache._conn.set_trace_callback(None)
+    assert cache.total_bytes() == cache._conn.execute("SELECT SUM(size) FROM entries").fetchone()[0] <= 250
+    assert cache.get("b") is None
+
+def test_size_total_of_an_existing_file(cache_path):
+    """A cache file written before the running total existed gets its total computed once when opened."""
+    SQLiteCache(cache_path, ttl=60, max_bytes=1024).set("key", "x" * 100)
+    conn = sqlite3.connect(cache_path)
+    conn.executescript("DROP TRIGGER entries_insert_size; DROP TRIGGER entries_update_size; "
+                       "DROP TRIGGER entries_delete_size; DROP TABLE totals;")
+    conn.close()
+
+    cache = SQLiteCache(cache_path, ttl=60, max_bytes=1024)
+    assert cache.total_bytes() == 102
+    cache.set("other", "x" * 10)
+    assert cache.total_bytes() == 114
+
+def test_unserializable_value_is_ignored(cache_path):
+    """Values that cannot be stored are skipped rather than raising."""
+    cache = SQLiteCache(cache_path, ttl=60, max_bytes=1024)
+    cache.set("key", object())
+    assert cache.get("key") is None
+
+def test_tiered_cache_counts_hits_and_misses(cache_path):
+    """Hits and misses are counted across both tiers."""
+    cache = TieredCache(SQLiteCache(cache_path, ttl=60, max_bytes=1024 * 1024), memory_entries=2)
+    assert cache.get("key") is None
+    cache.set("key", ["value"])
+    assert cache.get("key").value == ["value"]
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+def test_tiered_cache_memory_lru_backed_by_disk(cache_path):
+    """Entries evicted from the memory tier are still served, and promoted, from disk."""
+    disk = SQLiteCache(cache_path, ttl=60, max_bytes=1024 * 1024)
+    cache = TieredCache(disk, memory_entries=1)
+    cache.set("a", "first")
+    cache.set("b", "second")
+    assert list(cache._memory) == ["b"]
+
+    assert cache.get("a").value == "first"
+    assert list(cache._memory) == ["a"]
+
+def test_tiered_cache_returns_copies(cache_path):
+    """Mutating a returned value does not corrupt the memory tier."""
+    cache = TieredCache(SQLiteCache(cache_path, ttl=60, max_bytes=1024 * 1024), memory_entries=4)
+    cache.set("key", [{"url": "a"}])
+    cache.get("key").value.append({"url": "b"})
+    assert cache.get("key").value == [{"url": "a"}]
+
+def test_tiered_cache_expiry(cache_path):
+    """Expired memory entries are misses unless stale reads are allowed."""
+    cache = TieredCache(SQLiteCache(cache_path, ttl=0.01, max_bytes=1024 * 1024), memory_entries=4)
+    cache.set("key", "value")
+    time.sleep(0.02)
+    assert cache.get("key") is None
+    assert cache.get("key", allow_stale=True).value == "value"
+    assert cache.stats()["hits"] == 0
@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from langchain_core.messages import HumanMessage
+from research_graph import _remaining_tokens, call_llm, generate_queries_node, token_usage_totals
+
+@pytest.fixture
+def mock_llm():
+    with patch('research_graph.llm') as mock_llm_instance:
+        mock_llm_instance.model = "test-model"
+        mock_llm_instance.temperature = 0
+        mock_llm_instance.invoke.side_effect = lambda messages: f"response {mock_llm_instance.invoke.call_count}"
+        yield mock_llm_instance
+
+def test_identical_prompts_are_memoized(mock_llm):
+    """A repeated prompt is answered from the cache without calling the model."""
+    first = call_llm([HumanMessage(content="Summarize this page.")])
+    second = call_llm([HumanMessage(content="Summarize this page.")])
+
+    assert first == second == "response 1"
+    assert mock_llm.invoke.call_count == 1
+
+def test_different_prompts_are_not_shared(mock_llm):
+    """Distinct prompts each reach the model."""
+    call_llm([HumanMessage(content="Prompt A")])
+    call_llm([HumanMessage(content="Prompt B")])
+    assert mock_llm.invoke.call_count == 2
+
+def test_key_includes_model_and_temperature(mock_llm):
+    """Changing the model or temperature invalidates cached responses."""
+    prompt = [HumanMessage(content="Same prompt")]
+    call_llm(prompt)
+    mock_llm.temperature = 0.7
+    call_llm(prompt)
+    mock_llm.model = "other-model"
+    call_llm(prompt)
+    assert mock_llm.invoke.call_count == 3
+
+def test_explicit_bypass(mock_llm):
+    """use_cache=False always calls the model."""
+    prompt = [HumanMessage(content="Fresh answer please")]
+    call_llm(prompt)
+    call_llm(prompt, use_cache=False)
+    assert mock_llm.invoke.call_count == 2
+
+def test_global_bypass_switch(mock_llm):
+    """LLM_CACHE_ENABLED=False disables the response cache."""
+    prompt = [HumanMessage(content="Prompt")]
+    with patch('research_graph.LLM_CACHE_ENABLED', False):
+        call_llm(prompt)
+        call_llm(prompt)
+    assert mock_llm.invoke.call_count == 2
+
+def test_failures_are_not_cached(mock_llm):
+    """An exception from the model is raised and nothing is stored."""
+    mock_llm.invoke.side_effect = RuntimeError("LLM is down")
+    with pytest.raises(RuntimeError):
+        call_llm([HumanMessage(content="Prompt")])
+
+    mock_llm.invoke.side_effect = None
+    mock_llm.invoke.return_value = "recovered"
+    assert call_llm([HumanMessage(content="Prompt")]) == "recovered"
+
+def test_non_text_responses_are_not_cached(mock_llm):
+    """Only plain-text responses are memoized."""
+    response = MagicMock()
+    response.content = "message response"
+    mock_llm.invoke.side_effect = None
+    mock_llm.invoke.return_value = response
+
+    assert call_llm([HumanMessage(content="Prompt")]) is response
+    call_llm([HumanMessage(content="Prompt")])
+    assert mock_llm.invoke.call_count == 2
+
+def test_cached_answers_are_not_charged(mock_llm):
+    """Usage of an answer from the cache is marked and left out of the run's token totals and budget."""
+    state = {"topic": "Test Topic", "messages": []}
+    [first] = generate_queries_node(state)["token_usage"]
+    [repeat] = generate_queries_node(state)["token_usage"]
+
+    assert mock_llm.invoke.call_count == 1
+    assert "cached" not in first and repeat["cached"]
+    assert token_usage_totals([first, repeat])["total"]["calls"] == 1
+    with patch('research_graph.RUN_TOKEN_BUDGET', 1000):
+        spent = first["input_tokens"] + first["output_tokens"]
+        assert _remaining_tokens({"token_usage": [first, repeat]}) == 1000 - spent
@@ -0,0 +1,132 @@
+import operator
+import os
+import pytest
+from typing import Annotated, Any, List
+from typing_extensions import TypedDict
+from langchain_core.messages import HumanMessage
+from langgraph.graph import StateGraph, END
+import checkpoint_store
+from checkpoint_store import SQLiteCheckpointer, ThreadBusyError
+from conftest import claim_in_subprocess
+
+class _State(TypedDict):
+    count: int
+    log: Annotated[List[Any], operator.add]
+
+def _build_graph(checkpointer, steps=4):
+    graph = StateGraph(_State)
+    for i in range(steps):
+        graph.add_node(f"step{i}", lambda state, i=i: {"count": state["count"] + 1, "log": [HumanMessage(content=f"step {i}")]})
+    graph.set_entry_point("step0")
+    for i in range(steps - 1):
+        graph.add_edge(f"step{i}", f"step{i + 1}")
+    graph.add_edge(f"step{steps - 1}", END)
+    return graph.compile(checkpointer=checkpointer)
+
+@pytest.fixture
+def checkpoint_path(tmp_path):
+    return str(tmp_path / "checkpoints" / "test.sqlite3")
+
+def test_checkpoints_persist_across_instances(checkpoint_path):
+    """A run's state and history can be read back after reopening the file."""
+    config = {"configurable": {"thread_id": "t1"}}
+    _build_graph(SQLiteCheckpointer(checkpoint_path)).invoke({"count": 0, "log": [HumanMessage(content="start")]}, config)
+
+    app = _build_graph(SQLiteCheckpointer(checkpoint_path))
+    state = app.get_state(config)
+    assert state.values["count"] == 4
+    assert [m.content for m in state.values["log"]] == ["start", "step 0", "step 1", "step 2", "step 3"]
+    assert state.next == ()
+    # The input checkpoint, one per step and the initial empty one
+    assert len(list(app.get_state_history(config))) == 6
+
+def test_append_only_lists_are_stored_as_deltas(checkpoint_path, monkeypatch):
+    """A list that only grew is stored as its new items, with a full copy every DELTA_SNAPSHOT_INTERVAL versions."""
+    monkeypatch.setattr(checkpoint_store, "DELTA_SNAPSHOT_INTERVAL", 2)
+    checkpointer = SQLiteCheckpointer(checkpoint_path)
+    config = {"configurable": {"thread_id": "t1"}}
+    app = _build_graph(checkpointer, steps=6)
+    app.invoke({"count": 0, "log": [HumanMessage(content="start")]}, config)
+
+    kinds = [row[0] for row in checkpointer._conn.execute(
+        "SELECT kind FROM blobs WHERE channel = 'log' ORDER BY version"
+    )]
+    assert kinds == ["full", "delta", "delta", "full", "delta", "delta", "full"]
+    # Every stored version reads back in full, whichever way it was stored
+    for snapshot in app.get_state_history(config):
+        if "count" in snapshot.values:
+            assert len(snapshot.values["log"]) == snapshot.values["count"] + 1
+
+def test_thread_ids_are_isolated_and_deletable(checkpoint_path):
+    """Threads do not see each other's checkpoints, and delete_thread removes only its own."""
+    checkpointer = SQLiteCheckpointer(checkpoint_path)
+    app = _build_graph(checkpointer)
+    app.invoke({"count": 0, "log": []}, {"configurable": {"thread_id": "t1"}})
+    app.invoke({"count": 10, "log": []}, {"configurable": {"thread_id": "t2"}})
+
+    checkpointer.delete_thread("t1")
+
+    assert checkpointer.get_tuple({"configurable": {"thread_id": "t1"}}) is None
+    assert app.get_state({"configurable": {"thread_id": "t2"}}).values["count"] == 14
+    assert {t.config["configurable"]["thread_id"] for t in checkpointer.list(None)} == {"t2"}
+
+def test_claims_keep_runs_of_a_thread_apart(checkpoint_path, monkeypatch):
+    """A thread held by a live run, in this process or another, cannot be claimed until released or abandoned."""
+    checkpointer = SQLiteCheckpointer(checkpoint_path)
+    token = checkpointer.claim("t1")
+    with pytest.raises(ThreadBusyError, match=f"process {os.getpid()} "):
+        checkpointer.claim("t1")
+    checkpointer.claim("t2")
+    checkpointer.release("t1", token)
+    checkpointer.claim("t1")
+
+    holder = claim_in_subprocess(checkpoint_path, "t3")
+    with pytest.raises(ThreadBusyError, match=f"process {holder.pid} "):
+        checkpointer.claim("t3")
+    holder.stdin.close()
+    holder.wait()
+    # The holder exited without releasing its claim
+    checkpointer.claim("t3")
+
+    # A claim not renewed by a checkpoint within CLAIM_TTL is abandoned as well
+    monkeypatch.setattr(checkpoint_store, "CLAIM_TTL", -1)
+    checkpointer.claim("t2")
+
+def test_list_filters_and_limits(checkpoint_path):
+    """list() yields newest first and honours before, filter and limit."""
+    checkpointer = SQLiteCheckpointer(checkpoint_path)
+    config = {"configurable": {"thread_id": "t1"}}
+    _build_graph(checkpointer).invoke({"count": 0, "log": []}, config)
+
+    history = list(checkpointer.list(config))
+    ids = [t.config["configurable"]["checkpoint_id"] for t in history]
+    assert ids == sorted(ids, reverse=True)
+    assert [t.config for t in checkpointer.list(config, limit=2)] == [t.config for t in history[:2]]
+    assert [t.config for t in checkpointer.list(config, before=history[1].config)] == [t.config for t in history[2:]]
+    assert [t.metadata["step"] for t in checkpointer.list(config, filter={"source": "loop"})] == [4, 3, 2, 1, 0]
+
+def test_pending_writes_survive_a_failed_step(checkpoint_path):
+    """Writes of a step that failed are kept, so a resumed run continues from the failed node."""
+    calls = []
+
+    def flaky(state):
+        calls.append(state["count"])
+        if len(calls) == 1:
+            raise RuntimeError("crashed")
+        return {"count": state["count"] + 100}
+
+    graph = StateGraph(_State)
+    graph.add_node("first", lambda state: {"count": state["count"] + 1})
+    graph.add_node("flaky", flaky)
+    graph.set_entry_point("first")
+    graph.add_edge("first", "flaky")
+    graph.add_edge("flaky", END)
+    config = {"configurable": {"thread_id": "t1"}}
+
+    with pytest.raises(RuntimeError):
+        graph.compile(checkpointer=SQLiteCheckpointer(checkpoint_path)).invoke({"count": 0, "log": []}, config)
+
+    app = graph.compile(checkpointer=SQLiteCheckpointer(checkpoint_path))
+    assert app.get_state(config).next == ("flaky",)
+    assert app.invoke(None, config)["count"] == 101
+    assert calls == [1, 1]
@@ -3,7 +3,7 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from unittest.mock import patch, MagicMock
-from research_graph import compile_report_node, ResearchState
+from research_graph import compile_report_node, ResearchState, _group_summaries, token_usage_totals
 
 # Mock the llm object directly
 @pytest.fixture
@@ -50,3 +50,133 @@ def test_compile_report_node_empty_summaries(mock_llm):
     assert "No summaries available to compile a report" in result["error_message"]
     # Ensure the LLM was not called
     mock_llm.invoke_llm.assert_not_called()
+
+def fake_llm_factory(prompts):
+    """Builds a call_llm stand-in that records prompts and answers merge and report requests."""
+    def fake_call_llm(messages):
+        prompt = messages[0].content
+        prompts.append(prompt)
+        response = MagicMock()
+        if "merge the following summaries" in prompt:
+            response.content = f"merged-{prompt.count('Summary ')}"
+        else:
+            response.content = "Final report."
+        return response
+    return fake_call_llm
+
+def test_small_summary_sets_use_a_single_call():
+    """Summaries that fit the budget go straight to the final report prompt."""
+    prompts = []
+    state = ResearchState(topic="Test Topic", summaries=["Summary 1", "Summary 2"], messages=[])
+    with patch('research_graph.call_llm', side_effect=fake_llm_factory(prompts)):
+        result = compile_report_node(state)
+
+    assert result["final_report"] == "Final report."
+    assert len(prompts) == 1
+
+def test_hierarchical_reduce_for_large_summary_sets():
+    """Summary sets over the token budget are merged in groups before the final synthesis."""
+    prompts = []
+    summaries = [f"Summary {i} " + "fact " * 40 for i in range(10)]
+    state = ResearchState(topic="Test Topic", summaries=summaries, messages=[])
+
+    with patch('research_graph.call_llm', side_effect=fake_llm_factory(prompts)), \
+         patch('research_graph.REPORT_TOKEN_BUDGET', 250), \
+         patch('research_graph.REPORT_GROUP_SIZE', 2):
+        result = compile_report_node(state)
+
+    merge_prompts = [p for p in prompts if "merge the following summaries" in p]
+    report_prompt = prompts[-1]
+    assert result["final_report"] == "Final report."
+    assert len(merge_prompts) == 5  # 10 summaries in groups of 2
+    assert "Summary 0" not in report_prompt
+    assert "merged-2" in report_prompt
+    assert any("Reduce level 1: merged 10 summaries into 5." in m["content"] for m in result["messages"])
+    assert not result["error_message"]
+
+def test_failed_merge_keeps_original_summaries():
+    """A failing merge keeps its group's summaries instead of dropping them."""
+    prompts = []
+
+    def failing_merges(messages):
+        prompts.append(messages[0].content)
+        if "merge the following summaries" in messages[0].content:
+            raise RuntimeError("rate limited")
+        response = MagicMock()
+        response.content = "Final report."
+        return response
+
+    summaries = [f"Summary {i} " + "fact " * 100 for i in range(4)]
+    state = ResearchState(topic="Test Topic", summaries=summaries, messages=[])
+    with patch('research_graph.call_llm', side_effect=failing_merges), \
+         patch('research_graph.REPORT_TOKEN_BUDGET', 300):
+        result = compile_report_node(state)
+
+    assert result["final_report"] == "Final report."
+    assert all(f"Summary {i}" in prompts[-1] for i in range(4))
+    assert any("Error merging summaries: rate limited" in m["content"] for m in result["messages"])
+
+def test_group_summaries_respects_size_and_budget():
+    """Groups are closed by either the group size or the token budget."""
+    assert _group_summaries(["a", "b", "c", "d", "e"], 2, 1000) == [["a", "b"], ["c", "d"], ["e"]]
+    assert _group_summaries(["x" * 40, "y" * 40, "z" * 40], 10, 15) == [["x" * 40], ["y" * 40], ["z" * 40]]
+
+def test_token_usage_is_recorded_for_merges_and_report():
+    """Every merge call and the final report call produce a token_usage record."""
+    prompts = []
+    summaries = [f"Summary {i} " + "fact " * 40 for i in range(4)]
+    state = ResearchState(topic="Test Topic", summaries=summaries, messages=[], token_usage=[])
+    with patch('research_graph.call_llm', side_effect=fake_llm_factory(prompts)), \
+         patch('research_graph.REPORT_TOKEN_BUDGET', 150), \
+         patch('research_graph.REPORT_GROUP_SIZE', 2):
+        result = compile_report_node(state)
+
+    assert len(result["token_usage"]) == len(prompts) == 3
+    assert all(r["node"] == "report_compiler" for r in result["token_usage"])
+    assert "Estimated token usage:" in result["messages"][-1]["content"]
+
+def test_run_budget_drops_lowest_ranked_summaries():
+    """With little budget left, trailing summaries are left out instead of overrunning it."""
+    prompts = []
+    summaries = [f"Summary {i} " + "fact " * 200 for i in range(5)]
+    spent = [{"node": "content_summarizer", "document": None, "input_tokens": 4000, "output_tokens": 500}]
+    state = ResearchState(topic="Test Topic", summaries=summaries, messages=[], token_usage=spent)
+    with patch('research_graph.call_llm', side_effect=fake_llm_factory(prompts)), \
+         patch('research_graph.RUN_TOKEN_BUDGET', 7000):
+        result = compile_report_node(state)
+
+    assert result["final_report"] == "Final report."
+    assert "Summary 0" in prompts[-1] and "Summary 4" not in prompts[-1]
+    assert any("Token budget: compiling the report from" in m["content"] for m in result["messages"])
+    total = token_usage_totals(spent + result["token_usage"])["total"]
+    assert total["input_tokens"] + total["output_tokens"] <= 7000
+
+def test_exhausted_run_budget_skips_the_report_call():
+    spent = [{"node": "content_summarizer", "document": None, "input_tokens": 9000, "output_tokens": 900}]
+    state = ResearchState(topic="Test Topic", summaries=["Summary 1"], messages=[], token_usage=spent)
+    with patch('research_graph.call_llm') as mock_call_llm, patch('research_graph.RUN_TOKEN_BUDGET', 10000):
+        result = compile_report_node(state)
+
+    mock_call_llm.assert_not_called()
+    assert result["error_message"] == "Token budget exhausted before compiling the report."
+
+def test_cached_answers_leave_the_run_budget_untouched():
+    """Summaries answered from the LLM response cache cost nothing, so the report is still compiled."""
+    spent = [{"node": "content_summarizer", "document": None, "input_tokens": 9000, "output_tokens": 900, "cached": True}]
+    state = ResearchState(topic="Test Topic", summaries=["Summary 1"], messages=[], token_usage=spent)
+    with patch('research_graph.call_llm', return_value="Final report.") as mock_call_llm, \
+         patch('research_graph.RUN_TOKEN_BUDGET', 10000):
+        result = compile_report_node(state)
+
+    mock_call_llm.assert_called_once()
+    assert result["final_report"] == "Final report."
+
+def test_token_usage_totals_groups_by_node():
+    records = [
+        {"node": "a", "document": "u1", "input_tokens": 10, "output_tokens": 2},
+        {"node": "a", "document": "u2", "input_tokens": 5, "output_tokens": 1},
+        {"node": "b", "document": None, "input_tokens": 1, "output_tokens": 1},
+    ]
+    totals = token_usage_totals(records)
+    assert totals["a"] == {"input_tokens": 15, "output_tokens": 3, "calls": 2}
+    assert totals["total"] == {"input_tokens": 16, "output_tokens": 4, "calls": 3}
@@ -0,0 +1,48 @@
+from unittest.mock import patch
+from research_graph import deduplicate_content_node
+
+ARTICLE = " ".join(
+    f"Paragraph {i} reports that solar capacity in region {i % 9} grew by {i * 3} percent last year."
+    for i in range(40)
+)
+
+def test_near_duplicates_are_dropped():
+    """A syndicated copy of an earlier page is removed before summarization."""
+    state = {
+        "scraped_data": [
+            {"url": "http://a.com/original", "content": ARTICLE},
+            {"url": "http://b.com/other", "content": "An unrelated page about chess openings and endgame technique."},
+            {"url": "http://c.com/syndicated", "content": "Reposted from a.com. " + ARTICLE}
+        ],
+        "messages": []
+    }
+
+    result = deduplicate_content_node(state)
+
+    assert [item["url"] for item in result["scraped_data"]] == ["http://a.com/original", "http://b.com/other"]
+    assert "Dropped 1 near-duplicate documents: http://c.com/syndicated" in result["messages"][-1]["content"]
+
+def test_distinct_documents_are_kept():
+    state = {
+        "scraped_data": [
+            {"url": "http://a.com", "content": ARTICLE},
+            {"url": "http://b.com", "content": "An unrelated page about chess openings and endgame technique."}
+        ],
+        "messages": []
+    }
+
+    result = deduplicate_content_node(state)
+
+    assert len(result["scraped_data"]) == 2
+    assert result["messages"] == []
+
+def test_threshold_zero_disables_deduplication():
+    state = {
+        "scraped_data": [{"url": "http://a.com", "content": ARTICLE}, {"url": "http://b.com", "content": ARTICLE}],
+        "messages": []
+    }
+
+    with patch("research_graph.NEAR_DUPLICATE_THRESHOLD", 0):
+        result = deduplicate_content_node(state)
+
+    assert len(result["scraped_data"]) == 2
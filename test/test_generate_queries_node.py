@@ -26,6 +26,10 @@ def test_happy_path(monkeypatch):
     assert len(result["search_queries"]) >= 3
     assert all(isinstance(q, str) and q for q in result["search_queries"])
     assert result["error_message"] == ""
+    # The call's estimated token usage is recorded for the run's accounting
+    [usage] = result["token_usage"]
+    assert usage["node"] == "query_generator"
+    assert usage["input_tokens"] > 0 and usage["output_tokens"] == (len(MockLLMResponse.content) + 3) // 4
 
 def test_empty_topic():
     state = {
@@ -0,0 +1,58 @@
+import glob
+import os
+import pytest
+from unittest.mock import patch
+import html_extractors
+from html_extractors import extract_text, extract_text_bs4, extract_text_lxml, get_extractor
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+        return f.read()
+
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+@pytest.mark.parametrize("max_chars", [80, 5000])
+def test_backends_produce_identical_text(path, max_chars):
+    """The lxml backend matches the BeautifulSoup reference output on every fixture."""
+    with open(path, "rb") as f:
+        html = f.read()
+    expected = extract_text_bs4(html, max_chars)
+    assert expected
+    assert extract_text_lxml(html, max_chars) == expected
+
+@pytest.mark.parametrize("extractor", [extract_text_bs4, extract_text_lxml])
+def test_article_preferred_and_noise_removed(extractor):
+    """Both backends prefer <article> and drop scripts, styles and comments."""
+    text = extractor(load_fixture("article_page.html"), 5000)
+    assert text.startswith("Error-corrected qubits reach a new milestone")
+    assert "105 physical qubits & ran for\nover\na million cycles." in text
+    for noise in ("Site header", "Copyright", "renderAd", "advertisement slot", "font-family"):
+        assert noise not in text
+
+@pytest.mark.parametrize("extractor", [extract_text_bs4, extract_text_lxml])
+def test_declared_and_undeclared_encodings(extractor):
+    """Declared legacy charsets and undeclared UTF-8 are both decoded correctly."""
+    assert "Café culture in München" in extractor(load_fixture("latin1_page.html"), 5000)
+    assert "Données et modèles" in extractor(load_fixture("no_charset_utf8.html"), 5000)
+
+def test_default_backend_is_lxml():
+    """lxml is the default backend when it is installed."""
+    assert get_extractor() is extract_text_lxml
+    assert get_extractor("bs4") is extract_text_bs4
+
+def test_unknown_backend():
+    """Selecting an unknown backend raises a clear error."""
+    with pytest.raises(ValueError, match="Unknown HTML extractor"):
+        get_extractor("selectolax")
+
+def test_falls_back_to_bs4_when_fast_backend_fails():
+    """A document the fast backend cannot handle is extracted with BeautifulSoup instead."""
+    with patch.dict(html_extractors.EXTRACTORS, {"lxml": lambda html, max_chars: 1 / 0}):
+        text = extract_text(load_fixture("main_page.html"), 5000, "lxml")
+    assert text.startswith("Key findings")
+
+def test_empty_document():
+    """An empty body yields empty text rather than an error."""
+    assert extract_text(b"", 5000) == ""
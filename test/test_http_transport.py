@@ -0,0 +1,201 @@
+import asyncio
+import gzip
+import threading
+import time
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import http_transport
+from http_transport import DNSCache
+
+class _Server:
+    """
+    Local HTTP/1.1 server that answers from a list of (status, headers, body) and records each request,
+    waiting `delay` seconds before each answer.
+    """
+
+    def __init__(self, responses, delay=0):
+        self.responses = list(responses)
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests.append({"port": self.client_address[1], "headers": dict(self.headers)})
+                status, headers, body = server.responses.pop(0) if len(server.responses) > 1 else server.responses[0]
+                time.sleep(delay)
+                try:
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except ConnectionError:
+                    pass  # The client timed out and hung up
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://localhost:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*responses, delay=0):
+        servers.append(_Server(responses, delay))
+        return servers[-1]
+
+    yield start
+    http_transport.close_session()
+    for server in servers:
+        server.close()
+
+def test_connections_are_kept_alive(serve):
+    """Sequential requests to one host reuse a single pooled connection."""
+    server = serve((200, {}, b"ok"))
+    for _ in range(5):
+        assert http_transport.get(server.url, timeout=5).text == "ok"
+
+    assert len(server.requests) == 5
+    assert len({request["port"] for request in server.requests}) == 1
+
+def test_session_is_shared():
+    """Every caller gets the same session until it is closed."""
+    session = http_transport.get_session()
+    assert http_transport.get_session() is session
+    http_transport.close_session()
+    assert http_transport.get_session() is not session
+    http_transport.close_session()
+
+def test_retries_transient_errors(serve):
+    """503 and 429 responses are retried, honouring Retry-After up to HTTP_RETRY_AFTER_MAX."""
+    server = serve((503, {}, b"busy"), (429, {"Retry-After": "3600"}, b"slow down"), (200, {}, b"ok"))
+    with patch.object(http_transport, "HTTP_RETRY_BACKOFF", 0), patch.object(http_transport, "HTTP_RETRY_AFTER_MAX", 0.01):
+        response = http_transport.get(server.url, timeout=5)
+
+    assert response.status_code == 200
+    assert len(server.requests) == 3
+
+def test_gives_up_after_retries(serve):
+    """Once the retries are used up the last error response is returned, not raised."""
+    server = serve((503, {}, b"busy"))
+    with patch.object(http_transport, "HTTP_RETRY_BACKOFF", 0), patch.object(http_transport, "HTTP_RETRIES", 1):
+        response = http_transport.get(server.url, timeout=5)
+
+    assert response.status_code == 503
+    assert len(server.requests) == 2
+
+def test_read_timeouts_are_not_retried(serve):
+    """A host that accepts the connection but answers too slowly costs one timeout, not one per retry."""
+    server = serve((200, {}, b"late"), delay=1)
+    with patch.object(http_transport, "HTTP_RETRY_BACKOFF", 0):
+        with pytest.raises(requests.RequestException, match="Read timed out"):
+            http_transport.get(server.url, timeout=0.2)
+
+        async def fetch():
+            try:
+                await http_transport.aget(server.url, timeout=0.2)
+            finally:
+                await http_transport.aclose_session()
+
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(fetch())
+
+    assert len(server.requests) == 2
+
+def test_compressed_responses_are_decoded(serve):
+    """Compression is advertised and compressed bodies are transparently decoded."""
+    server = serve((200, {"Content-Encoding": "gzip"}, gzip.compress(b"<p>compressed page</p>")))
+    response = http_transport.get(server.url, timeout=5)
+
+    assert b"compressed page" in b"".join(response.iter_content(1024))
+    assert "gzip" in server.requests[0]["headers"]["Accept-Encoding"]
+
+def test_cookies_are_not_shared_between_requests(serve):
+    """Cookies set by one site are never sent back, so runs sharing the session stay independent."""
+    server = serve((200, {"Set-Cookie": "session=abc"}, b"ok"))
+    http_transport.get(server.url, timeout=5)
+    http_transport.get(server.url, timeout=5)
+
+    assert "Cookie" not in server.requests[1]["headers"]
+
+def test_new_connections_use_the_dns_cache(serve):
+    """Host names are resolved once and reused for new connections."""
+    server = serve((200, {"Connection": "close"}, b"ok"))
+    with patch("socket.getaddrinfo", wraps=__import__("socket").getaddrinfo) as getaddrinfo:
+        for _ in range(3):
+            http_transport.get(server.url, timeout=5)
+
+    assert len({request["port"] for request in server.requests}) == 3
+    assert [call.args[0] for call in getaddrinfo.call_args_list].count("localhost") == 1
+
+def test_dns_cache_expires_and_forgets():
+    """Entries expire after the TTL and are dropped when a connection to them fails."""
+    cache = DNSCache(ttl=60)
+    with patch("socket.getaddrinfo", return_value=[(2, 1, 6, "", ("10.0.0.1", 80))]) as getaddrinfo:
+        assert cache.resolve("example.com", 80) == ["10.0.0.1"]
+        assert cache.resolve("example.com", 80) == ["10.0.0.1"]
+        assert getaddrinfo.call_count == 1
+
+        cache.forget("example.com")
+        cache.resolve("example.com", 80)
+        assert getaddrinfo.call_count == 2
+
+        cache.ttl = 0
+        cache.forget("example.com")
+        cache.resolve("example.com", 80)
+        cache.resolve("example.com", 80)
+        assert getaddrinfo.call_count == 4
+
+def test_falls_back_to_the_next_cached_address(serve):
+    """An unreachable address (e.g. IPv6 without a route) is skipped in favour of the host's next one."""
+    import urllib3.util.connection
+    real_create_connection = urllib3.util.connection.create_connection
+    attempts = []
+
+    def create_connection(address, *args, **kwargs):
+        attempts.append(address[0])
+        if address[0] == "127.0.0.2":
+            raise ConnectionRefusedError("refused")
+        return real_create_connection(address, *args, **kwargs)
+
+    server = serve((200, {}, b"ok"))
+    with patch.object(http_transport.dns_cache, "resolve", return_value=["127.0.0.2", "127.0.0.1"]), \
+         patch("urllib3.util.connection.create_connection", side_effect=create_connection):
+        assert http_transport.get(server.url, timeout=5).text == "ok"
+
+    assert attempts == ["127.0.0.2", "127.0.0.1"]
+
+def test_async_requests_are_pooled_and_retried(serve):
+    """The async session keeps connections alive and retries like the sync one."""
+    server = serve((503, {}, b"busy"), (200, {}, b"ok"))
+
+    async def fetch():
+        bodies = []
+        try:
+            for _ in range(3):
+                response = await http_transport.aget(server.url, timeout=5)
+                bodies.append((response.status, await response.read()))
+                response.release()
+        finally:
+            await http_transport.aclose_session()
+        return bodies
+
+    with patch.object(http_transport, "HTTP_RETRY_BACKOFF", 0):
+        assert asyncio.run(fetch()) == [(200, b"ok")] * 3
+
+    assert len(server.requests) == 4
+    assert len({request["port"] for request in server.requests}) == 1
+    assert "Cookie" not in server.requests[-1]["headers"]
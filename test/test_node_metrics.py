@@ -0,0 +1,75 @@
+import asyncio
+import time
+import pytest
+import research_graph
+from node_metrics import COUNTERS, instrument_node, record, summarize_metrics
+
+def test_record_outside_a_node_is_a_no_op():
+    record("llm_calls")  # Must not raise when no node is running
+
+def test_instrument_node_times_and_counts():
+    """Counters recorded while the node runs are attributed to it and appended to its update."""
+    def node(state):
+        record("http_requests")
+        record("bytes_fetched", 2048)
+        time.sleep(0.02)
+        return {"value": state["x"] + 1}
+
+    update = instrument_node("fetcher", node)({"x": 1})
+
+    assert update["value"] == 2
+    [metrics] = update["node_metrics"]
+    assert metrics["node"] == "fetcher"
+    assert metrics["wall_time_s"] >= 0.02
+    assert metrics["http_requests"] == 1 and metrics["bytes_fetched"] == 2048
+    assert metrics["errors"] == 0
+
+def test_instrument_node_counts_error_results_and_reraises_exceptions():
+    update = instrument_node("n", lambda state: {"error_message": "boom"})({})
+    assert update["node_metrics"][0]["errors"] == 1
+
+    def failing(state):
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        instrument_node("n", failing)({})
+
+def test_instrument_async_node():
+    """Coroutine nodes stay coroutines, and counters from the tasks they start are attributed to them."""
+    async def node(state):
+        async def fetch(item):
+            await asyncio.sleep(0.01)
+            record("http_requests")
+
+        await asyncio.gather(*(fetch(item) for item in range(3)))
+        return {"value": state["x"] + 1}
+
+    wrapped = instrument_node("fetcher", node)
+    assert asyncio.iscoroutinefunction(wrapped)
+    update = asyncio.run(wrapped({"x": 1}))
+
+    assert update["value"] == 2
+    [metrics] = update["node_metrics"]
+    assert metrics["http_requests"] == 3
+    assert metrics["wall_time_s"] >= 0.01
+
+def test_counters_from_shared_worker_pools_reach_the_node():
+    """Work fanned out to the shared thread pools still counts toward the calling node."""
+    def node(state):
+        research_graph._map_concurrently(lambda item: record("llm_calls"), list(range(5)), 3, "llm")
+        return {}
+
+    update = instrument_node("summarizer", node)({})
+    assert update["node_metrics"][0]["llm_calls"] == 5
+
+def test_summarize_metrics_sums_runs_per_node():
+    records = [
+        {"node": "a", "wall_time_s": 0.5, **dict.fromkeys(COUNTERS, 1)},
+        {"node": "a", "wall_time_s": 0.25, **dict.fromkeys(COUNTERS, 2)},
+        {"node": "b", "wall_time_s": 1.0, **dict.fromkeys(COUNTERS, 0)},
+    ]
+    totals = summarize_metrics(records)
+    assert totals["a"]["runs"] == 2
+    assert totals["a"]["wall_time_s"] == 0.75
+    assert totals["a"]["cache_hits"] == 3
+    assert totals["b"]["runs"] == 1
@@ -2,21 +2,132 @@ import pytest
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from unittest.mock import patch, MagicMock
-from workflow_builder import build_workflow
+from unittest.mock import patch
+import research_graph
+import workflow_builder
+from checkpoint_store import SQLiteCheckpointer, ThreadBusyError
+from workflow_builder import build_workflow, get_checkpointer, research_thread_id, stepwise_agent
+from conftest import PageResponse, claim_in_subprocess, fake_llm_response
 
-@patch('workflow_builder.MemorySaver')
-def test_build_workflow_with_persistence(mock_memory_saver):
+def test_build_workflow_with_persistence():
     """
-    Tests that the workflow is built with persistence.
+    Tests that the workflow is built with the shared on-disk checkpointer by default.
     """
-    # Mock the checkpointer
-    mock_checkpointer = MagicMock()
-    mock_memory_saver.return_value = mock_checkpointer
-
-    # Build the workflow
     app = build_workflow()
 
-    # Assert that the checkpointer was created and the app was compiled with it
-    mock_memory_saver.assert_called_once_with()
-    assert app.checkpointer == mock_checkpointer
+    assert isinstance(app.checkpointer, SQLiteCheckpointer)
+    assert app.checkpointer is get_checkpointer()
+    assert app.checkpointer.path == os.path.join(research_graph.CACHE_DIR, "checkpoints.sqlite3")
+
+def test_build_workflow_with_custom_checkpointer():
+    """
+    Tests that an explicit checkpointer replaces the default one.
+    """
+    from langgraph.checkpoint.memory import MemorySaver
+
+    checkpointer = MemorySaver()
+    app = build_workflow(checkpointer=checkpointer)
+    assert app.checkpointer is checkpointer
+
+def test_research_thread_id_is_stable_per_topic_and_mode():
+    assert research_thread_id("Topic") == research_thread_id("Topic")
+    assert research_thread_id("Topic") != research_thread_id("Other topic")
+    assert research_thread_id("Topic") != research_thread_id("Topic", pipelined=True)
+
+@pytest.mark.parametrize("pipelined", [False, True])
+@patch('http_transport.get', side_effect=lambda url, **kwargs: PageResponse(url))
+@patch('research_graph.TavilySearchResults')
+@patch('research_graph.call_llm', side_effect=fake_llm_response)
+def test_resume_skips_completed_nodes(mock_call_llm, mock_tavily, mock_get, pipelined, monkeypatch):
+    """
+    Tests that a run interrupted at the report step resumes there, without searching, scraping or summarizing again.
+    """
+    mock_tavily.return_value.invoke.side_effect = lambda query: [
+        {"url": f"http://example.com/{query.split()[0]}/{i}"} for i in range(2)
+    ]
+    # Caches would hide repeated work
+    monkeypatch.setattr(research_graph, "PAGE_CACHE_TTL", 0)
+    monkeypatch.setattr(research_graph, "SEARCH_CACHE_TTL", 0)
+
+    with patch('workflow_builder.compile_report_node', side_effect=RuntimeError("crashed")):
+        with pytest.raises(RuntimeError):
+            list(stepwise_agent("Test Topic", pipelined=pipelined))
+    calls_before = (mock_call_llm.call_count, mock_tavily.return_value.invoke.call_count, mock_get.call_count)
+    assert calls_before == (5, 2, 4)
+
+    steps = list(stepwise_agent("Test Topic", pipelined=pipelined, resume=True))
+
+    assert [step[0] for step in steps] == ["report_compiler", "done"]
+    final_state = steps[-1][2]
+    assert final_state["final_report"] == "Final report on Test Topic."
+    assert len(final_state["summaries"]) == 4
+    # Only the report was generated; nothing else ran again
+    assert mock_call_llm.call_count == calls_before[0] + 1
+    assert mock_tavily.return_value.invoke.call_count == calls_before[1]
+    assert mock_get.call_count == calls_before[2]
+    # The finished run's checkpoints are removed
+    thread_id = research_thread_id("Test Topic", pipelined)
+    assert get_checkpointer().get_tuple({"configurable": {"thread_id": thread_id}}) is None
+
+@patch('http_transport.get', side_effect=lambda url, **kwargs: PageResponse(url))
+@patch('research_graph.TavilySearchResults')
+@patch('research_graph.call_llm', side_effect=fake_llm_response)
+def test_fresh_run_discards_interrupted_run(mock_call_llm, mock_tavily, mock_get):
+    """
+    Tests that starting a topic again without resume does not reuse the interrupted run's state.
+    """
+    mock_tavily.return_value.invoke.side_effect = lambda query: [{"url": f"http://example.com/{query.split()[0]}"}]
+
+    with patch('workflow_builder.compile_report_node', side_effect=RuntimeError("crashed")):
+        with pytest.raises(RuntimeError):
+            list(stepwise_agent("Test Topic"))
+    steps = list(stepwise_agent("Test Topic"))
+
+    assert steps[0][0] == "query_generator"
+    contents = [getattr(m, "content", None) or m["content"] for m in steps[-1][2]["messages"]]
+    assert contents.count("Start research on: Test Topic") == 1
+
+@patch('http_transport.get', side_effect=lambda url, **kwargs: PageResponse(url))
+@patch('research_graph.TavilySearchResults')
+@patch('research_graph.call_llm', side_effect=fake_llm_response)
+def test_topic_run_by_another_process_is_left_alone(mock_call_llm, mock_tavily, mock_get):
+    """
+    Tests that while another process holds a topic's thread, starting or resuming the topic fails without touching its checkpoints.
+    """
+    mock_tavily.return_value.invoke.side_effect = lambda query: [{"url": f"http://example.com/{query.split()[0]}"}]
+    with patch('workflow_builder.compile_report_node', side_effect=RuntimeError("crashed")):
+        with pytest.raises(RuntimeError):
+            list(stepwise_agent("Test Topic"))
+    config = {"configurable": {"thread_id": research_thread_id("Test Topic")}}
+    checkpoint_id = get_checkpointer().get_tuple(config).config["configurable"]["checkpoint_id"]
+
+    holder = claim_in_subprocess(get_checkpointer().path, research_thread_id("Test Topic"))
+    try:
+        with pytest.raises(ThreadBusyError):
+            list(stepwise_agent("Test Topic"))
+        with pytest.raises(ThreadBusyError):
+            list(stepwise_agent("Test Topic", resume=True))
+        assert get_checkpointer().get_tuple(config).config["configurable"]["checkpoint_id"] == checkpoint_id
+    finally:
+        holder.stdin.close()
+        holder.wait()
+
+    # Once the other process is gone, the interrupted run resumes where it stopped
+    steps = list(stepwise_agent("Test Topic", resume=True))
+    assert [step[0] for step in steps] == ["report_compiler", "done"]
+
+def test_resume_without_checkpoint():
+    """
+    Tests that resuming an unknown thread id fails, while resuming a topic with no checkpoint starts fresh.
+    """
+    with pytest.raises(ValueError, match="No checkpoint found"):
+        list(stepwise_agent("", resume=True, thread_id="missing"))
+
+    with patch('workflow_builder.generate_queries_node', return_value={"error_message": "stop"}) as mock_generate:
+        with patch('workflow_builder.web_search_node', return_value={}), \
+             patch('workflow_builder.scrape_content_node', return_value={}), \
+             patch('workflow_builder.summarize_content_node', return_value={}), \
+             patch('workflow_builder.compile_report_node', return_value={"final_report": ""}):
+            steps = list(stepwise_agent("New Topic", resume=True))
+    mock_generate.assert_called_once()
+    assert steps[-1][0] == "done"
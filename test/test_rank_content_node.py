@@ -0,0 +1,42 @@
+from unittest.mock import patch
+from research_graph import rank_content_node
+
+STATE = {
+    "topic": "solar power adoption",
+    "search_queries": ["solar panel installation rates", "residential solar incentives"],
+    "scraped_data": [
+        {"url": "http://a.com/bread", "content": "How to bake sourdough bread with a crisp crust."},
+        {"url": "http://b.com/solar", "content": "Residential solar installation rates doubled as incentives for solar panels grew."},
+        {"url": "http://c.com/power", "content": "Power grids are adapting to more adoption of renewables."},
+    ],
+    "messages": []
+}
+
+def test_top_k_keeps_most_relevant_documents_first():
+    """Only the RANK_TOP_K best matches are passed on, most relevant first, and the decision is logged."""
+    with patch("research_graph.RANK_TOP_K", 2), patch("research_graph.RANK_MIN_SCORE", 0):
+        result = rank_content_node(STATE)
+
+    assert [item["url"] for item in result["scraped_data"]] == ["http://b.com/solar", "http://c.com/power"]
+    log = result["messages"][-1]["content"]
+    assert "summarizing 2" in log
+    assert "Skipped 1: http://a.com/bread (0.00)" in log
+
+def test_min_score_drops_weak_matches():
+    """Pages scoring below RANK_MIN_SCORE times the best score are skipped even within top-k."""
+    with patch("research_graph.RANK_TOP_K", 0), patch("research_graph.RANK_MIN_SCORE", 0.01):
+        result = rank_content_node(STATE)
+
+    assert "http://a.com/bread" not in [item["url"] for item in result["scraped_data"]]
+    assert len(result["scraped_data"]) == 2
+
+def test_ranking_disabled_keeps_everything_in_order():
+    with patch("research_graph.RANK_TOP_K", 0), patch("research_graph.RANK_MIN_SCORE", 0):
+        result = rank_content_node(STATE)
+
+    assert result["scraped_data"] == STATE["scraped_data"]
+    assert result["messages"] == []
+
+def test_no_documents():
+    result = rank_content_node({"topic": "x", "scraped_data": [], "messages": []})
+    assert result["scraped_data"] == []
@@ -0,0 +1,219 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from langchain_core.messages import HumanMessage
+import rate_governor
+import research_graph
+from rate_governor import RateGovernor, TokenBucket, is_retryable, retry_delay_hint
+
+class _Clock:
+    """Fake monotonic clock whose sleep() advances time instantly and records each wait."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class _HTTPError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(message or f"{code} error")
+        self.code = code
+
+def test_token_bucket_paces_to_the_quota():
+    """A full minute of quota is available at once; after that calls are spaced at the refill rate."""
+    clock = _Clock()
+    bucket = TokenBucket(60, clock=clock, sleep=clock.sleep)
+    for _ in range(60):
+        bucket.acquire()
+    assert clock.now == 0
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == pytest.approx(3.0)
+
+def test_token_bucket_debt_delays_later_callers():
+    """Usage charged after a call leaves the bucket in debt, which the next caller waits off."""
+    clock = _Clock()
+    bucket = TokenBucket(600, clock=clock, sleep=clock.sleep)
+    bucket.acquire(500)
+    bucket.consume(200)
+
+    bucket.acquire(100)
+    assert clock.now == pytest.approx(20.0)
+
+@pytest.mark.parametrize("error, retryable", [
+    (_HTTPError(429), True),
+    (_HTTPError(503), True),
+    (_HTTPError(400), False),
+    (ConnectionResetError("reset"), True),
+    (RuntimeError("429 Resource has been exhausted (e.g. check quota)."), True),
+    (RuntimeError("Invalid argument"), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+def test_is_retryable_looks_through_wrapped_errors():
+    """Client libraries wrap the HTTP error; its status still decides."""
+    try:
+        try:
+            raise _HTTPError(429)
+        except _HTTPError as e:
+            raise ValueError("Error calling model") from e
+    except ValueError as wrapped:
+        assert is_retryable(wrapped)
+
+def test_retry_delay_hint():
+    assert retry_delay_hint(RuntimeError("429 quota exceeded. retry_delay {\n  seconds: 17\n}")) == 17
+    assert retry_delay_hint(RuntimeError("'retryDelay': '4s'")) == 4
+    assert retry_delay_hint(RuntimeError("429")) is None
+
+def test_retries_throttled_calls_with_jittered_backoff():
+    """Throttled attempts are retried after growing, randomized waits until one succeeds."""
+    clock = _Clock()
+    retries = []
+    governor = RateGovernor(max_retries=5, backoff=1, max_backoff=60, sleep=clock.sleep,
+                            on_retry=lambda error, attempt, delay: retries.append(attempt))
+    outcomes = [_HTTPError(429), _HTTPError(503), _HTTPError(429), "ok"]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with patch("rate_governor.random.uniform", side_effect=lambda low, high: high):
+        assert governor.call(flaky) == "ok"
+
+    assert retries == [1, 2, 3]
+    assert clock.sleeps == [1, 2, 4]
+    assert governor.stats()["retries"] == 3
+
+def test_honours_the_providers_retry_delay():
+    clock = _Clock()
+    governor = RateGovernor(backoff=1, max_backoff=30, sleep=clock.sleep)
+    outcomes = [RuntimeError("429 retry_delay { seconds: 12 }"), "ok"]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with patch("rate_governor.random.uniform", return_value=0):
+        governor.call(flaky)
+    assert clock.sleeps == [12]
+
+def test_non_retryable_errors_are_raised_immediately():
+    clock = _Clock()
+    governor = RateGovernor(sleep=clock.sleep)
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise _HTTPError(400, "invalid prompt")
+
+    with pytest.raises(_HTTPError):
+        governor.call(bad_request)
+    assert len(calls) == 1
+    assert clock.sleeps == []
+    assert governor.limit == governor.max_concurrency
+
+def test_gives_up_after_max_retries():
+    clock = _Clock()
+    governor = RateGovernor(max_retries=2, sleep=clock.sleep)
+    calls = []
+
+    def throttled():
+        calls.append(1)
+        raise _HTTPError(429)
+
+    with pytest.raises(_HTTPError):
+        governor.call(throttled)
+    assert len(calls) == 3
+    assert governor.stats()["failures"] == 1
+
+def test_concurrency_limit_is_aimd():
+    """The limit halves once per congestion event and grows back by about 1/limit per success."""
+    governor = RateGovernor(max_concurrency=8, min_concurrency=1, max_retries=0)
+
+    # Two calls started in the same window are throttled together: one decrease, not two
+    first, second = governor._enter(), governor._enter()
+    governor._leave(first, throttled=True)
+    governor._leave(second, throttled=True)
+    assert governor.limit == 4
+
+    for _ in range(3):
+        governor._leave(governor._enter(), throttled=True)
+    assert governor.limit == 1
+
+    for _ in range(10):
+        governor.call(lambda: "ok")
+    assert governor.limit == 4
+
+def test_calls_in_flight_never_exceed_the_limit():
+    governor = RateGovernor(max_concurrency=3)
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def work():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.pop()
+
+    threads = [threading.Thread(target=governor.call, args=(work,)) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 3
+    assert governor.stats()["calls"] == 12
+
+@patch('research_graph.llm')
+def test_call_llm_retries_rate_limited_calls(mock_llm, monkeypatch):
+    """call_llm retries a rate-limited model call instead of failing the document."""
+    monkeypatch.setattr(rate_governor, "LLM_RETRY_BACKOFF", 0)
+    mock_llm.model = "test-model"
+    mock_llm.temperature = 0
+    mock_llm.invoke.side_effect = [_HTTPError(429, "429 Resource has been exhausted"), "summary"]
+
+    assert research_graph.call_llm([HumanMessage(content="Summarize this page.")]) == "summary"
+    assert mock_llm.invoke.call_count == 2
+    assert rate_governor.get_governor().stats()["retries"] == 1
+
+def test_async_calls_share_the_limit_and_retry():
+    """Coroutines are held to the concurrency limit and retried without blocking the loop."""
+    governor = RateGovernor(max_concurrency=2, backoff=0)
+    active = []
+    peak = []
+    failures = {"task 0": 1}
+
+    async def work(name):
+        active.append(name)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.remove(name)
+        if failures.get(name):
+            failures[name] -= 1
+            raise _HTTPError(503)
+        return name
+
+    async def run_all():
+        return await asyncio.gather(*(governor.acall(lambda i=i: work(f"task {i}")) for i in range(6)))
+
+    assert asyncio.run(run_all()) == [f"task {i}" for i in range(6)]
+    assert max(peak) <= 2
+    assert governor.stats()["retries"] == 1
+    assert governor.stats()["in_flight"] == 0
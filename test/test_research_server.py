@@ -0,0 +1,196 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import pytest
+from unittest.mock import patch
+from research_server import QueueFull, ResearchService, create_server
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost", timeout=10)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+def _request(connect, method, path, body=None):
+    """Sends one request on a new connection and returns (status, decoded JSON or NDJSON lines)."""
+    conn = connect()
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = response.read().decode("utf-8")
+        if response.getheader("Content-Type") == "application/x-ndjson":
+            return response.status, [json.loads(line) for line in data.splitlines()]
+        return response.status, json.loads(data)
+    finally:
+        conn.close()
+
+def _wait(job, timeout=10):
+    """Blocks until job finishes and returns its event names."""
+    seen = 0
+    while True:
+        events, finished = job.wait_events(seen, timeout)
+        seen += len(events)
+        if finished and not events:
+            return [event["event"] for event in job.events]
+
+def _wait_running(job, timeout=10):
+    """Blocks until a worker has started job."""
+    seen = 0
+    while "started" not in [event["event"] for event in job.events]:
+        events, _ = job.wait_events(seen, timeout)
+        seen += len(events)
+    return job
+
+def _fake_agent(started=None, gate=None, error=None):
+    """Stands in for astepwise_agent: records the topics it starts and can wait on gate or fail."""
+    async def agent(topic, pipelined=False, resume=False, thread_id=None):
+        if started is not None:
+            started.append(topic)
+        if gate is not None:
+            await asyncio.to_thread(gate.wait, 10)
+        metrics = {"node": "query_generator", "started_at": 0.0, "wall_time_s": 0.1}
+        yield "query_generator", "Generating search queries...", {"node_metrics": [metrics]}
+        if error:
+            raise error
+        yield "done", "Report generated.", {"topic": topic, "final_report": f"Report on {topic}.",
+                                            "node_metrics": [metrics]}
+    return agent
+
+@pytest.fixture
+def service():
+    services = []
+
+    def start(**kwargs):
+        services.append(ResearchService(**kwargs))
+        services[-1].start(warm_up=False)
+        return services[-1]
+
+    yield start
+    for running in services:
+        running.stop(timeout=10)
+
+@pytest.fixture
+def server(service):
+    servers = []
+
+    def start(unix_socket=None, **kwargs):
+        http_server = create_server(service(**kwargs), port=0, unix_socket=unix_socket)
+        threading.Thread(target=http_server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(http_server)
+        if unix_socket:
+            return lambda: _UnixHTTPConnection(unix_socket)
+        return lambda: http.client.HTTPConnection(*http_server.server_address[:2], timeout=10)
+
+    yield start
+    for http_server in servers:
+        http_server.shutdown()
+        http_server.server_close()
+
+def test_job_progress_is_streamed_over_http(server):
+    """A submitted job's per-node progress streams as NDJSON, and the finished job carries its report."""
+    connect = server()
+    with patch('research_server.astepwise_agent', _fake_agent()):
+        status, job = _request(connect, "POST", "/jobs", {"topic": "Test Topic"})
+        assert status == 202
+        status, events = _request(connect, "GET", f"/jobs/{job['id']}/events")
+
+    assert status == 200
+    assert [event["event"] for event in events] == ["queued", "started", "node", "done"]
+    assert events[2]["node"] == "query_generator"
+    assert events[2]["metrics"]["wall_time_s"] == 0.1
+    status, finished = _request(connect, "GET", f"/jobs/{job['id']}")
+    assert finished["status"] == "done"
+    assert finished["report"] == "Report on Test Topic."
+    assert finished["metrics"]["topic"] == "Test Topic"
+
+def test_higher_priority_jobs_run_first(service):
+    """Waiting jobs start by priority, then in submission order."""
+    started, gate = [], threading.Event()
+    with patch('research_server.astepwise_agent', _fake_agent(started, gate)):
+        research = service(workers=1)
+        jobs = [_wait_running(research.submit("blocking"))]
+        jobs += [research.submit(topic, priority=priority)
+                 for topic, priority in [("low", -1), ("normal", 0), ("urgent", 5), ("normal too", 0)]]
+        gate.set()
+        for job in jobs:
+            assert _wait(job)[-1] == "done"
+
+    assert started == ["blocking", "urgent", "normal", "normal too", "low"]
+
+def test_full_queue_rejects_new_jobs(server, service):
+    """Past queue_size waiting jobs, submissions are refused with 503; repeats of an unfinished job are not queued twice."""
+    gate = threading.Event()
+    connect = server(workers=1, queue_size=1)
+    with patch('research_server.astepwise_agent', _fake_agent(gate=gate)):
+        _, running = _request(connect, "POST", "/jobs", {"topic": "first"})
+        while _request(connect, "GET", f"/jobs/{running['id']}")[1]["status"] != "running":
+            pass
+        _, queued = _request(connect, "POST", "/jobs", {"topic": "second"})
+        status, error = _request(connect, "POST", "/jobs", {"topic": "third"})
+        _, repeat = _request(connect, "POST", "/jobs", {"topic": "second"})
+        _, health = _request(connect, "GET", "/health")
+        gate.set()
+
+    assert status == 503
+    assert "queue is full" in error["error"]
+    assert repeat["id"] == queued["id"]
+    assert health["queued"] == 1
+    assert health["running"] == 1
+    assert _request(connect, "POST", "/jobs", {"topic": " "})[0] == 400
+
+def test_cancelled_jobs_free_their_slot(service):
+    """Cancelling drops a queued job and interrupts a running one, which can then be submitted again."""
+    gate = threading.Event()
+    with patch('research_server.astepwise_agent', _fake_agent(gate=gate)):
+        research = service(workers=1, queue_size=1)
+        running = _wait_running(research.submit("first"))
+        queued = research.submit("second")
+        with pytest.raises(QueueFull):
+            research.submit("third")
+
+        research.cancel(queued.id)
+        third = research.submit("third")
+        research.cancel(running.id)
+
+        assert _wait(queued) == ["queued", "cancelled"]
+        assert _wait(running)[-1] == "cancelled"
+        assert running.events[-1]["resumable"]
+        _wait_running(third)
+        assert research.submit("first") is not running
+        gate.set()
+
+def test_failed_job_reports_its_error(service):
+    with patch('research_server.astepwise_agent', _fake_agent(error=RuntimeError("search unavailable"))):
+        job = service().submit("Test Topic")
+        assert _wait(job) == ["queued", "started", "node", "failed"]
+
+    assert job.status == "failed"
+    assert job.error == "RuntimeError: search unavailable"
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not available")
+def test_serves_on_a_unix_socket(server, tmp_path):
+    connect = server(unix_socket=str(tmp_path / "research.sock"))
+    with patch('research_server.astepwise_agent', _fake_agent()):
+        status, job = _request(connect, "POST", "/jobs", {"topic": "Test Topic"})
+        _, events = _request(connect, "GET", f"/jobs/{job['id']}/events")
+
+    assert status == 202
+    assert events[-1]["report"] == "Report on Test Topic."
+    assert [listed["id"] for listed in _request(connect, "GET", "/jobs")[1]["jobs"]] == [job["id"]]
+
+def test_jobs_run_the_workflow(fakes, service):
+    """Jobs run the real async workflow concurrently on the service's event loop."""
+    research = service(workers=2)
+    jobs = [research.submit(f"Topic {i}", pipelined=True) for i in range(4)]
+    for job in jobs:
+        assert _wait(job)[-1] == "done"
+
+    assert [job.report for job in jobs] == [f"Final report on Topic {i}." for i in range(4)]
+    assert {event["node"] for event in jobs[0].events if event["event"] == "node"} >= {"query_generator", "report_compiler"}
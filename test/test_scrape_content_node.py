@@ -1,14 +1,33 @@
 
+import asyncio
+import os
+import signal
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 import requests
+import research_graph
 from research_graph import scrape_content_node, ResearchState
 
-# Mock response object for requests.get
+# Mock response object for http_transport.get
 class MockResponse:
-    def __init__(self, content, status_code=200):
+    def __init__(self, content, status_code=200, headers=None):
         self.content = content
         self.status_code = status_code
+        self.headers = headers or {}
+
+        self.bytes_read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            chunk = self.content[start:start + chunk_size]
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
 
     def raise_for_status(self):
         if self.status_code >= 400:
@@ -16,8 +35,8 @@ class MockResponse:
 
 @pytest.fixture
 def requests_get_mock():
-    """Fixture to mock requests.get."""
-    with patch('research_graph.requests.get') as mock_get:
+    """Fixture to mock the shared HTTP transport's get."""
+    with patch('http_transport.get') as mock_get:
         yield mock_get
 
 def test_happy_path(requests_get_mock):
@@ -115,5 +134,264 @@ def test_content_extraction_from_article(requests_get_mock):
     assert "Main article text" in scraped_content
     assert "Ignore" not in scraped_content
 
+def test_concurrent_scraping_preserves_order(requests_get_mock):
+    """Pages are fetched concurrently but results and messages keep the input URL order."""
+    delays = {"http://example.com/slow": 0.3, "http://example.com/fast": 0.0, "http://example.com/medium": 0.15}
+
+    def fake_get(url, **kwargs):
+        time.sleep(delays[url])
+        return MockResponse(content=f"<html><body><p>Page {url}</p></body></html>".encode("utf-8"))
+
+    requests_get_mock.side_effect = fake_get
+    state = {
+        "retrieved_docs": [{"url": url} for url in delays],
+        "messages": []
+    }
+
+    start = time.perf_counter()
+    result = scrape_content_node(state)
+    elapsed = time.perf_counter() - start
+
+    assert [item["url"] for item in result["scraped_data"]] == list(delays)
+    assert [msg["content"] for msg in result["messages"]] == [f"Successfully scraped {url}" for url in delays]
+    # Wall-clock time tracks the slowest page rather than the sum of all pages
+    assert elapsed < sum(delays.values())
+
+def test_concurrency_limit_is_respected(requests_get_mock):
+    """No more than SCRAPE_MAX_WORKERS fetches are in flight at once."""
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def fake_get(url, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return MockResponse(content=b"<html><body><p>Text</p></body></html>")
+
+    requests_get_mock.side_effect = fake_get
+    state = {
+        "retrieved_docs": [{"url": f"http://example.com/{i}"} for i in range(6)],
+        "messages": []
+    }
+
+    with patch("research_graph.SCRAPE_MAX_WORKERS", 2):
+        result = scrape_content_node(state)
+
+    assert len(result["scraped_data"]) == 6
+    assert peak <= 2
+
+def test_scrape_pool_is_shared_across_runs(requests_get_mock):
+    """Concurrent runs reuse one process-wide scrape pool, so the worker limit holds across all of them."""
+    requests_get_mock.return_value = MockResponse(content=b"<html><body><p>Text</p></body></html>")
+    state = {"retrieved_docs": [{"url": f"http://example.com/{i}"} for i in range(2)], "messages": []}
+
+    scrape_content_node(state)
+    first_pool = research_graph._get_executor("scrape", research_graph.SCRAPE_MAX_WORKERS)
+    scrape_content_node(state)
+    assert research_graph._get_executor("scrape", research_graph.SCRAPE_MAX_WORKERS) is first_pool
+
+def test_mixed_failures_keep_per_url_messages(requests_get_mock):
+    """A failing URL reports its own error while the others are still scraped."""
+    def fake_get(url, **kwargs):
+        if url.endswith("/bad"):
+            raise requests.exceptions.ConnectionError("Connection refused")
+        return MockResponse(content=b"<html><body><p>Good page</p></body></html>")
+
+    requests_get_mock.side_effect = fake_get
+    state = {
+        "retrieved_docs": [{"url": "http://example.com/good"}, {"url": "http://example.com/bad"}, {}],
+        "messages": []
+    }
+    result = scrape_content_node(state)
+
+    assert [item["url"] for item in result["scraped_data"]] == ["http://example.com/good"]
+    assert result["messages"][0]["content"] == "Successfully scraped http://example.com/good"
+    assert result["messages"][1]["content"].startswith("Failed to scrape http://example.com/bad")
+    assert len(result["messages"]) == 2
+
+def test_fresh_cache_hit_skips_fetch(requests_get_mock):
+    """A page scraped once is served from the on-disk cache on the next run."""
+    requests_get_mock.return_value = MockResponse(content=b"<html><body><p>Cached text</p></body></html>")
+    state = {"retrieved_docs": [{"url": "http://example.com/cached"}], "messages": []}
+
+    first = scrape_content_node(state)
+    second = scrape_content_node(state)
+
+    assert requests_get_mock.call_count == 1
+    assert second["scraped_data"] == first["scraped_data"]
+    assert second["messages"][0]["content"] == "Successfully scraped http://example.com/cached (cached)"
+
+def test_stale_entry_revalidated_with_conditional_get(requests_get_mock):
+    """A stale entry is revalidated with its validators, and a 304 reuses the cached text without parsing."""
+    requests_get_mock.return_value = MockResponse(
+        content=b"<html><body><p>Original text</p></body></html>",
+        headers={"ETag": '"v1"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    )
+    state = {"retrieved_docs": [{"url": "http://example.com/stale"}], "messages": []}
+
+    with patch("research_graph.PAGE_CACHE_TTL", 0.01):
+        scrape_content_node(state)
+        time.sleep(0.02)
+        requests_get_mock.return_value = MockResponse(content=b"", status_code=304)
+        with patch("research_graph.extract_text") as extract_mock:
+            result = scrape_content_node(state)
+
+    headers = requests_get_mock.call_args.kwargs["headers"]
+    assert headers == {"If-None-Match": '"v1"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    assert not extract_mock.called
+    assert result["scraped_data"][0]["content"] == "Original text"
+    assert result["messages"][0]["content"].endswith("(not modified)")
+
+def test_stale_entry_replaced_when_page_changed(requests_get_mock):
+    """A stale entry whose page changed is re-parsed and the cache is updated."""
+    requests_get_mock.return_value = MockResponse(content=b"<html><body><p>Old</p></body></html>", headers={"ETag": '"v1"'})
+    state = {"retrieved_docs": [{"url": "http://example.com/changed"}], "messages": []}
+
+    with patch("research_graph.PAGE_CACHE_TTL", 0.01):
+        scrape_content_node(state)
+        time.sleep(0.02)
+        requests_get_mock.return_value = MockResponse(content=b"<html><body><p>New</p></body></html>", headers={"ETag": '"v2"'})
+        result = scrape_content_node(state)
+
+    assert result["scraped_data"][0]["content"] == "New"
+    assert result["messages"][0]["content"] == "Successfully scraped http://example.com/changed"
+
+def test_page_cache_disabled(requests_get_mock):
+    """Setting PAGE_CACHE_TTL to 0 turns the page cache off."""
+    requests_get_mock.return_value = MockResponse(content=b"<html><body><p>Text</p></body></html>")
+    state = {"retrieved_docs": [{"url": "http://example.com/nocache"}], "messages": []}
+
+    with patch("research_graph.PAGE_CACHE_TTL", 0):
+        scrape_content_node(state)
+        scrape_content_node(state)
+
+    assert requests_get_mock.call_count == 2
+
+def test_non_html_content_type_rejected_before_download(requests_get_mock):
+    """PDFs, images and archives are rejected from the headers without reading the body."""
+    response = MockResponse(content=b"%PDF-1.7 binary data", headers={"Content-Type": "application/pdf"})
+    requests_get_mock.return_value = response
+    state = {"retrieved_docs": [{"url": "http://example.com/paper.pdf"}], "messages": []}
+
+    result = scrape_content_node(state)
+
+    assert result["scraped_data"] == []
+    assert response.bytes_read == 0
+    assert response.closed
+    assert "unsupported content type 'application/pdf'" in result["messages"][0]["content"]
+    assert requests_get_mock.call_args.kwargs["stream"] is True
+
+def test_html_content_type_with_charset_accepted(requests_get_mock):
+    """Content-Type parameters such as charset do not affect gating."""
+    requests_get_mock.return_value = MockResponse(
+        content=b"<html><body><p>Hello</p></body></html>",
+        headers={"Content-Type": "text/html; charset=utf-8"}
+    )
+    state = {"retrieved_docs": [{"url": "http://example.com/page"}], "messages": []}
+
+    result = scrape_content_node(state)
+
+    assert result["scraped_data"][0]["content"] == "Hello"
+
+def test_download_capped_at_max_bytes(requests_get_mock):
+    """Only SCRAPE_MAX_BYTES of a huge page are downloaded."""
+    huge_page = b"<html><body>" + b"<p>filler paragraph</p>" * 200000 + b"</body></html>"
+    response = MockResponse(content=huge_page)
+    requests_get_mock.return_value = response
+    state = {"retrieved_docs": [{"url": "http://example.com/huge"}], "messages": []}
+
+    with patch("research_graph.SCRAPE_MAX_BYTES", 100 * 1024):
+        result = scrape_content_node(state)
+
+    assert response.bytes_read < len(huge_page)
+    assert response.bytes_read <= 100 * 1024 + 64 * 1024
+    assert len(result["scraped_data"]) == 1
+    assert len(result["scraped_data"][0]["content"]) <= research_graph.SCRAPE_MAX_CHARS
+
+def test_extraction_stops_at_max_chars(requests_get_mock):
+    """Extraction keeps the leading text and never exceeds SCRAPE_MAX_CHARS."""
+    paragraphs = "".join(f"<p>Paragraph number {i}</p>" for i in range(1000))
+    requests_get_mock.return_value = MockResponse(content=f"<html><body>{paragraphs}</body></html>".encode("utf-8"))
+    state = {"retrieved_docs": [{"url": "http://example.com/long"}], "messages": []}
+
+    with patch("research_graph.SCRAPE_MAX_CHARS", 100):
+        result = scrape_content_node(state)
+
+    content = result["scraped_data"][0]["content"]
+    assert len(content) == 100
+    assert content.startswith("Paragraph number 0\nParagraph number 1\n")
+
+def test_process_pool_parsing(requests_get_mock):
+    """With SCRAPE_PARSE_PROCESSES set, extraction runs in worker processes and yields the same text."""
+    pages = {
+        f"http://example.com/{i}": f"<html><body><article><p>Page {i} text</p><script>x()</script></article></body></html>"
+        for i in range(4)
+    }
+    requests_get_mock.side_effect = lambda url, **kwargs: MockResponse(content=pages[url].encode("utf-8"))
+    state = {"retrieved_docs": [{"url": url} for url in pages], "messages": []}
+
+    try:
+        with patch("research_graph.SCRAPE_PARSE_PROCESSES", "2"):
+            result = scrape_content_node(state)
+            assert research_graph._parse_pool is not None
+    finally:
+        research_graph.shutdown_parse_pool()
+
+    assert [item["content"] for item in result["scraped_data"]] == [f"Page {i} text" for i in range(4)]
+    assert research_graph._parse_pool is None
+
+def _kill_parse_workers():
+    """Starts the parse pool's worker and SIGKILLs it, as the OOM killer would; returns the now broken pool."""
+    pool = research_graph._get_parse_pool()
+    pool.submit(abs, 1).result()
+    for process in list(pool._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+        process.join(5)
+    return pool
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_dead_parse_worker_is_replaced(requests_get_mock):
+    """A parse worker that dies breaks its pool; the pool is replaced and pages still parse."""
+    page = b"<html><body><article><p>Page text</p></article></body></html>"
+    requests_get_mock.side_effect = lambda url, **kwargs: MockResponse(content=page)
+    state = {"retrieved_docs": [{"url": "http://example.com/1"}], "messages": []}
+
+    try:
+        with patch("research_graph.SCRAPE_PARSE_PROCESSES", "1"):
+            broken = _kill_parse_workers()
+            result = scrape_content_node(state)
+            assert research_graph._parse_pool is not broken
+
+            _kill_parse_workers()
+            async_content = asyncio.run(research_graph._aparse_page(page))
+    finally:
+        research_graph.shutdown_parse_pool()
+
+    assert [item["content"] for item in result["scraped_data"]] == ["Page text"]
+    assert async_content == "Page text"
+
+def test_process_pool_disabled_by_default():
+    """Extraction stays in-process unless SCRAPE_PARSE_PROCESSES is set."""
+    assert research_graph._get_parse_pool() is None
+
 if __name__ == "__main__":
     pytest.main([__file__])
+
+def test_state_keeps_only_the_relevant_passages(requests_get_mock):
+    """Long pages are trimmed to the topic's most relevant passages within SUMMARY_INPUT_TOKENS before entering state."""
+    boilerplate = "".join(f"<p>Navigation link {i} Home Products Pricing Careers</p>" for i in range(400))
+    finding = "Gene therapy trials reported durable remission in most patients."
+    requests_get_mock.return_value = MockResponse(content=f"<html><body>{boilerplate}<p>{finding}</p></body></html>".encode())
+    state = {"topic": "gene therapy trials", "retrieved_docs": [{"url": "http://example.com/long"}], "messages": []}
+
+    result = scrape_content_node(state)
+
+    content = result["scraped_data"][0]["content"]
+    assert finding in content
+    assert len(content) <= 4 * research_graph.SUMMARY_INPUT_TOKENS
+    assert result["messages"][0]["content"].startswith("Successfully scraped http://example.com/long (kept ")
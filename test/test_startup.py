@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HEAVY_MODULES = ["langchain_google_genai", "langchain_community", "langchain_core", "langgraph", "bs4", "requests"]
+
+@pytest.mark.parametrize("module", ["research_graph", "workflow_builder", "agent_runner", "research_server"])
+def test_import_defers_heavy_dependencies(module):
+    """Importing an entry-point module does not pull in LangChain, LangGraph, BeautifulSoup or requests."""
+    assert _loaded_after_import(module, HEAVY_MODULES) == ""
+
+@pytest.mark.parametrize("module", ["research_graph", "workflow_builder", "agent_runner", "http_transport"])
+def test_sync_entry_points_defer_asyncio(module):
+    """asyncio is only imported by the async code paths (and the server), not by a plain CLI run."""
+    assert _loaded_after_import(module, ["asyncio"]) == ""
+
+def _loaded_after_import(module, names):
+    """Imports module in a fresh interpreter and returns which of names it loaded, comma-separated."""
+    probe = f"import sys, {module}; print(','.join(m for m in {names!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", probe], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+def test_llm_client_constructed_on_first_use():
+    """The LLM client is only built when get_llm() is first called."""
+    import research_graph
+    from unittest.mock import patch
+
+    with patch('research_graph.llm', None), patch('langchain_google_genai.GoogleGenerativeAI') as client_class:
+        assert research_graph.llm is None
+        client = research_graph.get_llm()
+        assert client is client_class.return_value
+        assert research_graph.get_llm() is client
+        client_class.assert_called_once_with(model=research_graph.LLM_MODEL, temperature=research_graph.LLM_TEMPERATURE,
+                                             max_retries=1)
+
+def test_cli_help_is_fast_path():
+    """--help prints usage without running the agent."""
+    result = subprocess.run([sys.executable, "agent_runner.py", "--help"], cwd=PROJECT_ROOT, capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stdout.startswith("Usage: python agent_runner.py")
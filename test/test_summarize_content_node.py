@@ -2,6 +2,8 @@ import unittest
 from unittest.mock import patch, MagicMock
 import os
 import sys
+import threading
+import time
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -120,5 +122,139 @@ class TestSummarizeContentNode(unittest.TestCase):
         self.assertIn("LLM returned an empty summary", result['messages'][-2]['content'])
         self.assertIn("Could not generate any summaries", result['error_message'])
 
+    @patch('research_graph.call_llm')
+    def test_concurrent_summaries_keep_document_order(self, mock_call_llm):
+        """Test that documents are summarized concurrently while output order follows the input."""
+        # Arrange
+        lock = threading.Lock()
+        in_flight = 0
+        peak = 0
+
+        def fake_call_llm(messages):
+            nonlocal in_flight, peak
+            prompt = messages[0].content
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            # Earlier documents finish last
+            time.sleep(0.2 if "doc-0" in prompt else 0.05)
+            with lock:
+                in_flight -= 1
+            response = MagicMock()
+            response.content = "Summary of " + prompt.rsplit("Content:\n", 1)[1]
+            return response
+
+        mock_call_llm.side_effect = fake_call_llm
+        state = ResearchState(
+            topic="AI",
+            scraped_data=[{"url": f"http://example.com/{i}", "content": f"doc-{i}"} for i in range(4)],
+            messages=[]
+        )
+
+        # Act
+        with patch('research_graph.SUMMARIZE_MAX_WORKERS', 2):
+            result = summarize_content_node(state)
+
+        # Assert
+        self.assertEqual(result['summaries'], [f"Summary of doc-{i}" for i in range(4)])
+        self.assertEqual(
+            [msg['content'] for msg in result['messages']],
+            [f"Successfully summarized content from http://example.com/{i}." for i in range(4)]
+        )
+        self.assertEqual(peak, 2)
+        self.assertEqual(result['error_message'], "")
+
+    @patch('research_graph.call_llm')
+    def test_partial_failure_keeps_other_summaries(self, mock_call_llm):
+        """Test that one failing document does not drop the others or set an error message."""
+        # Arrange
+        def fake_call_llm(messages):
+            if "broken" in messages[0].content:
+                raise Exception("LLM is down")
+            response = MagicMock()
+            response.content = "A summary."
+            return response
+
+        mock_call_llm.side_effect = fake_call_llm
+        state = ResearchState(
+            topic="AI",
+            scraped_data=[
+                {"url": "http://example.com/broken", "content": "broken"},
+                {"url": "http://example.com/ok", "content": "fine"}
+            ],
+            messages=[]
+        )
+
+        # Act
+        result = summarize_content_node(state)
+
+        # Assert
+        self.assertEqual(result['summaries'], ["A summary."])
+        self.assertIn("Error summarizing content from http://example.com/broken", result['messages'][0]['content'])
+        self.assertEqual(result['error_message'], "")
+
+    @patch('research_graph.call_llm')
+    def test_long_pages_send_relevant_passages_within_budget(self, mock_call_llm):
+        """Test that only the passages most relevant to the topic are sent for long pages."""
+        # Arrange
+        mock_call_llm.return_value = MagicMock(content="A summary.")
+        boilerplate = "\n".join(f"Navigation link {i} Home Products Pricing Careers" for i in range(200))
+        finding = "Gene therapy trials reported durable remission in most patients."
+        state = ResearchState(
+            topic="gene therapy trials",
+            scraped_data=[{"url": "http://example.com/long", "content": boilerplate + "\n" + finding}],
+            messages=[]
+        )
+
+        # Act
+        with patch('research_graph.SUMMARY_INPUT_TOKENS', 100):
+            result = summarize_content_node(state)
+
+        # Assert
+        prompt = mock_call_llm.call_args[0][0][0].content
+        self.assertIn(finding, prompt)
+        self.assertLess(len(prompt), len(boilerplate))
+        self.assertIn("(using ", result['messages'][0]['content'])
+
+    @patch('research_graph.call_llm')
+    def test_token_usage_is_recorded_per_document(self, mock_call_llm):
+        """Test that each summarization call records its document and estimated tokens."""
+        # Arrange
+        mock_call_llm.return_value = MagicMock(content="Twelve chars")
+        state = ResearchState(
+            topic="AI",
+            scraped_data=[{"url": "http://example.com/a", "content": "A text."}, {"url": "http://example.com/b", "content": "B text."}],
+            messages=[]
+        )
+
+        # Act
+        result = summarize_content_node(state)
+
+        # Assert
+        self.assertEqual([r["document"] for r in result['token_usage']], ["http://example.com/a", "http://example.com/b"])
+        self.assertTrue(all(r["node"] == "content_summarizer" and r["output_tokens"] == 3 for r in result['token_usage']))
+
+    @patch('research_graph.call_llm')
+    def test_run_budget_shrinks_inputs_then_skips_lowest_ranked_documents(self, mock_call_llm):
+        """Test that a tight run budget caps page text per document and drops the tail of the ranking."""
+        # Arrange
+        mock_call_llm.return_value = MagicMock(content="A summary.")
+        page = "\n".join(f"Paragraph {i} about AI models and training data." for i in range(400))
+        state = ResearchState(
+            topic="AI",
+            scraped_data=[{"url": f"http://example.com/{i}", "content": page} for i in range(6)],
+            messages=[],
+            token_usage=[]
+        )
+
+        # Act
+        with patch('research_graph.RUN_TOKEN_BUDGET', 8000):
+            result = summarize_content_node(state)
+
+        # Assert
+        self.assertIn("Token budget: summarizing 5 of 6 documents with up to 280 input tokens each.", result['messages'][0]['content'])
+        self.assertEqual([r["document"] for r in result['token_usage']], [f"http://example.com/{i}" for i in range(5)])
+        self.assertTrue(all(r["input_tokens"] <= 280 + 100 for r in result['token_usage']))
+
 if __name__ == '__main__':
     unittest.main()
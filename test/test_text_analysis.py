@@ -0,0 +1,127 @@
+import hashlib
+from collections import Counter
+import pytest
+from text_analysis import (
+    SIMHASH_MAX_WORDS, canonicalize_url, simhash, simhash_similarity, find_near_duplicates, tokenize, bm25_scores,
+    estimate_tokens, split_passages, select_passages,
+)
+
+ARTICLE = " ".join(
+    f"Sentence {i} explains how battery chemistry number {i * 7 % 13} affects charging speed and lifetime."
+    for i in range(40)
+)
+
+@pytest.mark.parametrize("variant", [
+    "http://example.com/post",
+    "https://www.example.com/post/",
+    "https://EXAMPLE.com:443/post#comments",
+    "https://example.com/post?utm_source=feed&utm_medium=rss",
+    "https://example.com/post?fbclid=abc123",
+])
+def test_canonicalize_url_ignores_presentation_details(variant):
+    """URL variants that serve the same page share one canonical form."""
+    assert canonicalize_url(variant) == canonicalize_url("https://example.com/post")
+
+def test_canonicalize_url_keeps_meaningful_differences():
+    """Different paths, hosts, ports and content-bearing parameters stay distinct."""
+    base = canonicalize_url("https://example.com/post?id=1")
+    assert canonicalize_url("https://example.com/post?id=2") != base
+    assert canonicalize_url("https://example.com/other?id=1") != base
+    assert canonicalize_url("https://example.org/post?id=1") != base
+    assert canonicalize_url("https://example.com:8443/post?id=1") != base
+    assert canonicalize_url("https://example.com/post?b=2&id=1") == canonicalize_url("https://example.com/post?id=1&b=2")
+
+def test_canonicalize_url_returns_unparseable_input_unchanged():
+    assert canonicalize_url("not a url") == "not a url"
+
+def test_simhash_is_deterministic_and_case_insensitive():
+    assert simhash(ARTICLE) == simhash(ARTICLE.upper())
+
+def test_simhash_similarity_separates_near_duplicates_from_unrelated_text():
+    syndicated = "Subscribe to our newsletter. " + ARTICLE + " Copyright Example Media."
+    unrelated = " ".join(f"The recipe step {i} asks for {i} cups of flour and a pinch of salt." for i in range(40))
+    assert simhash_similarity(simhash(ARTICLE), simhash(syndicated)) >= 0.9
+    assert simhash_similarity(simhash(ARTICLE), simhash(unrelated)) < 0.9
+
+def test_simhash_matches_per_bit_weighting():
+    """Each fingerprint bit is set when the shingles whose hash has that bit outweigh the others."""
+    words = ARTICLE.lower().replace(".", "").split()
+    shingles = Counter(" ".join(words[i:i + 3]) for i in range(len(words) - 2))
+    weights = [0] * 64
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += count if value >> bit & 1 else -count
+
+    assert simhash(ARTICLE) == sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+def test_simhash_reads_a_bounded_number_of_words():
+    """Only the first SIMHASH_MAX_WORDS words are fingerprinted, bounding the cost of long pages."""
+    text = " ".join(f"word{i}" for i in range(SIMHASH_MAX_WORDS))
+    ending, other_ending = (" ".join(f"{prefix}{i}" for i in range(SIMHASH_MAX_WORDS)) for prefix in ("end", "other"))
+    assert simhash(f"{text} {ending}") == simhash(f"{text} {other_ending}")
+    assert simhash(f"{text} {ending}", max_words=0) != simhash(f"{text} {other_ending}", max_words=0)
+
+def test_find_near_duplicates_keeps_first_occurrence():
+    texts = [ARTICLE, "A completely different page about gardening and tomatoes in spring.", ARTICLE + " Share this."]
+    assert find_near_duplicates(texts, 0.9) == [2]
+
+def test_find_near_duplicates_ignores_empty_texts():
+    assert find_near_duplicates(["", "", ARTICLE], 0.9) == []
+
+def test_tokenize_drops_stop_words_and_case():
+    assert tokenize("The Impact of Solar Power on the Grid") == ["impact", "solar", "power", "grid"]
+
+def test_bm25_prefers_documents_matching_rare_query_terms():
+    documents = [
+        "Solar panels convert sunlight into electricity for the grid.",
+        "A guide to baking sourdough bread at home.",
+        "Grid operators balance supply and demand every second.",
+    ]
+    scores = bm25_scores("solar grid", documents)
+    assert scores[0] > scores[2] > scores[1] == 0.0
+
+def test_bm25_normalizes_for_document_length():
+    short = "solar energy"
+    padded = "solar energy " + " ".join(f"filler{i}" for i in range(200))
+    scores = bm25_scores("solar", [short, padded, "unrelated text"])
+    assert scores[0] > scores[1]
+
+def test_bm25_handles_empty_inputs():
+    assert bm25_scores("the of and", ["some text"]) == [0.0]
+    assert bm25_scores("solar", []) == []
+
+def test_split_passages_groups_lines_and_breaks_long_ones():
+    text = "Short line one\nShort line two\n\n" + "A sentence that goes on. " * 40
+    passages = split_passages(text, max_chars=100)
+    assert passages[0].startswith("Short line one\nShort line two\nA sentence")
+    assert all(len(p) <= 100 for p in passages)
+    assert sum(p.count("A sentence that goes on.") for p in passages) == 40
+
+def test_select_passages_returns_short_text_unchanged():
+    assert select_passages("Short page about solar power.", "solar", 100) == ("Short page about solar power.", 1, 1)
+
+def test_select_passages_prefers_relevant_passages_within_budget():
+    navigation = "\n".join(f"Menu item {i} Home About Contact Login" for i in range(40))
+    relevant = "Solar panel efficiency reached a record 47 percent in laboratory tests of solar cells."
+    text = navigation + "\n" + relevant + "\n" + "\n".join(f"Footer link {i}" for i in range(40))
+
+    selected, kept, total = select_passages(text, "solar panel efficiency", 100)
+
+    assert relevant in selected
+    assert estimate_tokens(selected) <= 100
+    assert kept < total
+
+def test_select_passages_keeps_document_order():
+    text = "\n".join(["solar intro " + "x" * 580, "unrelated " + "y" * 580, "more solar details " + "z" * 570])
+    selected, kept, total = select_passages(text, "solar", 320)
+    assert kept < total
+    assert selected.index("solar intro") < selected.index("more solar details")
+    assert "unrelated" not in selected
+
+def test_select_passages_falls_back_to_leading_text_without_matches():
+    text = "\n".join(f"Paragraph {i} " + "w" * 590 for i in range(10))
+    selected, _, _ = select_passages(text, "quantum", 200)
+    assert selected.startswith("Paragraph 0 ")
+    assert "Paragraph 1 " not in selected
+    assert estimate_tokens(selected) <= 200
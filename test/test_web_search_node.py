@@ -1,6 +1,10 @@
+import asyncio
+import threading
+import time
 import pytest
 from dotenv import load_dotenv
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+import research_graph
 from research_graph import web_search_node, ResearchState
 
 # Load environment variables for Tavily API key
@@ -33,6 +37,17 @@ def test_happy_path(tavily_search_mock):
     assert len(result["retrieved_docs"]) == 2
     assert tavily_search_mock.invoke.call_count == 2
 
+def test_returns_only_new_messages(tavily_search_mock):
+    """The node returns just its own log entries; the graph's reducer appends them to the existing log."""
+    tavily_search_mock.invoke.return_value = [{'url': 'http://example.com/doc1', 'content': 'Content 1'}]
+    earlier = [{"role": "system", "content": "Generated queries: ['query1']"}]
+
+    result = web_search_node({"search_queries": ["query1"], "messages": earlier})
+
+    assert earlier[0] not in result["messages"]
+    assert result["messages"] == [{"role": "system", "content": "Retrieved 1 unique documents."}]
+    assert len(earlier) == 1
+
 def test_empty_queries():
     """Tests behavior when the input list of search queries is empty."""
     state = {
@@ -69,6 +84,22 @@ def test_deduplication(tavily_search_mock):
     urls = {doc['url'] for doc in result["retrieved_docs"]}
     assert urls == {'http://example.com/doc1', 'http://example.com/doc2', 'http://example.com/doc3'}
 
+def test_deduplication_on_canonical_url(tavily_search_mock):
+    """Ensures that tracking-parameter, scheme and www variants of one URL count as a single document."""
+    tavily_search_mock.invoke.side_effect = [
+        [{'url': 'https://example.com/doc1', 'content': 'Content 1'}],
+        [
+            {'url': 'http://www.example.com/doc1/?utm_source=newsletter#top', 'content': 'Content 1'},
+            {'url': 'https://example.com/doc1?page=2', 'content': 'Content 1, page 2'}
+        ]
+    ]
+
+    result = web_search_node({"search_queries": ["query1", "query2"], "messages": []})
+
+    assert [doc['url'] for doc in result["retrieved_docs"]] == [
+        'http://www.example.com/doc1/?utm_source=newsletter#top', 'https://example.com/doc1?page=2'
+    ]
+
 def test_api_error(tavily_search_mock):
     """Tests how the node handles an exception from the search tool."""
     tavily_search_mock.invoke.side_effect = RuntimeError("API limit reached")
@@ -84,5 +115,215 @@ def test_api_error(tavily_search_mock):
     assert result["retrieved_docs"] == []
     assert any("Search failed for query" in msg['content'] for msg in result["messages"])
 
+def test_error_string_fails_only_its_query(tavily_search_mock):
+    """The search tool returns the error text instead of a list when the API fails; the other queries' results are kept."""
+    def fake_invoke(query):
+        if query == "failing query":
+            return "HTTPError('502 Server Error: Bad Gateway')"
+        return [{'url': f'http://example.com/{query.split()[0]}', 'content': query}]
+
+    tavily_search_mock.invoke.side_effect = fake_invoke
+    tavily_search_mock.ainvoke = AsyncMock(side_effect=fake_invoke)
+    state = {
+        "search_queries": ["first query", "failing query", "second query"],
+        "messages": []
+    }
+
+    for result in (web_search_node(state), asyncio.run(research_graph.aweb_search_node(state))):
+        assert not result["error_message"]
+        assert [doc['url'] for doc in result["retrieved_docs"]] == ['http://example.com/first', 'http://example.com/second']
+        assert any("'failing query': HTTPError('502" in msg['content'] for msg in result["messages"])
+
+def test_concurrent_queries_merge_deterministically(tavily_search_mock):
+    """Queries run concurrently, but the merged order follows the query order, not completion order."""
+    responses = {
+        "slow query": (0.2, [{'url': 'http://example.com/a', 'content': 'A'}, {'url': 'http://example.com/b', 'content': 'B'}]),
+        "fast query": (0.0, [{'url': 'http://example.com/c', 'content': 'C'}, {'url': 'http://example.com/a', 'content': 'A again'}]),
+    }
+
+    def fake_invoke(query):
+        delay, results = responses[query]
+        time.sleep(delay)
+        return results
+
+    tavily_search_mock.invoke.side_effect = fake_invoke
+    state = {
+        "search_queries": ["slow query", "fast query"],
+        "messages": []
+    }
+    result = web_search_node(state)
+
+    assert [doc['url'] for doc in result["retrieved_docs"]] == [
+        'http://example.com/a', 'http://example.com/b', 'http://example.com/c'
+    ]
+    # Later duplicates still win, exactly as in the serial implementation
+    assert result["retrieved_docs"][0]['content'] == 'A again'
+
+def test_query_timeout(tavily_search_mock):
+    """A query that exceeds SEARCH_TIMEOUT is reported and the other results are kept."""
+    release = threading.Event()
+
+    def fake_invoke(query):
+        if query == "hanging query":
+            release.wait(5)
+            return [{'url': 'http://example.com/late', 'content': 'Late'}]
+        return [{'url': 'http://example.com/doc1', 'content': 'Content 1'}]
+
+    tavily_search_mock.invoke.side_effect = fake_invoke
+    state = {
+        "search_queries": ["hanging query", "quick query"],
+        "messages": []
+    }
+    try:
+        with patch('research_graph.SEARCH_TIMEOUT', 0.1):
+            result = web_search_node(state)
+    finally:
+        release.set()
+
+    assert not result["error_message"]
+    assert [doc['url'] for doc in result["retrieved_docs"]] == ['http://example.com/doc1']
+    assert any("'hanging query': timed out" in msg['content'] for msg in result["messages"])
+
+def test_hung_queries_share_one_timeout(tavily_search_mock):
+    """Several hung queries time out together after SEARCH_TIMEOUT, not one after another."""
+    release = threading.Event()
+
+    def fake_invoke(query):
+        if query.startswith("hanging"):
+            release.wait(5)
+        return [{'url': f'http://example.com/{query.replace(" ", "-")}', 'content': query}]
+
+    tavily_search_mock.invoke.side_effect = fake_invoke
+    state = {
+        "search_queries": [f"hanging query {i}" for i in range(4)] + ["quick query"],
+        "messages": []
+    }
+    started = time.monotonic()
+    try:
+        with patch('research_graph.SEARCH_TIMEOUT', 0.5):
+            result = web_search_node(state)
+    finally:
+        release.set()
+
+    # Four timeouts one after another would take 2s
+    assert time.monotonic() - started < 1.5
+    assert [doc['url'] for doc in result["retrieved_docs"]] == ['http://example.com/quick-query']
+    assert sum("timed out after 0.5s" in msg['content'] for msg in result["messages"]) == 4
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_queued_queries_do_not_time_out(tavily_search_mock, use_async):
+    """A query's timeout starts when it starts running, not while it waits for a free search slot."""
+    def results(query):
+        return [{'url': f'http://example.com/{query.replace(" ", "-")}', 'content': query}]
+
+    def fake_invoke(query):
+        time.sleep(0.2)
+        return results(query)
+
+    async def fake_ainvoke(query):
+        await asyncio.sleep(0.2)
+        return results(query)
+
+    tavily_search_mock.invoke.side_effect = fake_invoke
+    tavily_search_mock.ainvoke = AsyncMock(side_effect=fake_ainvoke)
+    state = {"search_queries": ["query one", "query two", "query three"], "messages": []}
+    # One query at a time: the last one starts about 0.4s after the batch, past the 0.3s timeout
+    with patch('research_graph.SEARCH_MAX_WORKERS', 1), patch('research_graph.SEARCH_TIMEOUT', 0.3):
+        result = asyncio.run(research_graph.aweb_search_node(state)) if use_async else web_search_node(state)
+
+    assert [doc['url'] for doc in result["retrieved_docs"]] == [
+        'http://example.com/query-one', 'http://example.com/query-two', 'http://example.com/query-three'
+    ]
+    assert not any("timed out" in msg['content'] for msg in result["messages"])
+
+def test_timed_out_search_frees_its_worker(tavily_search_mock):
+    """A hung search that timed out does not keep later queries waiting for its search worker."""
+    release = threading.Event()
+
+    def fake_invoke(query):
+        if query == "hanging query":
+            release.wait(5)
+        return [{'url': f'http://example.com/{query.replace(" ", "-")}', 'content': query}]
+
+    tavily_search_mock.invoke.side_effect = fake_invoke
+    try:
+        with patch('research_graph.SEARCH_MAX_WORKERS', 1), patch('research_graph.SEARCH_TIMEOUT', 0.2):
+            hung = web_search_node({"search_queries": ["hanging query"], "messages": []})
+            started = time.monotonic()
+            result = web_search_node({"search_queries": ["quick query"], "messages": []})
+            elapsed = time.monotonic() - started
+    finally:
+        release.set()
+
+    assert any("timed out after 0.2s" in msg['content'] for msg in hung["messages"])
+    assert [doc['url'] for doc in result["retrieved_docs"]] == ['http://example.com/quick-query']
+    assert elapsed < 0.2
+
+def test_repeated_search_served_from_cache(tavily_search_mock):
+    """Repeating research on a topic makes no further search API round-trips."""
+    tavily_search_mock.invoke.return_value = [{'url': 'http://example.com/doc1', 'content': 'Content 1'}]
+    state = {
+        "search_queries": ["AI in Healthcare", "ai   in healthcare "],
+        "messages": []
+    }
+
+    first = web_search_node(state)
+    assert tavily_search_mock.invoke.call_count == 1  # Normalized duplicates share one search
+    second = web_search_node(state)
+
+    assert tavily_search_mock.invoke.call_count == 1
+    assert second["retrieved_docs"] == first["retrieved_docs"]
+    assert any("Served 2 of 2 queries from the search cache" in msg['content'] for msg in second["messages"])
+
+def test_search_cache_keyed_on_max_results(tavily_search_mock):
+    """Changing the number of requested results does not reuse cached results."""
+    tavily_search_mock.invoke.return_value = [{'url': 'http://example.com/doc1', 'content': 'Content 1'}]
+    state = {"search_queries": ["query1"], "messages": []}
+
+    web_search_node(state)
+    with patch('research_graph.SEARCH_MAX_RESULTS', 5):
+        web_search_node(state)
+
+    assert tavily_search_mock.invoke.call_count == 2
+
+def test_search_cache_disabled(tavily_search_mock):
+    """Setting SEARCH_CACHE_TTL to 0 turns the search cache off."""
+    tavily_search_mock.invoke.return_value = [{'url': 'http://example.com/doc1', 'content': 'Content 1'}]
+    state = {"search_queries": ["query1"], "messages": []}
+
+    with patch('research_graph.SEARCH_CACHE_TTL', 0):
+        web_search_node(state)
+        web_search_node(state)
+
+    assert tavily_search_mock.invoke.call_count == 2
+
 if __name__ == "__main__":
     pytest.main([__file__])
+
+def test_search_requests_use_shared_transport(monkeypatch):
+    """The Tavily client sends its API requests through the shared pooled HTTP transport."""
+    monkeypatch.setenv("TAVILY_API_KEY", "test-key")
+    response = MagicMock()
+    response.json.return_value = {"results": [{"title": "A", "url": "http://example.com/a", "content": "A", "score": 0.9}]}
+    with patch('http_transport.post', return_value=response) as mock_post:
+        tool = research_graph._pooled_tavily_tool_class()(max_results=2)
+        results = tool.invoke("test query")
+
+    assert [r["url"] for r in results] == ["http://example.com/a"]
+    assert mock_post.call_args.kwargs["json"]["query"] == "test query"
+    assert mock_post.call_args.kwargs["json"]["max_results"] == 2
+    assert mock_post.call_args.kwargs["timeout"] == research_graph.SEARCH_TIMEOUT
+
+def test_search_tool_async_requests_use_pooled_transport(monkeypatch):
+    """ainvoke sends the Tavily request through the running loop's pooled async session."""
+    monkeypatch.setenv("TAVILY_API_KEY", "test-key")
+    response = MagicMock()
+    response.json = AsyncMock(return_value={"results": [{"title": "A", "url": "http://example.com/a", "content": "A", "score": 0.9}]})
+    with patch('http_transport.apost', return_value=response) as mock_apost:
+        tool = research_graph._pooled_tavily_tool_class()(max_results=2)
+        results = asyncio.run(tool.ainvoke("test query"))
+
+    assert [r["url"] for r in results] == ["http://example.com/a"]
+    assert mock_apost.call_args.kwargs["json"]["query"] == "test query"
+    assert mock_apost.call_args.kwargs["timeout"] == research_graph.SEARCH_TIMEOUT
+    response.release.assert_called_once()
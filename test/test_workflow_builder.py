@@ -1,9 +1,12 @@
 import pytest
 import sys
+import time
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from unittest.mock import patch, MagicMock
-from workflow_builder import build_workflow
+from unittest.mock import patch
+from conftest import PageResponse, fake_llm_response
+from workflow_builder import build_workflow, stepwise_agent
+from research_graph import collect_documents_node
 from langgraph.graph import StateGraph
 
 @patch('research_graph.generate_queries_node')
@@ -31,5 +34,147 @@ def test_build_workflow(
     assert "query_generator" in app.nodes
     assert "web_searcher" in app.nodes
     assert "content_scraper" in app.nodes
+    assert "content_deduplicator" in app.nodes
+    assert "content_ranker" in app.nodes
     assert "content_summarizer" in app.nodes
     assert "report_compiler" in app.nodes
+
+def test_build_pipelined_workflow():
+    """
+    Tests that the pipelined workflow replaces the batch stages with per-document nodes.
+    """
+    app = build_workflow(pipelined=True)
+
+    assert "document_processor" in app.nodes
+    assert "document_collector" in app.nodes
+    assert "content_scraper" not in app.nodes
+    assert "content_deduplicator" not in app.nodes
+    assert "content_ranker" not in app.nodes
+    assert "content_summarizer" not in app.nodes
+    assert "report_compiler" in app.nodes
+
+def test_compiled_workflows_are_reused():
+    """Repeated builds return the same compiled workflow; patched nodes or another checkpointer get a new one."""
+    from langgraph.checkpoint.memory import MemorySaver
+
+    app = build_workflow(pipelined=True)
+    assert build_workflow(pipelined=True) is app
+    assert build_workflow(pipelined=True, use_async=True) is not app
+    assert build_workflow(pipelined=True, checkpointer=MemorySaver()) is not app
+    with patch('workflow_builder.compile_report_node'):
+        assert build_workflow(pipelined=True) is not app
+
+def _fake_call_llm(messages):
+    prompt = messages[0].content
+    if "provide a concise summary" in prompt:
+        # Documents found first take longest, so a batch stage would wait on all of them
+        time.sleep(0.3 if prompt.rsplit("Content of ", 1)[1].endswith("/0") else 0.1)
+    return fake_llm_response(messages)
+
+@patch('http_transport.get', side_effect=lambda url, **kwargs: PageResponse(url))
+@patch('research_graph.TavilySearchResults')
+@patch('research_graph.call_llm', side_effect=_fake_call_llm)
+def test_pipelined_run_end_to_end(mock_call_llm, mock_tavily, mock_get):
+    """
+    Tests a full pipelined run: documents are processed concurrently and results keep retrieval order.
+    """
+    mock_tavily.return_value.invoke.side_effect = lambda query: [
+        {"url": f"http://example.com/{query.split()[0]}/{i}"} for i in range(3)
+    ]
+
+    start = time.perf_counter()
+    steps = list(stepwise_agent("Test Topic", pipelined=True))
+    elapsed = time.perf_counter() - start
+    final_state = steps[-1][2]
+
+    expected_urls = [f"http://example.com/{q}/{i}" for q in ("first", "second") for i in range(3)]
+    assert steps[-1][0] == "done"
+    # Every yielded step is named after the node that actually ran, one per parallel branch
+    assert [step[0] for step in steps] == (
+        ["query_generator", "web_searcher"] + ["document_processor"] * 6
+        + ["document_collector", "report_compiler", "done"]
+    )
+    # The message log is appended to, never replaced: the initial message appears once, followed by every node's entries
+    contents = [getattr(m, "content", None) or m["content"] for m in final_state["messages"]]
+    assert contents[0] == "Start research on: Test Topic"
+    assert sum(c.startswith("Generated queries") for c in contents) == 1
+    assert sum(c.startswith("Successfully scraped") for c in contents) == 6
+    assert contents[-2] == "Successfully compiled the final report."
+    processor_metrics = [m for m in final_state["node_metrics"] if m["node"] == "document_processor"]
+    assert len(processor_metrics) == 6
+    assert all(m["http_requests"] == 1 and m["bytes_fetched"] > 0 for m in processor_metrics)
+    assert final_state["final_report"] == "Final report on Test Topic."
+    assert [item["url"] for item in final_state["scraped_data"]] == expected_urls
+    assert final_state["summaries"] == [f"Summary of {url}" for url in expected_urls]
+    # Token usage from concurrent branches is merged: one query call, six summaries, one report
+    assert [r["node"] for r in final_state["token_usage"]].count("document_processor") == 6
+    assert len(final_state["token_usage"]) == 8
+    # Six documents with up to 0.3s of summarization each finish in roughly the slowest chain
+    assert elapsed < 1.0
+
+@patch('http_transport.get', side_effect=lambda url, **kwargs: PageResponse(url))
+@patch('research_graph.TavilySearchResults')
+@patch('research_graph.call_llm', side_effect=fake_llm_response)
+def test_pipelined_run_summarizes_at_most_rank_top_k(mock_call_llm, mock_tavily, mock_get):
+    """
+    Tests that pipelined mode only scrapes and summarizes the RANK_TOP_K documents whose search snippets match best.
+    """
+    mock_tavily.return_value.invoke.side_effect = lambda query: [
+        {"url": f"http://example.com/{query.split()[0]}/{i}",
+         "content": "Test topic research" if i == 0 else "Unrelated cooking recipes"} for i in range(4)
+    ]
+
+    with patch('research_graph.RANK_TOP_K', 2):
+        final_state = list(stepwise_agent("Test Topic", pipelined=True))[-1][2]
+
+    summarized = [r["document"] for r in final_state["token_usage"] if r["node"] == "document_processor"]
+    assert sorted(summarized) == ["http://example.com/first/0", "http://example.com/second/0"]
+    assert mock_get.call_count == 2
+    assert final_state["summaries"] == [f"Summary of {url}" for url in summarized]
+    assert any(m["content"].startswith("Processed the 2 most relevant of 8 retrieved documents")
+               for m in final_state["messages"] if isinstance(m, dict))
+
+def test_collect_documents_drops_near_duplicates_and_irrelevant_pages():
+    """
+    Tests that pipelined results go through the same near-duplicate and relevance cut-off as sequential mode.
+    """
+    page = "Solar panel installation rates doubled as residential incentives grew across the region this year."
+    docs = [("a", page), ("b", page), ("c", "How to bake sourdough bread with a crisp crust at home.")]
+    state = {
+        "topic": "solar panel incentives",
+        "search_queries": [],
+        "messages": [],
+        "processed_docs": [
+            {"index": i, "url": url, "scraped": {"url": url, "content": content}, "summary": f"s{url}", "failed": False,
+             "messages": []}
+            for i, (url, content) in enumerate(docs)
+        ]
+    }
+    with patch('research_graph.RANK_MIN_SCORE', 0.5):
+        result = collect_documents_node(state)
+
+    assert [item["url"] for item in result["scraped_data"]] == ["a"]
+    assert result["summaries"] == ["sa"]
+    assert [m["content"].split(":")[0] for m in result["messages"]] == [
+        "Dropped 1 near-duplicate documents", "Skipped 1 documents below the relevance cut-off"
+    ]
+
+def test_collect_documents_orders_by_retrieval_index():
+    """
+    Tests that per-document results arriving out of order are collected in retrieval order.
+    """
+    state = {
+        "messages": [],
+        "processed_docs": [
+            {"index": 1, "url": "b", "scraped": {"url": "b", "content": "B"}, "summary": "sb", "failed": False,
+             "messages": [{"role": "system", "content": "b done"}]},
+            {"index": 0, "url": "a", "scraped": None, "summary": None, "failed": False,
+             "messages": [{"role": "system", "content": "Failed to scrape a"}]},
+        ]
+    }
+    result = collect_documents_node(state)
+
+    assert result["scraped_data"] == [{"url": "b", "content": "B"}]
+    assert result["summaries"] == ["sb"]
+    assert [m["content"] for m in result["messages"]] == ["Failed to scrape a", "b done"]
+    assert result["error_message"] == ""
@@ -0,0 +1,191 @@
+import hashlib
+import math
+import re
+from collections import Counter
+from itertools import islice
+from typing import Iterable, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track the visitor and never change the page content
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "_ga", "_gl", "spm",
+})
+TRACKING_PARAM_PREFIXES = ("utm_",)
+
+SIMHASH_BITS = 64
+# Leading words of a text that its SimHash is computed over, which bounds the cost per page
+SIMHASH_MAX_WORDS = 2000
+
+# Common English words that carry no relevance signal for ranking
+STOP_WORDS = frozenset("""
+a an and are as at be by for from has have how in is it its of on or that the this to was were what when
+where which who why will with about into than then there these those vs
+""".split())
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Target size of the passages scored by select_passages
+PASSAGE_MAX_CHARS = 600
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+def canonicalize_url(url: str) -> str:
+    """
+    Returns a canonical form of url for duplicate detection.
+    The scheme, a leading "www.", default ports, fragments, tracking parameters,
+    parameter order and trailing slashes are ignored. Unparseable URLs are returned unchanged.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url
+    if not host:
+        return url
+    if host.startswith("www."):
+        host = host[4:]
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+    )
+    path = parts.path.rstrip("/")
+    return urlunsplit(("", host, path, urlencode(query), ""))
+
+def _shingles(text: str, size: int, max_words: int = 0) -> Iterable[str]:
+    words = _WORD_RE.finditer(text.lower())
+    words = [match.group(0) for match in (islice(words, max_words) if max_words > 0 else words)]
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return (" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+# For each bit of a byte, a bytes.translate table mapping every byte value to that bit (0 or 1)
+_BIT_TABLES = [bytes(value >> bit & 1 for value in range(256)) for bit in range(8)]
+
+def simhash(text: str, shingle_size: int = 3, max_words: int = SIMHASH_MAX_WORDS) -> int:
+    """
+    Computes a 64-bit SimHash fingerprint of text over overlapping word shingles of its first
+    max_words words (0 = all of them).
+    Texts that share most of their shingles get fingerprints that differ in only a few bits.
+    """
+    counts = Counter(_shingles(text, shingle_size, max_words))
+    # All digests in one buffer, each repeated by its shingle's count, so every bit's weighted vote is
+    # counted in C: the bytes at one position are mapped to that bit's value (0 or 1) and the 1s counted
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() * count
+                       for shingle, count in counts.items())
+    fingerprint = 0
+    for position in range(SIMHASH_BITS // 8):
+        column = digests[position::8]
+        # Digests are big-endian: the first byte holds the highest bits
+        shift = SIMHASH_BITS - 8 * (position + 1)
+        for bit in range(8):
+            if 2 * column.translate(_BIT_TABLES[bit]).count(1) > len(column):
+                fingerprint |= 1 << (shift + bit)
+    return fingerprint
+
+def simhash_similarity(a: int, b: int) -> float:
+    """Returns the fraction of matching bits between two SimHash fingerprints (1.0 means identical)."""
+    return 1 - bin(a ^ b).count("1") / SIMHASH_BITS
+
+def find_near_duplicates(texts: List[str], threshold: float) -> List[int]:
+    """
+    Returns the indexes of texts that are near-duplicates of an earlier text.
+    Two texts are near-duplicates when their SimHash similarity is at least threshold.
+    Texts without any words are never reported as duplicates.
+    """
+    kept = []
+    duplicates = []
+    for index, text in enumerate(texts):
+        if not _WORD_RE.search(text or ""):
+            continue
+        fingerprint = simhash(text)
+        if any(simhash_similarity(fingerprint, other) >= threshold for other in kept):
+            duplicates.append(index)
+        else:
+            kept.append(fingerprint)
+    return duplicates
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases text and splits it into word tokens, dropping stop words."""
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOP_WORDS]
+
+def bm25_scores(query: str, documents: List[str], k1: float = BM25_K1, b: float = BM25_B) -> List[float]:
+    """
+    Scores every document against query with Okapi BM25.
+    The index is built in memory for this call; returns one score per document, in input order.
+    """
+    query_terms = set(tokenize(query))
+    doc_terms = [Counter(tokenize(doc)) for doc in documents]
+    if not query_terms or not doc_terms:
+        return [0.0] * len(documents)
+
+    avg_length = sum(sum(terms.values()) for terms in doc_terms) / len(doc_terms) or 1.0
+    idf = {}
+    for term in query_terms:
+        containing = sum(1 for terms in doc_terms if term in terms)
+        idf[term] = math.log((len(doc_terms) - containing + 0.5) / (containing + 0.5) + 1)
+
+    scores = []
+    for terms in doc_terms:
+        length_norm = k1 * (1 - b + b * sum(terms.values()) / avg_length)
+        scores.append(sum(
+            idf[term] * terms[term] * (k1 + 1) / (terms[term] + length_norm)
+            for term in query_terms if term in terms
+        ))
+    return scores
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting prompts."""
+    return (len(text) + 3) // 4
+
+def split_passages(text: str, max_chars: int = PASSAGE_MAX_CHARS) -> List[str]:
+    """
+    Splits text into passages of consecutive lines, each at most about max_chars characters.
+    Lines longer than max_chars are broken at sentence boundaries, or cut if a sentence is still too long.
+    """
+    pieces = []
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) <= max_chars:
+            pieces.extend([line] if line else [])
+            continue
+        for sentence in _SENTENCE_END_RE.split(line):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    passages, current, length = [], [], 0
+    for piece in pieces:
+        if current and length + 1 + len(piece) > max_chars:
+            passages.append("\n".join(current))
+            current, length = [], 0
+        length += len(piece) + (1 if current else 0)
+        current.append(piece)
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+def select_passages(text: str, query: str, max_tokens: int) -> Tuple[str, int, int]:
+    """
+    Packs the passages of text most relevant to query (by BM25) into max_tokens estimated tokens.
+    The chosen passages keep their original order. Text that already fits is returned unchanged.
+    When no passage matches the query, the leading passages are kept.
+
+    Returns:
+        A tuple of (selected text, passages kept, passages in total).
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, 1, 1
+    # Keep passages small relative to the budget so several of them fit
+    passages = split_passages(text, max(1, min(PASSAGE_MAX_CHARS, max_tokens * 4 // 3)))
+    scores = bm25_scores(query, passages)
+    chosen, used = [], 0
+    for index in sorted(range(len(passages)), key=lambda i: (-scores[i], i)):
+        cost = estimate_tokens(passages[index]) + 1
+        if used + cost <= max_tokens:
+            chosen.append(index)
+            used += cost
+    return "\n".join(passages[i] for i in sorted(chosen)), len(chosen), len(passages)
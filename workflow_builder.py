@@ -1,72 +1,205 @@
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import research_graph
 from research_graph import (
     ResearchState,
     generate_queries_node,
     web_search_node,
     scrape_content_node,
+    deduplicate_content_node,
+    rank_content_node,
     summarize_content_node,
-    compile_report_node
+    compile_report_node,
+    dispatch_documents,
+    process_document_node,
+    collect_documents_node,
+    agenerate_queries_node,
+    aweb_search_node,
+    ascrape_content_node,
+    adeduplicate_content_node,
+    arank_content_node,
+    asummarize_content_node,
+    acompile_report_node,
+    aprocess_document_node,
+    PIPELINE_MAX_WORKERS
 )
+from node_metrics import instrument_node
+
+# Spinner text shown once each node has finished
+NODE_STATUS = {
+    "query_generator": "Generating search queries...",
+    "web_searcher": "Performing web search...",
+    "content_scraper": "Scraping web content...",
+    "content_deduplicator": "Removing duplicate content...",
+    "content_ranker": "Ranking content by relevance...",
+    "content_summarizer": "Summarizing content...",
+    "document_processor": "Scraping and summarizing documents...",
+    "document_collector": "Collecting document summaries...",
+    "report_compiler": "Compiling final report...",
+}
+
+# SQLite file holding the checkpoints of unfinished runs; empty means checkpoints.sqlite3 under RESEARCH_CACHE_DIR
+CHECKPOINT_DB = os.getenv("RESEARCH_CHECKPOINT_DB", "")
+
+_checkpointers: Dict[str, Any] = {}
+_checkpointers_lock = threading.Lock()
+
+def get_checkpointer():
+    """
+    Returns the process-wide SQLite checkpointer, opening its file on first use.
+    Every run in the process shares it; runs are kept apart by their thread id.
+    """
+    # Imported lazily: the checkpointer pulls in LangGraph
+    from checkpoint_store import SQLiteCheckpointer
+
+    path = CHECKPOINT_DB or os.path.join(research_graph.CACHE_DIR, "checkpoints.sqlite3")
+    with _checkpointers_lock:
+        checkpointer = _checkpointers.get(path)
+        if checkpointer is None:
+            checkpointer = SQLiteCheckpointer(path)
+            _checkpointers[path] = checkpointer
+        return checkpointer
+
+# Compiled workflows, keyed by build_workflow's settings and node functions
+_workflows: Dict[Tuple[Any, ...], Any] = {}
+_workflows_lock = threading.Lock()
+
+def research_thread_id(topic: str, pipelined: bool = False) -> str:
+    """
+    Returns the checkpoint thread id used for a topic, so an interrupted run can be resumed by topic.
+    The two workflows have different nodes, so each gets its own thread.
+    """
+    digest = hashlib.sha1(topic.encode("utf-8")).hexdigest()[:16]
+    return f"{'pipelined' if pipelined else 'sequential'}-{digest}"
 
-def build_workflow():
+def build_workflow(pipelined: bool = False, checkpointer=None, use_async: bool = False):
     """
     Builds the LangGraph workflow for the research agent.
 
+    Args:
+        pipelined: If True, every retrieved document is scraped and summarized in its own
+            branch as soon as search finishes, and only the report step waits for all of them.
+            Otherwise scraping, near-duplicate removal, relevance ranking and summarizing
+            run as sequential whole-batch stages.
+        checkpointer: LangGraph checkpoint saver to compile with. Defaults to the shared
+            on-disk checkpointer (see get_checkpointer).
+        use_async: If True, the nodes are the async implementations (async HTTP, search and
+            LLM calls), and the workflow must be run with astream/ainvoke.
+
     Returns:
-        A compiled LangGraph workflow with checkpointing.
+        A compiled LangGraph workflow with checkpointing. Every node is instrumented
+        (see node_metrics.instrument_node) and reports its metrics under 'node_metrics'.
+        Compiled workflows are reused by later calls with the same nodes and checkpointer,
+        so a long-running process compiles each workflow once.
     """
-    memory = MemorySaver()
+    if checkpointer is None:
+        checkpointer = get_checkpointer()
+    if use_async:
+        generate, search, scrape, deduplicate, rank, summarize, process, report = (
+            agenerate_queries_node, aweb_search_node, ascrape_content_node, adeduplicate_content_node,
+            arank_content_node, asummarize_content_node, aprocess_document_node, acompile_report_node
+        )
+    else:
+        generate, search, scrape, deduplicate, rank, summarize, process, report = (
+            generate_queries_node, web_search_node, scrape_content_node, deduplicate_content_node,
+            rank_content_node, summarize_content_node, process_document_node, compile_report_node
+        )
+    # Keyed on the node functions themselves, so patched or replaced nodes get a fresh workflow
+    key = (pipelined, checkpointer, generate, search, scrape, deduplicate, rank, summarize, process, report,
+           dispatch_documents, collect_documents_node)
+    with _workflows_lock:
+        app = _workflows.get(key)
+    if app is not None:
+        return app
+
+    # LangGraph is imported here rather than at module level to keep CLI startup fast
+    from langgraph.graph import StateGraph, END
+
     workflow = StateGraph(ResearchState)
 
+    def add_node(name, func):
+        workflow.add_node(name, instrument_node(name, func))
+
     # Add nodes
-    workflow.add_node("query_generator", generate_queries_node)
-    workflow.add_node("web_searcher", web_search_node)
-    workflow.add_node("content_scraper", scrape_content_node)
-    workflow.add_node("content_summarizer", summarize_content_node)
-    workflow.add_node("report_compiler", compile_report_node)
+    add_node("query_generator", generate)
+    add_node("web_searcher", search)
+    if pipelined:
+        add_node("document_processor", process)
+        add_node("document_collector", collect_documents_node)
+    else:
+        add_node("content_scraper", scrape)
+        add_node("content_deduplicator", deduplicate)
+        add_node("content_ranker", rank)
+        add_node("content_summarizer", summarize)
+    add_node("report_compiler", report)
 
     # Add edges
     workflow.set_entry_point("query_generator")
     workflow.add_edge("query_generator", "web_searcher")
-    workflow.add_edge("web_searcher", "content_scraper")
-    workflow.add_edge("content_scraper", "content_summarizer")
-    workflow.add_edge("content_summarizer", "report_compiler")
+    if pipelined:
+        workflow.add_conditional_edges("web_searcher", dispatch_documents, ["document_processor", "document_collector"])
+        workflow.add_edge("document_processor", "document_collector")
+        workflow.add_edge("document_collector", "report_compiler")
+    else:
+        workflow.add_edge("web_searcher", "content_scraper")
+        workflow.add_edge("content_scraper", "content_deduplicator")
+        workflow.add_edge("content_deduplicator", "content_ranker")
+        workflow.add_edge("content_ranker", "content_summarizer")
+        workflow.add_edge("content_summarizer", "report_compiler")
     workflow.add_edge("report_compiler", END)
 
-    return workflow.compile(checkpointer=memory)
+    app = workflow.compile(checkpointer=checkpointer)
+    with _workflows_lock:
+        _workflows[key] = app
+    return app
+
+def _run_config(topic: str, pipelined: bool, thread_id: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    """Returns the thread id and LangGraph config of a run."""
+    thread_id = thread_id or research_thread_id(topic, pipelined)
+    config = {"configurable": {"thread_id": thread_id}}
+    if pipelined:
+        config["max_concurrency"] = PIPELINE_MAX_WORKERS
+    return thread_id, config
+
+def _start_inputs(topic: str) -> Dict[str, Any]:
+    from langchain_core.messages import HumanMessage
+
+    return {"topic": topic, "messages": [HumanMessage(content=f"Start research on: {topic}")]}
+
+def _resume_inputs(app: Any, snapshot: Any, topic: str, thread_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the inputs that resume a thread from its latest checkpoint snapshot (see stepwise_agent)."""
+    if snapshot.values:
+        unknown = [name for name in snapshot.next if name not in app.nodes]
+        if unknown:
+            raise ValueError(f"Thread '{thread_id}' was checkpointed by the other workflow "
+                             f"(pending nodes: {', '.join(unknown)}); resume it with the same --pipelined setting.")
+        # No input: LangGraph continues from the last checkpoint
+        return None
+    if not topic:
+        raise ValueError(f"No checkpoint found for thread '{thread_id}'.")
+    return _start_inputs(topic)
 
-def stepwise_agent(topic: str, debug: bool = False):
+def _completed_steps(finished_nodes: List[str], mode: str, output_chunk: Dict[str, Any],
+                     debug: bool) -> List[Tuple[str, str, Dict[str, Any]]]:
     """
-    Generator that yields (node_name, status_message, state) after each node in the workflow.
-    Args:
-        topic: The research topic.
-        debug: If True, print debug logs to stdout.
-    Yields:
-        Tuple of (node_name, status_message, current_state)
+    Turns one streamed (mode, chunk) pair into the (node_name, status_message, state) steps it completes.
+    "updates" names the nodes that finished a step; the following "values" chunk is the state after it.
     """
-    from langchain_core.messages import HumanMessage
-    import uuid
-
-    app = build_workflow()
-    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
-    inputs = {"topic": topic, "messages": [HumanMessage(content=f"Start research on: {topic}")]}
-    node_order = [
-        ("query_generator", "Generating search queries..."),
-        ("web_searcher", "Performing web search..."),
-        ("content_scraper", "Scraping web content..."),
-        ("content_summarizer", "Summarizing content..."),
-        ("report_compiler", "Compiling final report...")
-    ]
-    node_idx = 0
-    for output_chunk in app.stream(inputs, config=config, stream_mode="values"):
-        if node_idx < len(node_order):
-            node_name, status_message = node_order[node_idx]
-        else:
-            node_name, status_message = ("unknown", "Processing...")
+    if mode == "updates":
+        finished_nodes.extend(name for name in output_chunk if not name.startswith("__"))
+        return []
+    steps = []
+    for node_name in finished_nodes:
+        status_message = NODE_STATUS.get(node_name, "Processing...")
         # Debug: print state at each node if debug is True
         if debug:
             print(f"[DEBUG] Node: {node_name}, State keys: {list(output_chunk.keys())}")
+            metrics = [m for m in output_chunk.get("node_metrics", []) if m["node"] == node_name]
+            if metrics:
+                print(f"[DEBUG] Node: {node_name}, metrics: {metrics[-1]}")
             if "final_report" in output_chunk:
                 print(f"[DEBUG] Node: {node_name}, final_report: {output_chunk['final_report'][:100]}")
             if "search_queries" in output_chunk:
@@ -75,12 +208,92 @@ def stepwise_agent(topic: str, debug: bool = False):
                 print(f"[DEBUG] Node: {node_name}, retrieved_docs: {output_chunk['retrieved_docs']}")
             if "error_message" in output_chunk and output_chunk["error_message"]:
                 print(f"[DEBUG] Node: {node_name}, error_message: {output_chunk['error_message']}")
-        yield node_name, status_message, output_chunk
-        node_idx += 1
-    # Final state
-    final_state = app.get_state(config)
+        steps.append((node_name, status_message, output_chunk))
+    finished_nodes.clear()
+    return steps
+
+def _final_step(final_state: Any, debug: bool) -> Tuple[str, str, Dict[str, Any]]:
     if debug:
         print(f"[DEBUG] Final state keys: {list(final_state.values.keys())}")
         if "final_report" in final_state.values:
             print(f"[DEBUG] Final final_report: {final_state.values['final_report'][:100]}")
-    yield "done", "Report generated.", final_state.values
+    return "done", "Report generated.", final_state.values
+
+def stepwise_agent(topic: str, debug: bool = False, pipelined: bool = False, resume: bool = False,
+                   thread_id: Optional[str] = None):
+    """
+    Generator that yields (node_name, status_message, state) after each node in the workflow.
+    node_name is the node that actually ran; the node's timing and counters are the last
+    entry of state["node_metrics"] for that node. Nodes that run in parallel (pipelined
+    mode) each get their own tuple.
+
+    Every step is checkpointed on disk under thread_id. A fresh run discards any earlier
+    checkpoints of its thread; a resumed run continues from the last checkpoint, so nodes
+    (and pipelined document branches) that already finished are not run again. The thread's
+    checkpoints are deleted once the run completes. The run claims its thread for its whole
+    duration, so the same topic cannot be started or resumed twice at once, even from
+    another process sharing the checkpoint file.
+    Args:
+        topic: The research topic. May be empty when resuming by thread_id.
+        debug: If True, print debug logs to stdout.
+        pipelined: If True, run the per-document pipelined workflow (see build_workflow).
+        resume: If True, continue the thread's interrupted run. Starts a fresh run when
+            the thread has no checkpoint and a topic is given.
+        thread_id: Checkpoint thread to use; defaults to research_thread_id(topic, pipelined).
+    Yields:
+        Tuple of (node_name, status_message, current_state)
+    Raises:
+        ValueError: If resuming a thread that has no checkpoint and no topic was given, or
+            whose checkpoint was written by the other workflow.
+        ThreadBusyError: If another run still holds the thread.
+    """
+    app = build_workflow(pipelined=pipelined)
+    thread_id, config = _run_config(topic, pipelined, thread_id)
+    # Claimed before the thread is read or deleted, so a run of the same topic in another process is refused
+    claim = app.checkpointer.claim(thread_id)
+    try:
+        if resume:
+            inputs = _resume_inputs(app, app.get_state(config), topic, thread_id)
+        else:
+            app.checkpointer.delete_thread(thread_id)
+            inputs = _start_inputs(topic)
+        finished_nodes = []
+        for mode, output_chunk in app.stream(inputs, config=config, stream_mode=["updates", "values"]):
+            for step in _completed_steps(finished_nodes, mode, output_chunk, debug):
+                yield step
+        # Final state
+        final_state = app.get_state(config)
+        if not final_state.next:
+            # Finished runs have nothing left to resume
+            app.checkpointer.delete_thread(thread_id)
+        yield _final_step(final_state, debug)
+    finally:
+        app.checkpointer.release(thread_id, claim)
+
+async def astepwise_agent(topic: str, debug: bool = False, pipelined: bool = False, resume: bool = False,
+                          thread_id: Optional[str] = None):
+    """
+    Async version of stepwise_agent, with the same arguments, steps and checkpointing.
+    The workflow runs the async node implementations through app.astream, so many runs
+    can share one event loop instead of each occupying a thread while it waits on I/O.
+    """
+    app = build_workflow(pipelined=pipelined, use_async=True)
+    thread_id, config = _run_config(topic, pipelined, thread_id)
+    claim = await app.checkpointer.aclaim(thread_id)
+    try:
+        if resume:
+            inputs = _resume_inputs(app, await app.aget_state(config), topic, thread_id)
+        else:
+            await app.checkpointer.adelete_thread(thread_id)
+            inputs = _start_inputs(topic)
+        finished_nodes = []
+        async for mode, output_chunk in app.astream(inputs, config=config, stream_mode=["updates", "values"]):
+            for step in _completed_steps(finished_nodes, mode, output_chunk, debug):
+                yield step
+        final_state = await app.aget_state(config)
+        if not final_state.next:
+            await app.checkpointer.adelete_thread(thread_id)
+        yield _final_step(final_state, debug)
+    finally:
+        # Released without awaiting, so a cancelled run still gives up its claim
+        app.checkpointer.release(thread_id, claim)